@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+生产环境使用 uvicorn 启动：
+    uvicorn AutoMeican.asgi:application --host 0.0.0.0 --port 8000
 """
 
 import os
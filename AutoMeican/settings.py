@@ -84,6 +84,67 @@ DATABASES = {
     }
 }
 
+# SQLite 并发配置：WAL + busy timeout + 持久连接，避免 cron 写入和面板读写互相 "database is locked"
+SQLITE_TUNED = os.environ.get("SQLITE_TUNED", "True").lower() == "true"
+# 等待写锁的最长时间（秒）
+SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", "20"))
+# WAL 模式下 NORMAL 已能保证数据库一致性，只在掉电时可能丢失最后几个事务
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+# 持久连接的最长存活时间（秒），0 表示每个请求结束后关闭连接
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", "600"))
+# 只读视图使用独立的只读连接，读者不会排在 cron 写事务后面
+SQLITE_READ_CONNECTION = (
+    os.environ.get("SQLITE_READ_CONNECTION", "False").lower() == "true"
+)
+
+if SQLITE_TUNED:
+    _sqlite_pragmas = [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT * 1000}",
+    ]
+    DATABASES["default"].update(
+        {
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                "timeout": SQLITE_BUSY_TIMEOUT,
+                # 写事务在 BEGIN 时就拿写锁，避免读锁升级写锁时直接报 locked
+                "transaction_mode": "IMMEDIATE",
+                "init_command": ";".join(_sqlite_pragmas),
+            },
+        }
+    )
+    if SQLITE_READ_CONNECTION:
+        DATABASES["readonly"] = {
+            **DATABASES["default"],
+            "OPTIONS": {
+                "timeout": SQLITE_BUSY_TIMEOUT,
+                "init_command": ";".join(_sqlite_pragmas + ["PRAGMA query_only=ON"]),
+            },
+            "TEST": {"MIRROR": "default"},
+        }
+
+# 只读视图使用的数据库别名
+MEICAN_READ_DB = "readonly" if "readonly" in DATABASES else "default"
+
+
+# 缓存配置
+# 面板缓存的版本号保存在数据库里，缓存内容不需要跨进程共享，默认使用进程内缓存；
+# 多个 Web 进程希望共享缓存时可以改用 Redis / Memcached
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "DJANGO_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.environ.get("DJANGO_CACHE_LOCATION", "meican"),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("DJANGO_CACHE_MAX_ENTRIES", "100000")),
+        },
+    }
+}
+
 
 # 额外的安全和 CSRF 设置
 SECURE_CROSS_ORIGIN_OPENER_POLICY = None
@@ -141,6 +202,106 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Meican 配置
 MEICAN_GLOBAL_PASSWORD = os.environ.get("MEICAN_GLOBAL_PASSWORD", "default")
 
+# 请求美餐接口的超时秒数（异步客户端）
+MEICAN_HTTP_TIMEOUT = float(os.environ.get("MEICAN_HTTP_TIMEOUT", "30"))
+
+# Web 进程内已登录美餐客户端的连接池：最多缓存的用户数（0 表示关闭）和空闲超时秒数
+MEICAN_SESSION_POOL_SIZE = int(os.environ.get("MEICAN_SESSION_POOL_SIZE", "64"))
+MEICAN_SESSION_IDLE_TTL = int(os.environ.get("MEICAN_SESSION_IDLE_TTL", "600"))
+
+# 手动刷新的保鲜秒数：刷新成功后这段时间内再次刷新同一用户直接返回上一次的结果
+MEICAN_REFRESH_FRESH_SECONDS = int(os.environ.get("MEICAN_REFRESH_FRESH_SECONDS", "10"))
+
+# 定时任务并发配置
+# 同时处理的用户数，大于 1 时数据库写入由单写线程批量提交
+MEICAN_CRON_WORKERS = int(os.environ.get("MEICAN_CRON_WORKERS", "1"))
+# 强制同步间隔（小时）：所有自助餐时段都已点餐或已关闭的用户会被跳过，超过这个时间没有同步则强制同步一次
+MEICAN_FORCE_RESYNC_HOURS = float(os.environ.get("MEICAN_FORCE_RESYNC_HOURS", "12"))
+# 菜单缓存秒数：时段状态没有变化时使用缓存的菜单，不再重新拉取餐厅和菜品列表；下单失败的时段在此期间也不再重试，0 表示每次都拉取
+MEICAN_MENU_CACHE_SECONDS = int(os.environ.get("MEICAN_MENU_CACHE_SECONDS", "1800"))
+# 分片数：大于 1 时每个定时时间点启动 N 个分片进程，按用户 id 的哈希各自处理一部分用户
+CRON_SHARDS = int(os.environ.get("CRON_SHARDS", "1"))
+# 当前容器启动的分片编号（逗号分隔，例如 "1,2"），留空表示启动全部分片；多个容器分担分片时使用
+CRON_SHARD_IDS = os.environ.get("CRON_SHARD_IDS", "")
+# 分片汇总文件目录，多个容器需要挂载同一个目录才能合并汇总
+MEICAN_SHARD_SUMMARY_DIR = os.environ.get(
+    "MEICAN_SHARD_SUMMARY_DIR", str(BASE_DIR / "data" / "shards")
+)
+# 租约有效秒数：处理用户前必须持有该用户的租约，持有期间每 1/3 有效期续约一次，进程退出后过期即可被接管
+MEICAN_LEASE_TTL = int(os.environ.get("MEICAN_LEASE_TTL", "120"))
+# 手动刷新等交互操作等待租约的最长秒数，超时则提示用户稍后再试
+MEICAN_LEASE_WAIT = float(os.environ.get("MEICAN_LEASE_WAIT", "10"))
+# 运行日志的恢复窗口（分钟）：中途退出的任务在这段时间内再次启动时从日志恢复，超过则放弃并重新开始
+MEICAN_RUN_RESUME_MINUTES = int(os.environ.get("MEICAN_RUN_RESUME_MINUTES", "120"))
+# 按最早截止时间优先处理用户时，重新读取截止时间并重新排序的间隔（秒）
+MEICAN_EDF_REFRESH_SECONDS = float(os.environ.get("MEICAN_EDF_REFRESH_SECONDS", "30"))
+# 分散执行：定时任务启动后在这段时间（分钟）内按每个用户稳定的偏移量陆续处理，0 表示启动时全部开始处理
+MEICAN_SPREAD_WINDOW_MINUTES = float(
+    os.environ.get("MEICAN_SPREAD_WINDOW_MINUTES", "0")
+)
+# 分散执行时每分钟最多开始处理的用户数（0 表示不限速）和截止前预留的分钟数
+MEICAN_SPREAD_RATE = float(os.environ.get("MEICAN_SPREAD_RATE", "0"))
+MEICAN_SPREAD_DEADLINE_MARGIN_MINUTES = float(
+    os.environ.get("MEICAN_SPREAD_DEADLINE_MARGIN_MINUTES", "5")
+)
+# 失败隔离：连续失败达到该次数后按指数退避跳过该用户（0 表示不隔离）
+MEICAN_QUARANTINE_AFTER = int(os.environ.get("MEICAN_QUARANTINE_AFTER", "3"))
+# 首次隔离的时长（分钟），之后每多失败一次翻倍，最长不超过 MEICAN_BACKOFF_MAX_HOURS 小时
+MEICAN_BACKOFF_BASE_MINUTES = float(os.environ.get("MEICAN_BACKOFF_BASE_MINUTES", "30"))
+MEICAN_BACKOFF_MAX_HOURS = float(os.environ.get("MEICAN_BACKOFF_MAX_HOURS", "24"))
+# 批量导入用户时同时验证登录的数量
+MEICAN_IMPORT_CONCURRENCY = int(os.environ.get("MEICAN_IMPORT_CONCURRENCY", "10"))
+# 导出历史数据时每块读取的行数，内存中最多只有一块
+MEICAN_EXPORT_CHUNK_SIZE = int(os.environ.get("MEICAN_EXPORT_CHUNK_SIZE", "5000"))
+# 统计分析按天缓存的秒数（只缓存今天以前的日期，0 表示不缓存）
+MEICAN_ANALYTICS_CACHE_SECONDS = int(
+    os.environ.get("MEICAN_ANALYTICS_CACHE_SECONDS", "86400")
+)
+# 剖析模式：留空表示关闭，sample 表示采样剖析，cprofile 表示确定性剖析（以单线程执行）
+MEICAN_PROFILE = os.environ.get("MEICAN_PROFILE", "").lower()
+# 采样剖析的间隔（毫秒）和剖析结果目录
+MEICAN_PROFILE_INTERVAL_MS = float(os.environ.get("MEICAN_PROFILE_INTERVAL_MS", "5"))
+MEICAN_PROFILE_DIR = os.environ.get(
+    "MEICAN_PROFILE_DIR", str(BASE_DIR / "data" / "logs" / "profiles")
+)
+# 写线程攒批的最长等待时间（秒）和单个事务的最大记录数
+MEICAN_DB_FLUSH_INTERVAL = float(os.environ.get("MEICAN_DB_FLUSH_INTERVAL", "0.5"))
+MEICAN_DB_FLUSH_SIZE = int(os.environ.get("MEICAN_DB_FLUSH_SIZE", "200"))
+
+# 历史数据保留配置
+# 超过保留天数的 TabStatus / OrderRecord 会汇总到 DailyOrderSummary 后删除
+HISTORY_RETENTION_DAYS = int(os.environ.get("HISTORY_RETENTION_DAYS", "180"))
+# 每个删除事务最多处理的行数，避免长时间占用写锁
+HISTORY_COMPACT_BATCH_SIZE = int(os.environ.get("HISTORY_COMPACT_BATCH_SIZE", "1000"))
+# 压缩任务的 cron 表达式，留空表示不自动执行
+HISTORY_COMPACT_SCHEDULE = os.environ.get("HISTORY_COMPACT_SCHEDULE", "30 3 * * *")
+
+# 请求录制 / 回放配置
+# MEICAN_CASSETTE_MODE: 留空表示关闭，record 表示录制真实请求，replay 表示只从 cassette 回放
+MEICAN_CASSETTE_MODE = os.environ.get("MEICAN_CASSETTE_MODE", "").lower()
+MEICAN_CASSETTE_DIR = os.environ.get(
+    "MEICAN_CASSETTE_DIR", str(BASE_DIR / "data" / "cassettes")
+)
+# 回放时是否按录制时的耗时 sleep
+MEICAN_CASSETTE_LATENCY = (
+    os.environ.get("MEICAN_CASSETTE_LATENCY", "False").lower() == "true"
+)
+
+# 面板实时事件（SSE）配置
+# 事件保留秒数，定时任务和自助点餐结束时清理过期事件
+DASHBOARD_EVENT_TTL = int(os.environ.get("DASHBOARD_EVENT_TTL", "3600"))
+# 事件流轮询事件表的间隔（秒）和空闲时的心跳间隔（秒）
+DASHBOARD_EVENT_POLL_INTERVAL = float(
+    os.environ.get("DASHBOARD_EVENT_POLL_INTERVAL", "1")
+)
+DASHBOARD_EVENT_HEARTBEAT = int(os.environ.get("DASHBOARD_EVENT_HEARTBEAT", "15"))
+# 单个连接的最长持续时间（秒），到时后浏览器自动重连，避免长期占用工作进程
+DASHBOARD_EVENT_STREAM_SECONDS = int(
+    os.environ.get("DASHBOARD_EVENT_STREAM_SECONDS", "300")
+)
+# 建议浏览器的重连间隔（毫秒）
+DASHBOARD_EVENT_RETRY_MS = int(os.environ.get("DASHBOARD_EVENT_RETRY_MS", "3000"))
+
 # 日志配置
 # 确保日志目录存在
 LOG_DIR = BASE_DIR / "data" / "logs"
@@ -183,14 +344,41 @@ LOGGING = {
 
 CRON_SCHEDULES = os.environ.get("CRON_SCHEDULES", "0 9 * * *;0 17 * * *")
 
+CRON_SHARD_INDEXES = [
+    int(index) for index in CRON_SHARD_IDS.split(",") if index.strip()
+] or list(range(1, CRON_SHARDS + 1))
+
 CRONJOBS = []
 for schedule in CRON_SCHEDULES.split(";"):
     schedule = schedule.strip()
-    if schedule:
+    if not schedule:
+        continue
+    if CRON_SHARDS <= 1:
+        CRONJOBS.append(
+            (
+                schedule,
+                "meican.cron.auto_order_meals",
+                ">> /app/data/logs/meican_cron.log 2>&1",
+            )
+        )
+        continue
+    # 每个分片是一条独立的 crontab，同一时间点并行启动
+    for index in CRON_SHARD_INDEXES:
         CRONJOBS.append(
             (
                 schedule,
                 "meican.cron.auto_order_meals",
+                [],
+                {"shard": f"{index}/{CRON_SHARDS}"},
                 ">> /app/data/logs/meican_cron.log 2>&1",
             )
         )
+
+if HISTORY_COMPACT_SCHEDULE.strip():
+    CRONJOBS.append(
+        (
+            HISTORY_COMPACT_SCHEDULE.strip(),
+            "meican.history.compact_history",
+            ">> /app/data/logs/meican_cron.log 2>&1",
+        )
+    )
@@ -4,6 +4,8 @@ set -e
 # 创建必要的目录
 mkdir -p /app/data/logs
 python manage.py migrate
+# 按明细表重建面板读模型（升级后首次启动时填充，之后由写入路径维护）
+python manage.py rebuild_dashboard
 
 # 添加 cron 任务
 echo "Adding cron jobs..."
@@ -17,4 +19,20 @@ crontab -l
 echo "Starting crond..."
 crond
 
+# 上次容器退出时可能有中途中断的自动点餐任务，在后台从运行日志恢复（分片执行时每个分片各自恢复）
+if [ "${CRON_SHARDS:-1}" -gt 1 ]; then
+    for index in $(echo "${CRON_SHARD_IDS:-$(seq -s, 1 "$CRON_SHARDS")}" | tr ',' ' '); do
+        python manage.py auto_order --resume-only --shard "$index/$CRON_SHARDS" >> /app/data/logs/meican_cron.log 2>&1 &
+    done
+else
+    python manage.py auto_order --resume-only >> /app/data/logs/meican_cron.log 2>&1 &
+fi
+
+# 启动 Web 服务：默认使用 uvicorn（ASGI），设置 DJANGO_SERVER=runserver 时使用开发服务器
+if [ "${DJANGO_SERVER:-asgi}" = "asgi" ] && python -c "import uvicorn" 2>/dev/null; then
+    echo "Starting uvicorn..."
+    exec uvicorn AutoMeican.asgi:application --host 0.0.0.0 --port 8000 --workers "${UVICORN_WORKERS:-1}"
+fi
+
+echo "Starting runserver..."
 exec python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
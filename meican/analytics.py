@@ -0,0 +1,343 @@
+"""
+点餐统计分析
+按用户按天计算自助餐下单成功率、失败原因分类、自助餐时段覆盖率和下单提前量，
+全部在数据库里按 (order_date, user_id) 分组聚合（走 order_date 索引），Python 只合并分组结果。
+已经过去的日期结果不会再变化，所有用户的按天合计缓存起来（每天一个 key，只保存当天的合计），
+按天查询一年的数据通常只需要读取缓存，只有未命中的日期才访问数据库；
+按用户分组或只统计部分用户时直接聚合（只查询这些用户的行）。
+写入者改写今天以前的数据时删除对应日期的缓存
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (
+    Case,
+    CharField,
+    Count,
+    DurationField,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+
+from .models import DailyOrderSummary, MeicanUser, OrderRecord, TabStatus
+
+logger = logging.getLogger("meican")
+
+DAY_KEY = "meican:analytics:day:{date}"
+
+# Tab 同步时为已点餐时段生成的占位订单，下单时间是同步时间而不是实际下单时间
+SYNCED_MEAL_NAME = "已点餐（从美餐同步）"
+
+# 失败原因分类，按顺序匹配 error_message 中的关键字
+FAILURE_CLASSES = (
+    ("session", ("session expired", "未登录")),
+    ("login", ("登录", "密码", "login")),
+    ("closed", ("截止", "关闭", "closed")),
+    ("sold_out", ("售罄", "库存", "sold out")),
+    ("no_meal", ("没有", "暂无", "不可", "no available")),
+    ("network", ("超时", "timeout", "timed out", "连接", "connect")),
+)
+FAILURE_OTHER = "other"
+FAILURE_LABELS = {
+    "session": "会话过期",
+    "login": "登录失败",
+    "closed": "已截止",
+    "sold_out": "已售罄",
+    "no_meal": "无可订菜品",
+    "network": "网络错误",
+    FAILURE_OTHER: "其他",
+}
+
+# 按天按用户累加的计数字段
+COUNTED_FIELDS = (
+    "tabs_total",
+    "buffet_tabs",
+    "buffet_ordered",
+    "orders_success",
+    "orders_failed",
+    "lead_seconds",
+    "lead_orders",
+)
+
+GROUP_DAY = "day"
+GROUP_USER = "user"
+GROUPS = (GROUP_DAY, GROUP_USER)
+
+
+def _empty():
+    return {**dict.fromkeys(COUNTED_FIELDS, 0), "failures": {}}
+
+
+def _failure_class():
+    """数据库端的失败原因分类表达式"""
+    return Case(
+        *[
+            When(
+                Q.create(
+                    [("error_message__icontains", pattern) for pattern in patterns],
+                    connector=Q.OR,
+                ),
+                then=Value(name),
+            )
+            for name, patterns in FAILURE_CLASSES
+        ],
+        default=Value(FAILURE_OTHER),
+        output_field=CharField(),
+    )
+
+
+def compute_days(start, end, user_ids=None, using="default"):
+    """
+    用数据库聚合计算区间内每天每个用户的统计
+
+    :type start: datetime.date
+    :type end: datetime.date
+    :param user_ids: 只统计这些用户，None 表示全部
+    :return: {date: {user_id: stats}}，stats 包含 COUNTED_FIELDS 和 failures {分类: 次数}
+    """
+    days = defaultdict(lambda: defaultdict(_empty))
+
+    def scoped(queryset, date_field="order_date"):
+        queryset = queryset.using(using).filter(
+            **{f"{date_field}__gte": start, f"{date_field}__lte": end}
+        )
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        return queryset
+
+    # 已压缩的日期只有汇总数据：没有失败原因和下单时间，
+    # 自助餐已点餐数用已点餐 Tab 数近似（自动点餐只点自助餐）
+    for row in scoped(DailyOrderSummary.objects, "date").values(
+        "user_id",
+        "date",
+        "tabs_total",
+        "buffet_tabs",
+        "tabs_ordered",
+        "orders_success",
+        "orders_failed",
+    ):
+        item = days[row["date"]][row["user_id"]]
+        item["tabs_total"] += row["tabs_total"]
+        item["buffet_tabs"] += row["buffet_tabs"]
+        item["buffet_ordered"] += min(row["tabs_ordered"], row["buffet_tabs"])
+        item["orders_success"] += row["orders_success"]
+        item["orders_failed"] += row["orders_failed"]
+
+    buffet = Q(tab_title__contains="自助")
+    for row in (
+        scoped(TabStatus.objects)
+        .values("order_date", "user_id")
+        .annotate(
+            tabs_total=Count("id"),
+            buffet_tabs=Count("id", filter=buffet),
+            buffet_ordered=Count("id", filter=buffet & Q(status="ORDERED")),
+        )
+        .order_by()
+    ):
+        item = days[row.pop("order_date")][row.pop("user_id")]
+        for field, value in row.items():
+            item[field] += value
+
+    for row in (
+        scoped(OrderRecord.objects)
+        .values("order_date", "user_id")
+        .annotate(
+            orders_success=Count("id", filter=Q(success=True)),
+            orders_failed=Count("id", filter=Q(success=False)),
+        )
+        .order_by()
+    ):
+        item = days[row.pop("order_date")][row.pop("user_id")]
+        for field, value in row.items():
+            item[field] += value
+
+    for row in (
+        scoped(OrderRecord.objects)
+        .filter(success=False)
+        .annotate(failure=_failure_class())
+        .values("order_date", "user_id", "failure")
+        .annotate(count=Count("id"))
+        .order_by()
+    ):
+        failures = days[row["order_date"]][row["user_id"]]["failures"]
+        failures[row["failure"]] = failures.get(row["failure"], 0) + row["count"]
+
+    # 下单提前量：对应时段的截止点餐时间（没有时用用餐时间）减去实际下单时间。
+    # 美餐不返回时段的开放时间，以离截止还有多久下单衡量点餐是否及时
+    deadline = (
+        TabStatus.objects.using(using)
+        .filter(
+            user_id=OuterRef("user_id"),
+            order_date=OuterRef("order_date"),
+            tab_uid=OuterRef("tab_uid"),
+        )
+        .values(deadline=Coalesce("close_time", "target_time"))[:1]
+    )
+    for row in (
+        scoped(OrderRecord.objects)
+        .filter(success=True, tab_uid__isnull=False)
+        .exclude(meal_name=SYNCED_MEAL_NAME)
+        .annotate(deadline=Subquery(deadline))
+        .filter(deadline__isnull=False)
+        .values("order_date", "user_id")
+        .annotate(
+            lead=Sum(
+                ExpressionWrapper(
+                    F("deadline") - F("order_time"), output_field=DurationField()
+                )
+            ),
+            lead_orders=Count("id"),
+        )
+        .order_by()
+    ):
+        item = days[row["order_date"]][row["user_id"]]
+        item["lead_seconds"] += row["lead"].total_seconds()
+        item["lead_orders"] += row["lead_orders"]
+
+    return {date: dict(users) for date, users in days.items()}
+
+
+def get_day_totals(start, end, today, using="default"):
+    """
+    区间内每天所有用户的合计，今天以前的日期优先读取缓存，未命中的日期用一组聚合查询补齐后写入缓存
+
+    :return: ({date: stats}, 命中缓存的天数)
+    """
+    dates = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    timeout = settings.MEICAN_ANALYTICS_CACHE_SECONDS
+    cacheable = [date for date in dates if date < today] if timeout > 0 else []
+    keys = {date: DAY_KEY.format(date=date.isoformat()) for date in cacheable}
+    cached = cache.get_many(keys.values()) if keys else {}
+
+    totals = {}
+    for date in cacheable:
+        if keys[date] in cached:
+            totals[date] = cached[keys[date]]
+    hits = len(totals)
+
+    missing = [date for date in dates if date not in totals]
+    if missing:
+        computed = compute_days(min(missing), max(missing), using=using)
+        for date in missing:
+            totals[date] = _empty()
+            for stats in computed.get(date, {}).values():
+                _add(totals[date], stats)
+        stored = {keys[date]: totals[date] for date in missing if date in keys}
+        if stored:
+            cache.set_many(stored, timeout=timeout)
+    return totals, hits
+
+
+def invalidate(dates):
+    """历史数据被改写后（例如重新生成测试数据）删除对应日期的缓存"""
+    cache.delete_many([DAY_KEY.format(date=date.isoformat()) for date in dates])
+
+
+def invalidate_past(dates):
+    """只删除今天以前的日期的缓存，今天及以后的日期不缓存，写入者每次写入都可以调用"""
+    today = datetime.now().date()
+    past = {date for date in dates if date < today}
+    if past:
+        invalidate(past)
+
+
+def summarize(stats):
+    """在计数字段之外附带比率：成功率、覆盖率、平均提前量（分钟），没有分母时为 None"""
+    attempts = stats["orders_success"] + stats["orders_failed"]
+    return {
+        **{field: stats[field] for field in COUNTED_FIELDS if field != "lead_seconds"},
+        "success_rate": (
+            round(stats["orders_success"] / attempts, 4) if attempts else None
+        ),
+        "coverage": (
+            round(stats["buffet_ordered"] / stats["buffet_tabs"], 4)
+            if stats["buffet_tabs"]
+            else None
+        ),
+        "avg_lead_minutes": (
+            round(stats["lead_seconds"] / stats["lead_orders"] / 60, 1)
+            if stats["lead_orders"]
+            else None
+        ),
+        "failures": dict(sorted(stats["failures"].items(), key=lambda item: -item[1])),
+    }
+
+
+def _add(total, stats):
+    for field in COUNTED_FIELDS:
+        total[field] += stats[field]
+    for name, count in stats["failures"].items():
+        total["failures"][name] = total["failures"].get(name, 0) + count
+
+
+def report(start, end, today, group=GROUP_DAY, user_ids=None, using="default"):
+    """
+    :param group: day 按天汇总，user 按用户汇总
+    :param user_ids: 只统计这些用户，None 表示全部
+    :return: {"start", "end", "group", "rows", "totals", "cached_days"}
+    """
+    if group not in GROUPS:
+        raise ValueError(f"未知的分组: {group}，可选: {', '.join(GROUPS)}")
+    if start > end:
+        raise ValueError("开始日期不能晚于结束日期")
+
+    totals = _empty()
+    if group == GROUP_DAY and user_ids is None:
+        day_totals, hits = get_day_totals(start, end, today, using=using)
+        for stats in day_totals.values():
+            _add(totals, stats)
+        rows = [
+            {"date": date.isoformat(), **summarize(day_totals[date])}
+            for date in sorted(day_totals)
+        ]
+        return _result(start, end, group, rows, totals, hits)
+
+    days = compute_days(start, end, user_ids=user_ids, using=using)
+    buckets = defaultdict(_empty)
+    for date in sorted(days):
+        for user_id, stats in days[date].items():
+            _add(buckets[date if group == GROUP_DAY else user_id], stats)
+            _add(totals, stats)
+
+    if group == GROUP_DAY:
+        rows = [
+            {"date": date.isoformat(), **summarize(buckets[date])}
+            for date in (
+                start + timedelta(days=offset)
+                for offset in range((end - start).days + 1)
+            )
+        ]
+    else:
+        emails = dict(
+            MeicanUser.objects.using(using)
+            .filter(id__in=buckets.keys())
+            .values_list("id", "email")
+        )
+        rows = [
+            {"user_id": user_id, "email": emails.get(user_id), **summarize(stats)}
+            for user_id, stats in sorted(buckets.items())
+        ]
+
+    return _result(start, end, group, rows, totals, 0)
+
+
+def _result(start, end, group, rows, totals, hits):
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "group": group,
+        "rows": rows,
+        "totals": summarize(totals),
+        "cached_days": hits,
+    }
@@ -6,14 +6,25 @@
 import datetime
 import json
 import time
+from collections import deque
 from urllib.parse import urlencode
 
 import requests
 
-from .exceptions import MeiCanError, MeiCanLoginFail, NoOrderAvailable
+from .exceptions import (
+    MeiCanError,
+    MeiCanLoginFail,
+    MeiCanSessionExpired,
+    NoOrderAvailable,
+)
 from .meican_models import TabStatus
 from .utils import get_dishes, get_restaurants, get_tabs
 
+# 登录会话失效时美餐返回的状态码
+SESSION_EXPIRED_STATUS = (401, 403)
+# 每个客户端保留的最近响应数
+RESPONSE_HISTORY = 10
+
 
 class RestUrl(object):
     """用来存储 MeiCan Rest 接口的类"""
@@ -92,13 +103,16 @@ class RestUrl(object):
 
 
 class MeiCan(object):
-    def __init__(self, username, password, user_agent=None):
+    def __init__(self, username, password, user_agent=None, session=None):
         """
         :type username: str | unicode
         :type password: str | unicode
+        :type session: requests.Session 可选，用于录制/回放（见 cassette 模块）
         """
-        self.responses = []
-        self._session = requests.Session()
+        # 只保留最近的响应用于排查问题；连接池里的客户端会长期复用，不能无限增长
+        self.responses = deque(maxlen=RESPONSE_HISTORY)
+        self.expired = False
+        self._session = session or requests.Session()
         user_agent = (
             user_agent
             or "Mozilla/5.0 (Windows NT 6.1; Win64; x64; rv:47.0) Gecko/20100101 Firefox/47.0"
@@ -117,6 +131,9 @@ class MeiCan(object):
         if 200 != response.status_code or username not in response.text:
             raise MeiCanLoginFail("login fail because username or password incorrect")
 
+    def close(self):
+        self._session.close()
+
     @property
     def tabs(self):
         """
@@ -175,6 +192,18 @@ class MeiCan(object):
         data = self.http_get(RestUrl.dishes(restaurant))
         return get_dishes(restaurant, data)
 
+    def load_menu(self, tab):
+        """
+        获取时段内所有餐厅及其菜品的原始数据（用于缓存，解析见 menu_cache.dishes_from_menu）
+        :type tab: Tab
+        :rtype: dict
+        """
+        restaurants = self.http_get(RestUrl.restaurants(tab))
+        dishes = {}
+        for restaurant in get_restaurants(tab, restaurants):
+            dishes[restaurant.uid] = self.http_get(RestUrl.dishes(restaurant))
+        return {"restaurants": restaurants, "dishes": dishes}
+
     def list_dishes(self, tab=None):
         """
         :type tab: Tab
@@ -294,6 +323,12 @@ class MeiCan(object):
         response = func(url, data=data, **kwargs)  # type: requests.Response
         response.encoding = response.encoding or "utf-8"
         self.responses.append(response)
+        if response.status_code in SESSION_EXPIRED_STATUS:
+            # 标记后连接池不会再复用这个客户端
+            self.expired = True
+            raise MeiCanSessionExpired(
+                "[{}] session expired".format(response.status_code)
+            )
         if response.status_code != 200:
             error = response.json()
             raise MeiCanError(
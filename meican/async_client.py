@@ -0,0 +1,296 @@
+"""
+美餐异步 API 客户端
+基于 httpx.AsyncClient，接口与 api_client.MeiCan 保持一致（方法改为协程），
+供 ASGI 视图使用：等待美餐响应期间不占用工作线程
+"""
+
+import asyncio
+import time
+from collections import deque
+
+from django.conf import settings
+
+from . import cassette
+from .api_client import RESPONSE_HISTORY, SESSION_EXPIRED_STATUS, RestUrl
+from .exceptions import (
+    MeiCanError,
+    MeiCanLoginFail,
+    MeiCanSessionExpired,
+    NoOrderAvailable,
+)
+from .meican_models import TabStatus
+from .utils import get_dishes, get_restaurants, get_tabs
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - 未安装 httpx 时异步服务退回到同步客户端
+    httpx = None
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 6.1; Win64; x64; rv:47.0) Gecko/20100101 Firefox/47.0"
+)
+
+
+def available():
+    """是否可以使用异步客户端"""
+    return httpx is not None
+
+
+class AsyncMeiCan(object):
+    """
+    用法：
+        client = await AsyncMeiCan.login(username, password)
+        tabs = await client.get_tabs()
+        ...
+        await client.aclose()
+    """
+
+    def __init__(self, client):
+        """
+        :type client: httpx.AsyncClient
+        """
+        self.responses = deque(maxlen=RESPONSE_HISTORY)
+        self.expired = False
+        self._client = client
+        self._calendar_items = None
+        self._tabs = None
+
+    @classmethod
+    async def login(cls, username, password, user_agent=None, transport=None):
+        """
+        登录美餐，失败时抛出 MeiCanLoginFail
+        :type transport: httpx.AsyncBaseTransport 可选，用于录制/回放（见 transport_for）
+        :rtype: AsyncMeiCan
+        """
+        client = httpx.AsyncClient(
+            headers={"User-Agent": user_agent or DEFAULT_USER_AGENT},
+            timeout=settings.MEICAN_HTTP_TIMEOUT,
+            transport=transport,
+        )
+        meican = cls(client)
+        # 表单值与同步客户端（requests）的编码保持一致
+        form_data = {
+            "username": username,
+            "password": password,
+            "loginType": "username",
+            "remember": "True",
+        }
+        try:
+            response = await meican._request("post", RestUrl.login(), form_data)
+        except BaseException:
+            await client.aclose()
+            raise
+        if 200 != response.status_code or username not in response.text:
+            await client.aclose()
+            raise MeiCanLoginFail("login fail because username or password incorrect")
+        return meican
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def get_tabs(self):
+        """
+        :rtype: list[Tab]
+        """
+        if not self._tabs:
+            await self.load_tabs()
+        return self._tabs
+
+    async def next_available_tab(self):
+        """
+        :rtype: Tab
+        """
+        available_tabs = [
+            _ for _ in await self.get_tabs() if _.status == TabStatus.AVAIL
+        ]
+        return available_tabs[0] if available_tabs else None
+
+    async def load_tabs(self, refresh=False):
+        try:
+            if not self._calendar_items or refresh:
+                self._calendar_items = await self.http_get(RestUrl.calender_items())
+
+                self._tabs = get_tabs(self._calendar_items)
+        except Exception as e:
+            raise MeiCanLoginFail(f"Failed to load tabs: {str(e)}")
+
+    async def get_restaurants(self, tab):
+        """
+        :type tab: Tab
+        :rtype: list[Restaurant]
+        """
+        data = await self.http_get(RestUrl.restaurants(tab))
+        return get_restaurants(tab, data)
+
+    async def get_dishes(self, restaurant):
+        """
+        :type restaurant: Restaurant
+        """
+        data = await self.http_get(RestUrl.dishes(restaurant))
+        return get_dishes(restaurant, data)
+
+    async def load_menu(self, tab):
+        """
+        获取时段内所有餐厅及其菜品的原始数据，各餐厅的菜品并发获取
+        :type tab: Tab
+        :rtype: dict
+        """
+        restaurants = await self.http_get(RestUrl.restaurants(tab))
+        parsed = get_restaurants(tab, restaurants)
+        dishes = await asyncio.gather(
+            *(self.http_get(RestUrl.dishes(restaurant)) for restaurant in parsed)
+        )
+        return {
+            "restaurants": restaurants,
+            "dishes": {
+                restaurant.uid: data for restaurant, data in zip(parsed, dishes)
+            },
+        }
+
+    async def list_dishes(self, tab=None):
+        """
+        各餐厅的菜品并发获取
+        :type tab: Tab
+        :rtype: list[Dish]
+        """
+        tab = tab or await self.next_available_tab()
+        if not tab:
+            raise NoOrderAvailable("Currently no available orders")
+        restaurants = await self.get_restaurants(tab)
+        dishes = []
+        for restaurant_dishes in await asyncio.gather(
+            *(self.get_dishes(restaurant) for restaurant in restaurants)
+        ):
+            dishes.extend(restaurant_dishes)
+        return dishes
+
+    async def order(self, dish, address_uid=""):
+        """
+        :type dish: Dish
+        :type address_uid: str
+        """
+        return await self.http_post(RestUrl.order(dish, address_uid=address_uid))
+
+    async def http_get(self, url, **kwargs):
+        """
+        :type url: str | unicode
+        :rtype: dict | str | unicode
+        """
+        response = await self._request("get", url, **kwargs)
+        return response.json()
+
+    async def http_post(self, url, data=None, **kwargs):
+        """
+        :type url: str | unicode
+        :type data: dict
+        :rtype: dict | str | unicode
+        """
+        response = await self._request("post", url, data, **kwargs)
+        return response.json()
+
+    async def _request(self, method, url, data=None, **kwargs):
+        """
+        :rtype: httpx.Response
+        """
+        if data is not None:
+            kwargs["data"] = data
+        response = await self._client.request(method.upper(), url, **kwargs)
+        response.encoding = response.encoding or "utf-8"
+        self.responses.append(response)
+        if response.status_code in SESSION_EXPIRED_STATUS:
+            # 标记后连接池不会再复用这个客户端
+            self.expired = True
+            raise MeiCanSessionExpired(
+                "[{}] session expired".format(response.status_code)
+            )
+        if response.status_code != 200:
+            error = response.json()
+            raise MeiCanError(
+                "[{}] {}".format(
+                    error.get("error", ""), error.get("error_description", "")
+                )
+            )
+        return response
+
+
+if httpx is not None:
+
+    class AsyncRecordingTransport(httpx.AsyncHTTPTransport):
+        """正常访问网络，同时把请求/响应写入 cassette（与 cassette.RecordingAdapter 对应）"""
+
+        def __init__(self, cassette_file, **kwargs):
+            super().__init__(**kwargs)
+            self.cassette = cassette_file
+
+        async def handle_async_request(self, request):
+            started = time.monotonic()
+            response = await super().handle_async_request(request)
+            content = await response.aread()
+            try:
+                self.cassette.append_entry(
+                    method=request.method,
+                    url=str(request.url),
+                    body=request.content,
+                    status=response.status_code,
+                    reason=response.reason_phrase,
+                    headers=dict(response.headers),
+                    encoding=response.encoding,
+                    content=content,
+                    elapsed=time.monotonic() - started,
+                )
+            except Exception:
+                # 录制失败不能影响真实请求
+                pass
+            return response
+
+    class AsyncReplayTransport(httpx.AsyncBaseTransport):
+        """从 cassette 回放响应，不访问网络（与 cassette.ReplayAdapter 对应）"""
+
+        def __init__(self, cassette_file, latency=False):
+            self.latency = latency
+            self.matcher = cassette.CassetteMatcher(cassette_file)
+
+        async def handle_async_request(self, request):
+            entry = self.matcher.match(
+                request.method, str(request.url), request.content
+            )
+            if self.latency and entry.get("elapsed"):
+                await asyncio.sleep(entry["elapsed"])
+            encoding = entry.get("encoding") or "utf-8"
+            # 录制的响应体已经解压，去掉 Content-Encoding 等与原始传输相关的头
+            headers = {
+                key: value
+                for key, value in entry.get("headers", {}).items()
+                if key.lower()
+                not in ("content-encoding", "content-length", "transfer-encoding")
+            }
+            return httpx.Response(
+                status_code=entry["status"],
+                headers=headers,
+                content=entry["content"].encode(encoding),
+                request=request,
+            )
+
+
+def transport_for(email):
+    """
+    根据 MEICAN_CASSETTE_MODE 配置为用户创建 httpx transport，未开启时返回 None
+
+    :type email: str
+    :rtype: httpx.AsyncBaseTransport | None
+    """
+    mode = settings.MEICAN_CASSETTE_MODE
+    path = cassette.cassette_path(email)
+    if mode == cassette.MODE_RECORD:
+        return AsyncRecordingTransport(cassette.Cassette(path))
+    if mode == cassette.MODE_REPLAY:
+        return AsyncReplayTransport(
+            cassette.Cassette(path), latency=settings.MEICAN_CASSETTE_LATENCY
+        )
+    return None
@@ -0,0 +1,333 @@
+"""
+美餐异步服务
+与 MeicanService 的流程一致（登录 -> 同步 Tab 状态 -> 批量订餐），供 ASGI 视图使用：
+网络请求走 AsyncMeiCan，数据库写入通过 sync_to_async 在 Django 的同步线程中执行
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import async_client, menu_cache, session_pool
+from .async_client import AsyncMeiCan
+from .db_writer import TabSyncRecord, apply_now
+from .exceptions import MeiCanLoginFail
+from .meican_service import (
+    MeicanService,
+    build_tab_rows,
+    closed_menu_tabs,
+    collect_order_result,
+    compat_order_result,
+    order_failed,
+    order_record,
+    order_results_summary,
+    previous_failure,
+    refresh_result,
+    select_buffet_dish,
+    split_buffet_tabs,
+    sync_result,
+    tabs_to_order,
+)
+
+logger = logging.getLogger("meican")
+
+
+async def _aclose_all(clients):
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            # 其他事件循环里创建的客户端可能无法在当前循环关闭
+            logger.debug(f"关闭美餐客户端失败: {e}")
+
+
+class AsyncMeicanService:
+    """
+    异步美餐服务类，方法与 MeicanService 同名，返回值格式相同。
+    未安装 httpx 时退回到在线程中执行同步的 MeicanService
+    """
+
+    def __init__(self, pooled=True):
+        """
+        :param pooled: 是否从进程内连接池复用已登录的客户端，用完需调用 aclose() 归还
+        """
+        self.meican_client = None
+        self.pooled = pooled and session_pool.async_clients.enabled
+        self._email = None
+        # 本次同步前本地保存的 Tab 状态 {user_id: {(tab_uid, order_date): status}}
+        self._previous_states = {}
+        self._fallback = (
+            None if async_client.available() else MeicanService(pooled=pooled)
+        )
+
+    async def aclose(self):
+        """释放当前客户端：开启连接池时归还到池中，否则关闭"""
+        if self._fallback:
+            self._fallback.release()
+            return
+        client, self.meican_client = self.meican_client, None
+        if client is None:
+            return
+        if self.pooled:
+            discarded = session_pool.async_clients.checkin(
+                self._email, client, scope=asyncio.get_running_loop()
+            )
+        else:
+            discarded = [client]
+        await _aclose_all(discarded)
+
+    async def _checkout(self, email):
+        """
+        从连接池取出已登录的客户端，刷新日历的同时确认会话仍然有效。
+        异步客户端绑定在创建它的事件循环上，只复用同一个事件循环里的客户端
+        """
+        client, discarded = session_pool.async_clients.checkout(
+            email, scope=asyncio.get_running_loop()
+        )
+        await _aclose_all(discarded)
+        if client is None:
+            return False
+        try:
+            await client.load_tabs(refresh=True)
+        except Exception as e:
+            logger.info(f"用户 {email} 的会话已失效，重新登录: {e}")
+            await _aclose_all([client])
+            return False
+        logger.info(f"用户 {email} 复用已登录的会话")
+        self.meican_client = client
+        self._email = email
+        return True
+
+    async def _write(self, record):
+        return await sync_to_async(apply_now)(record)
+
+    async def login(self, email, password=None):
+        """
+        登录美餐
+        :return: (success, token, error_message)
+        """
+        if self._fallback:
+            return await sync_to_async(self._fallback.login)(email, password)
+
+        # 已经为该用户登录过，不再重复登录
+        if (
+            self.meican_client
+            and self._email == email
+            and not self.meican_client.expired
+        ):
+            return True, "login_success", None
+        await self.aclose()
+
+        # 只有使用全局密码的登录才放入连接池
+        if self.pooled and password is None and await self._checkout(email):
+            return True, "login_success", None
+
+        if password is None:
+            password = settings.MEICAN_GLOBAL_PASSWORD
+
+        try:
+            self.meican_client = await AsyncMeiCan.login(
+                email, password, transport=async_client.transport_for(email)
+            )
+            self._email = email
+            logger.info(f"用户 {email} 登录成功")
+            return True, "login_success", None
+        except MeiCanLoginFail as e:
+            logger.error(f"登录失败: {e}")
+            return False, None, "用户名或密码错误"
+        except Exception as e:
+            logger.error(f"登录异常: {e}")
+            return False, None, f"登录异常: {str(e)}"
+
+    async def sync_user_tabs_status(self, user):
+        """
+        同步用户的所有 Tab 状态到数据库
+        :return: (success, synced_tabs_info, error_message)
+        """
+        if self._fallback:
+            return await sync_to_async(self._fallback.sync_user_tabs_status)(user)
+
+        try:
+            if not self.meican_client:
+                return False, {}, "未登录"
+
+            all_tabs = await self.meican_client.get_tabs()
+            if not all_tabs:
+                return False, {}, "未获取到任何 Tab 信息"
+
+            today = datetime.now().date()
+            tab_rows, synced_tabs = build_tab_rows(user, all_tabs, today)
+
+            # 覆盖之前先记下上一次的状态，下单时据此判断是否需要重新拉取菜单
+            previous_states = await sync_to_async(menu_cache.stored_tab_states)(
+                user.id, today
+            )
+            self._previous_states[user.id] = previous_states
+            await sync_to_async(menu_cache.discard_menus)(
+                closed_menu_tabs(all_tabs, previous_states)
+            )
+
+            # 清除该用户今天及以后的 Tab 状态和 OrderRecord 后重建，以确保数据一致性
+            applied = await self._write(TabSyncRecord(user.id, today, tab_rows))
+
+            return True, sync_result(synced_tabs, applied), None
+
+        except Exception as e:
+            logger.error(f"同步用户 Tab 状态失败: {e}")
+            return False, {}, f"同步 Tab 状态失败: {str(e)}"
+
+    async def order_all_available_buffets(self, user):
+        """
+        为用户订购所有可用的自助餐
+        :return: (success, order_results, error_message)
+        """
+        if self._fallback:
+            return await sync_to_async(self._fallback.order_all_available_buffets)(user)
+
+        try:
+            if not self.meican_client:
+                return False, {}, "未登录"
+
+            all_buffet_tabs = [
+                tab
+                for tab in await self.meican_client.get_tabs()
+                if "自助" in tab.title
+            ]
+            if not all_buffet_tabs:
+                return True, {"message": "当前没有自助餐可订"}, None
+
+            orderable_tabs, already_ordered, unavailable_tabs = split_buffet_tabs(
+                all_buffet_tabs
+            )
+            successful_orders = []
+
+            # 同一用户的各个时段依次下单，与同步流程保持一致
+            for tab, changed in tabs_to_order(
+                orderable_tabs, self._previous_states.get(user.id)
+            ):
+                _, meal_name, error = await self._order_buffet_for_tab(
+                    tab, user, changed
+                )
+                collect_order_result(successful_orders, user, tab, meal_name, error)
+
+            return (
+                True,
+                order_results_summary(
+                    successful_orders, already_ordered, unavailable_tabs
+                ),
+                None,
+            )
+
+        except Exception as e:
+            logger.error(f"批量订餐失败: {e}")
+            return False, {}, f"批量订餐失败: {str(e)}"
+
+    async def _menu_dishes(self, tab, changed):
+        """
+        获取时段的菜品：状态未变化且缓存未过期时使用缓存的菜单，否则从美餐拉取并缓存
+        :return: list[Dish]
+        """
+        menu = None if changed else await sync_to_async(menu_cache.get_menu)(tab)
+        if menu is not None:
+            logger.info(f"时段 {tab.title} 状态未变化，使用缓存的菜单")
+            return menu_cache.dishes_from_menu(tab, menu)
+        menu = await self.meican_client.load_menu(tab)
+        await sync_to_async(menu_cache.set_menu)(tab, menu)
+        return menu_cache.dishes_from_menu(tab, menu)
+
+    async def _order_buffet_for_tab(self, tab, user, changed=True):
+        """
+        为特定 Tab 下单自助餐
+        :param changed: 时段状态相对上一次同步是否发生了变化
+        :return: (success, meal_name, error_message)
+        """
+        try:
+            error = await sync_to_async(previous_failure)(tab, changed)
+            if error is not None:
+                return False, None, error
+
+            selected_dish, error = select_buffet_dish(
+                tab, await self._menu_dishes(tab, changed)
+            )
+            if selected_dish is None:
+                return False, None, error
+
+            order_result = await self.meican_client.order(selected_dish)
+            logger.info(f"时段 {tab.title} 订餐结果: {order_result}")
+
+            await self._write(order_record(user, tab, selected_dish.name))
+            return True, selected_dish.name, None
+
+        except Exception as e:
+            error_msg = order_failed(tab, e)
+            # 状态变化或缓存过期之前不再重试，届时重新拉取菜单
+            await sync_to_async(menu_cache.set_failure)(tab, error_msg)
+
+            try:
+                await self._write(order_record(user, tab, error_message=error_msg))
+            except Exception as db_error:
+                logger.error(f"记录失败订单时出错: {db_error}")
+
+            return False, None, error_msg
+
+    async def refresh_user_status(self, user):
+        """
+        刷新用户状态：登录 + 同步 Tab 状态 + 订餐
+        :return: (success, result_info, error_message)
+        """
+        if self._fallback:
+            return await sync_to_async(self._fallback.refresh_user_status)(user)
+
+        try:
+            success, _, error = await self.login(user.email)
+            if not success:
+                return False, {}, f"登录失败: {error}"
+
+            sync_success, sync_info, sync_error = await self.sync_user_tabs_status(user)
+            if not sync_success:
+                return False, {}, f"同步状态失败: {sync_error}"
+
+            order_success, order_info, order_error = (
+                await self.order_all_available_buffets(user)
+            )
+
+            return (
+                True,
+                refresh_result(user, sync_info, order_success, order_info, order_error),
+                None,
+            )
+
+        except Exception as e:
+            logger.error(f"刷新用户 {user.email} 状态失败: {e}")
+            return False, {}, f"刷新状态失败: {str(e)}"
+        finally:
+            await self.aclose()
+
+    async def find_and_order_buffet(self, user):
+        """
+        为已登录的用户同步状态并订购自助餐，返回与 MeicanService.find_and_order_buffet 相同的兼容格式
+        （异步版本不会重新登录，调用前需先 login）
+        :param user: MeicanUser 对象
+        :return: (success, data, error_message)
+        """
+        if self._fallback:
+            return await sync_to_async(self._fallback.find_and_order_buffet)(user.email)
+
+        try:
+            if not self.meican_client:
+                return False, "", "未登录"
+
+            await self.sync_user_tabs_status(user)
+            order_success, order_info, order_error = (
+                await self.order_all_available_buffets(user)
+            )
+            if order_success:
+                return True, compat_order_result(order_info), ""
+            return False, "", order_error if order_error else "订餐失败"
+
+        except Exception as e:
+            logger.error(f"订餐失败: {e}")
+            return False, "", f"订餐失败: {str(e)}"
@@ -0,0 +1,302 @@
+"""
+美餐请求录制 / 回放（cassette）
+录制模式下把每一次请求和响应写入压缩的 cassette 文件（凭据已脱敏），
+回放模式下不访问网络，直接从 cassette 中返回录制好的响应
+"""
+
+import datetime
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from .exceptions import CassetteMiss
+
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+SCRUBBED = "***"
+# 需要脱敏的表单字段和请求/响应头
+SENSITIVE_FIELDS = {"password"}
+SENSITIVE_HEADERS = {"cookie", "set-cookie", "authorization"}
+# 每次请求都会变化的参数，统一归一化后才能在回放时匹配
+VOLATILE_PARAMS = {"noHttpGetCache": "0"}
+
+
+def normalize_url(url):
+    """
+    归一化 URL：把 noHttpGetCache 这类时间戳参数替换为固定值
+
+    :type url: str
+    :rtype: str
+    """
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    params = [
+        (key, VOLATILE_PARAMS.get(key, value))
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+    ]
+    return urlunsplit(parts._replace(query=urlencode(params)))
+
+
+def scrub_body(body):
+    """
+    对表单请求体脱敏
+
+    :type body: bytes | str | None
+    :rtype: str
+    """
+    if not body:
+        return ""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    params = parse_qsl(body, keep_blank_values=True)
+    if not params:
+        return body
+    return urlencode(
+        [(key, SCRUBBED if key in SENSITIVE_FIELDS else value) for key, value in params]
+    )
+
+
+def scrub_headers(headers):
+    """
+    :type headers: dict
+    :rtype: dict
+    """
+    return {
+        key: SCRUBBED if key.lower() in SENSITIVE_HEADERS else value
+        for key, value in headers.items()
+    }
+
+
+class Cassette(object):
+    """一个 cassette 文件：每行一条 JSON 记录，整体 gzip 压缩，可追加写入"""
+
+    def __init__(self, path):
+        """
+        :type path: str | Path
+        """
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def append(self, request, response):
+        """
+        :type request: requests.PreparedRequest
+        :type response: requests.Response
+        """
+        self.append_entry(
+            method=request.method,
+            url=request.url,
+            body=request.body,
+            status=response.status_code,
+            reason=response.reason,
+            headers=response.headers,
+            encoding=response.encoding,
+            content=response.content,
+            elapsed=response.elapsed.total_seconds(),
+        )
+
+    def append_entry(
+        self, method, url, body, status, reason, headers, encoding, content, elapsed
+    ):
+        """写入一条记录，不依赖具体的 HTTP 客户端（requests / httpx 共用）"""
+        entry = {
+            "method": method,
+            "url": normalize_url(url),
+            "body": scrub_body(body),
+            "status": status,
+            "reason": reason,
+            "headers": scrub_headers(headers),
+            "encoding": encoding,
+            "content": content.decode(encoding or "utf-8", errors="replace"),
+            "elapsed": elapsed,
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def load(self):
+        """
+        :rtype: list[dict]
+        """
+        if not self.path.exists():
+            return []
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+class RecordingAdapter(HTTPAdapter):
+    """正常访问网络，同时把请求/响应写入 cassette"""
+
+    def __init__(self, cassette, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        try:
+            self.cassette.append(request, response)
+        except Exception:
+            # 录制失败不能影响真实请求
+            pass
+        return response
+
+
+class CassetteMatcher(object):
+    """
+    在 cassette 中查找与请求匹配的记录
+
+    优先按 (method, 归一化 URL, 脱敏后的请求体) 精确匹配；
+    找不到时按 (method, path) 匹配（例如下单时随机选中的菜品不同）。
+    同一个 key 的多条记录按录制顺序依次返回，用完后重复最后一条。
+    """
+
+    def __init__(self, cassette):
+        """
+        :type cassette: Cassette
+        """
+        self._lock = threading.Lock()
+        self._exact = defaultdict(deque)
+        self._by_path = defaultdict(deque)
+        for entry in cassette.load():
+            self._exact[
+                self._exact_key(entry["method"], entry["url"], entry["body"])
+            ].append(entry)
+            self._by_path[self._path_key(entry["method"], entry["url"])].append(entry)
+
+    @staticmethod
+    def _exact_key(method, url, body):
+        return method.upper(), normalize_url(url), body or ""
+
+    @staticmethod
+    def _path_key(method, url):
+        return method.upper(), urlsplit(url).path
+
+    @staticmethod
+    def _next(entries):
+        return entries.popleft() if len(entries) > 1 else entries[0]
+
+    def match(self, method, url, body):
+        """
+        :type method: str
+        :type url: str
+        :type body: bytes | str | None
+        :rtype: dict
+        """
+        exact_key = self._exact_key(method, url, scrub_body(body))
+        path_key = self._path_key(method, url)
+        with self._lock:
+            if self._exact.get(exact_key):
+                return self._next(self._exact[exact_key])
+            if self._by_path.get(path_key):
+                return self._next(self._by_path[path_key])
+        raise CassetteMiss("cassette 中没有匹配的请求: {} {}".format(method, url))
+
+
+class ReplayAdapter(BaseAdapter):
+    """从 cassette 回放响应，不访问网络，匹配规则见 CassetteMatcher"""
+
+    def __init__(self, cassette, latency=False):
+        """
+        :type cassette: Cassette
+        :type latency: bool 是否按录制时的耗时 sleep
+        """
+        super().__init__()
+        self.latency = latency
+        self.matcher = CassetteMatcher(cassette)
+
+    def send(self, request, **kwargs):
+        entry = self.matcher.match(request.method, request.url, request.body)
+
+        if self.latency and entry.get("elapsed"):
+            time.sleep(entry["elapsed"])
+
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = entry.get("reason", "")
+        response.headers = CaseInsensitiveDict(entry.get("headers", {}))
+        response.encoding = entry.get("encoding") or "utf-8"
+        response._content = entry["content"].encode(response.encoding)
+        response.url = request.url
+        response.request = request
+        response.elapsed = datetime.timedelta(seconds=entry.get("elapsed") or 0)
+        return response
+
+    def close(self):
+        pass
+
+
+def cassette_path(email):
+    """
+    每个用户一个 cassette 文件，文件名不暴露邮箱
+
+    :type email: str
+    :rtype: Path
+    """
+    digest = hashlib.sha1(email.encode("utf-8")).hexdigest()[:12]
+    return Path(settings.MEICAN_CASSETTE_DIR) / "{}.jsonl.gz".format(digest)
+
+
+def recording_session(path):
+    """
+    :type path: str | Path
+    :rtype: requests.Session
+    """
+    session = requests.Session()
+    session.mount("https://", RecordingAdapter(Cassette(path)))
+    return session
+
+
+def replay_session(path, latency=False):
+    """
+    :type path: str | Path
+    :type latency: bool
+    :rtype: requests.Session
+    """
+    session = requests.Session()
+    adapter = ReplayAdapter(Cassette(path), latency=latency)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def session_for(email):
+    """
+    根据 MEICAN_CASSETTE_MODE 配置为用户创建 Session，未开启时返回 None
+
+    :type email: str
+    :rtype: requests.Session | None
+    """
+    mode = settings.MEICAN_CASSETTE_MODE
+    if mode == MODE_RECORD:
+        return recording_session(cassette_path(email))
+    if mode == MODE_REPLAY:
+        return replay_session(
+            cassette_path(email), latency=settings.MEICAN_CASSETTE_LATENCY
+        )
+    return None
+
+
+def recorded_username(path):
+    """
+    从 cassette 的登录请求中取出用户名（回放时 MeiCan 需要用它校验登录结果）
+
+    :type path: str | Path
+    :rtype: str | None
+    """
+    for entry in Cassette(path).load():
+        if "account/directlogin" in entry["url"]:
+            return dict(parse_qsl(entry["body"])).get("username")
+    return None
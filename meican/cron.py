@@ -4,71 +4,393 @@
 """
 
 import logging
-from datetime import datetime
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
+from django.conf import settings
+from django.db import connection
 from django.utils import timezone
 
+from meican import (
+    events,
+    journal,
+    leases,
+    planner,
+    profiling,
+    quarantine,
+    sharding,
+)
+from meican.db_writer import DBWriter, EventRecord, UserTouchRecord, apply_now
 from meican.meican_service import MeicanService
 from meican.models import MeicanUser
 
 logger = logging.getLogger("meican")
 
 
-def auto_order_meals():
+def auto_order_meals(
+    workers=None,
+    full=False,
+    shard=None,
+    run_id=None,
+    resume_only=False,
+    spread=None,
+    profile=None,
+):
     """
-    自动点餐任务 - 每个用户登录一次，同步 Tab 状态并处理所有可用的自助餐时段
+    自动点餐任务 - 每个用户登录一次，同步 Tab 状态并处理所有可用的自助餐时段。
+    同一范围（分片）存在中途退出的运行时，先从运行日志恢复该运行
+    :param workers: 并发处理的用户数，默认读取 MEICAN_CRON_WORKERS；大于 1 时数据库写入交给单写线程
+    :param full: 为 True 时跳过规划，处理所有活跃用户（失败隔离中的用户仍然跳过）
+    :param shard: 分片 "k/N"（或 ShardSpec），只处理属于该分片的用户，并把汇总写入共享目录
+    :param run_id: 分片汇总的运行编号，默认取启动时间（精确到分钟），同一时间点启动的分片相同
+    :param resume_only: 为 True 时只恢复未完成的运行，没有时直接返回
+    :param spread: 分散执行的窗口（分钟），默认读取 MEICAN_SPREAD_WINDOW_MINUTES，0 表示不分散
+    :param profile: 剖析模式（sample / cprofile），默认读取 MEICAN_PROFILE，False 表示不剖析
+    :return: 本次任务的汇总信息，剖析时 "profile" 为剖析结果
     """
-    logger.info("开始执行自动点餐任务")
+    try:
+        mode = profiling.resolve_mode(profile)
+    except ValueError as e:
+        # MEICAN_PROFILE 配置错误不能让定时任务停摆，本轮不剖析
+        logger.warning(f"{e}，本次运行不剖析")
+        mode = None
+    if mode:
+        if (
+            mode == profiling.MODE_CPROFILE
+            and (workers or settings.MEICAN_CRON_WORKERS) > 1
+        ):
+            # cProfile 只能可靠地跟踪一个线程
+            logger.warning("确定性剖析只跟踪当前线程，本次以单线程执行")
+            workers = 1
+        name = "auto_order" + (
+            f"-shard-{str(shard).replace('/', 'of')}" if shard else ""
+        )
+        with profiling.RunProfiler(mode, name) as profiler:
+            summary = auto_order_meals(
+                workers, full, shard, run_id, resume_only, spread, profile=False
+            )
+        summary["profile"] = profiler.report
+        return summary
+
+    started = time.time()
+    if shard is not None and not isinstance(shard, sharding.ShardSpec):
+        shard = sharding.ShardSpec.parse(shard)
+    logger.info("开始执行自动点餐任务" + (f"（分片 {shard}）" if shard else ""))
+
+    # 整轮任务的租约：上一轮（或同一分片的另一个进程）还没结束时本轮直接退出。
+    # 只恢复时通常是进程崩溃后立即重启，崩溃进程的租约要等 ttl 到期才能接管，最多等待一个 ttl
+    run_lease = leases.LeaseHolder(leases.run_lease_name(shard))
+    acquired = run_lease.acquire()
+    if not acquired and resume_only:
+        logger.info(
+            f"整轮租约 {run_lease.name} 仍被持有，最多等待 {run_lease.ttl} 秒直到其过期"
+        )
+        acquired = run_lease.acquire(run_lease.ttl)
+    if not acquired:
+        logger.warning(f"上一轮自动点餐任务仍在执行（{run_lease.name}），本轮跳过")
+        return _finish_summary(_new_summary(shard, run_id, started, locked=True))
+    try:
+        return _run_all(
+            workers, full, shard, run_id, started, resume_only, spread, run_lease
+        )
+    finally:
+        run_lease.release()
+
+
+def _new_summary(shard, run_id, started, **fields):
+    """
+    一轮任务的汇总：sharding.COUNTED_FIELDS 的计数从 0 开始，附带运行编号、分片和计时信息；
+    正常执行、被占用跳过和没有可恢复的运行都由这里创建，字段一致
+    :param fields: 覆盖默认值的字段
+    """
+    return {
+        **dict.fromkeys(sharding.COUNTED_FIELDS, 0),
+        "run": None,
+        "run_id": run_id or sharding.default_run_id(started),
+        "shard_index": shard.index if shard else None,
+        "shard_count": shard.count if shard else None,
+        "started_at": started,
+        "finished_at": None,
+        **fields,
+    }
+
+
+def _finish_summary(summary):
+    summary["finished_at"] = time.time()
+    return summary
+
+
+def _run_all(
+    workers,
+    full,
+    shard,
+    run_id,
+    started,
+    resume_only=False,
+    spread=None,
+    run_lease=None,
+):
+    """
+    持有整轮租约后执行：恢复或规划 -> 逐个（或并发）处理用户 -> 汇总
+    :param run_lease: 整轮任务的租约，失效后不再取出新的用户
+    """
+    workers = workers or settings.MEICAN_CRON_WORKERS
+    spread = settings.MEICAN_SPREAD_WINDOW_MINUTES if spread is None else spread
+
+    run = journal.unfinished_run(leases.run_lease_name(shard))
+    if run is not None:
+        # 上一次运行中途退出：跳过已处理完的用户，其余用户从日志记录的阶段继续
+        active_users, progress, finished = journal.resume_run(run)
+        # 中断期间被隔离的用户不再恢复
+        active_users, quarantined = quarantine.split_eligible(active_users)
+        for user in quarantined:
+            progress[user.id].finish(journal.SKIPPED, "失败隔离中")
+        logger.info(
+            f"从运行日志恢复运行 {run.id} - 已完成:{finished}, 待处理:{len(active_users)}"
+        )
+        summary = _new_summary(
+            shard,
+            run_id,
+            started,
+            total=finished + len(active_users) + len(quarantined),
+            planned=len(active_users),
+            quarantined=len(quarantined),
+            resumed=finished,
+        )
+    elif resume_only:
+        logger.info("没有需要恢复的运行")
+        return _finish_summary(_new_summary(shard, run_id, started, resumed=0))
+    else:
+        # 获取所有活跃用户
+        all_users = list(MeicanUser.objects.filter(is_active=True))
+        if shard:
+            all_users = shard.filter(all_users)
+        logger.info(f"找到 {len(all_users)} 个活跃用户")
+
+        # 连续失败的用户在退避时间到期之前不处理
+        eligible, quarantined = quarantine.split_eligible(all_users)
+        # 根据本地状态跳过没有待处理时段的用户，这些用户本轮不需要任何网络请求
+        to_process, skipped = planner.plan_users(eligible, full=full)
+        active_users = [user for user, _ in to_process]
+        run, progress = journal.start_run(
+            leases.run_lease_name(shard), active_users, full
+        )
+        summary = _new_summary(
+            shard,
+            run_id,
+            started,
+            total=len(all_users),
+            planned=len(active_users),
+            skipped=len(skipped),
+            quarantined=len(quarantined),
+        )
+    summary["run"] = run.id
+    job = {"job": "cron"}
+    if shard:
+        job["shard"] = str(shard)
+    events.emit(
+        events.KIND_JOB,
+        {**job, "stage": "start", "total": summary["planned"]},
+    )
+
+    if spread > 0:
+        # 用户在窗口内按各自的偏移量陆续放行；恢复的运行沿用原运行的窗口起点
+        queue = planner.SpreadQueue(
+            active_users, spread * 60, started=run.started_at.timestamp()
+        )
+        summary["spread_minutes"] = spread
+        logger.info(f"分散执行 - 窗口:{spread} 分钟, 用户:{len(active_users)}")
+    else:
+        # 截止时间最近的用户先处理
+        queue = planner.DeadlineQueue(active_users)
+    if workers > 1:
+        # 网络请求并发执行，数据库写入由单写线程合并成批量事务
+        with DBWriter() as writer:
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="meican-user"
+            ) as executor:
+                futures = [
+                    executor.submit(_drain, queue, writer, job, progress, run_lease)
+                    for _ in range(workers)
+                ]
+                for future in futures:
+                    for outcome, count in future.result().items():
+                        summary[outcome] += count
+        # 写线程已把所有结果落盘，才算本次任务完成
+        summary["written"] = writer.written
+        summary["write_errors"] = writer.errors
+    else:
+        for outcome, count in _drain(queue, None, job, progress, run_lease).items():
+            summary[outcome] += count
+    summary["deadline_missed"] = len(queue.missed)
+    _finish_summary(summary)
+
+    events.emit(
+        events.KIND_JOB,
+        {
+            **job,
+            "stage": "finish",
+            "total": summary["planned"],
+            "skipped": summary["skipped"],
+            "success": summary["success"],
+            "failed": summary["failed"],
+            "busy": summary["busy"],
+            "quarantined": summary["quarantined"],
+            "deadline_missed": summary["deadline_missed"],
+        },
+    )
+    events.prune()
+    if run_lease is not None and run_lease.lost:
+        # 整轮租约已被其他进程接管，该进程会从运行日志恢复本次运行，这里不能把运行标记为结束
+        summary["lease_lost"] = True
+        logger.warning(
+            f"整轮租约 {run_lease.name} 已被接管，未处理的用户交由接管的进程继续"
+        )
+    else:
+        # 写线程已经关闭，所有用户的进度都已落盘，才把运行标记为结束
+        journal.finish_run(run, summary)
+    journal.prune()
 
-    # 获取所有活跃用户
-    active_users = MeicanUser.objects.filter(is_active=True)
-    logger.info(f"找到 {active_users.count()} 个活跃用户")
+    logger.info(
+        f"自动点餐任务执行完成 - 成功:{summary['success']}, 失败:{summary['failed']}, 跳过:{summary['skipped']}, 被占用:{summary['busy']}, "
+        f"隔离中:{summary['quarantined']}, 错过截止:{summary['deadline_missed']}"
+    )
+    if shard:
+        _report_shard(shard, summary)
+    return summary
 
-    total_success = 0
-    total_failed = 0
 
-    for user in active_users:
-        try:
-            # 为该用户执行完整的流程（登录 + 同步状态 + 批量订餐）
-            success, result_info = _process_user_complete_flow(user)
+def _drain(queue, writer, job, progress, run_lease=None):
+    """
+    工作线程从队列中按截止时间依次取出用户处理，直到队列为空或整轮租约失效
+    :return: Counter，各结果的用户数
+    """
+    outcomes = Counter()
+    while True:
+        user = queue.pop()
+        if user is None:
+            return outcomes
+        # 分散执行时 pop 可能等待很久，取出用户后再确认租约仍然有效
+        if run_lease is not None and run_lease.lost:
+            return outcomes
+        outcomes[_run_user(user, writer, job, progress.get(user.id))] += 1
+
+
+def _report_shard(shard, summary):
+    """写入本分片的汇总；所有分片都已完成时输出合并后的汇总"""
+    run_id = summary["run_id"]
+    try:
+        sharding.write_summary(run_id, shard, summary)
+        combined = sharding.aggregate(run_id)
+    except Exception as e:
+        logger.error(f"写入分片 {shard} 汇总失败: {e}")
+        return
+    if combined and not combined["missing"]:
+        logger.info(
+            f"运行 {run_id} 的 {combined['shard_count']} 个分片均已完成 - "
+            f"成功:{combined['success']}, 失败:{combined['failed']}, 跳过:{combined['skipped']}, "
+            f"被占用:{combined['busy']}, 隔离中:{combined['quarantined']}, "
+            f"错过截止:{combined['deadline_missed']}, "
+            f"耗时:{combined['wall_seconds']}s"
+        )
 
-            if success:
-                total_success += 1
 
-                # 提取摘要信息
-                order_info = result_info.get("order_info", {})
-                summary = order_info.get("summary", {})
+def _run_user(user, writer=None, job=None, item=None):
+    """
+    处理单个用户并记录日志
+    :param job: 进度事件的任务信息（分片执行时包含分片编号）
+    :param item: journal.ItemProgress，记录该用户在运行日志中的进度
+    :return: "success"、"failed" 或 "busy"（用户正被其他流程处理，或处理中途租约被接管）
+    """
+    lease = leases.LeaseHolder(leases.user_lease_name(user.id))
+    outcome = "failed"
+    error = ""
+    if item:
+        item.writer = writer
+    try:
+        # 用户正在被手动点餐、刷新等其他流程处理时，本轮跳过，不等待
+        if not lease.acquire():
+            logger.info(f"用户 {user.email} 正在被其他流程处理，本轮跳过")
+            outcome = "busy"
+            return outcome
 
-                successful_orders = summary.get("successful_count", 0)
-                already_ordered = summary.get("already_ordered_count", 0)
-                unavailable = summary.get("unavailable_count", 0)
+        # 为该用户执行完整的流程（登录 + 同步状态 + 批量订餐）
+        if item:
+            item.resume()
+        success, result_info = _process_user_complete_flow(user, writer, item, lease)
 
-                logger.info(
-                    f"用户 {user.email} 处理完成 - 新订餐:{successful_orders}, 已有订单:{already_ordered}, 不可用:{unavailable}"
-                )
-            else:
-                total_failed += 1
-                logger.warning(f"用户 {user.email} 处理失败: {result_info}")
+        if success:
+            # 提取摘要信息
+            order_info = result_info.get("order_info", {})
+            summary = order_info.get("summary", {})
 
-        except Exception as e:
-            total_failed += 1
-            logger.error(f"为用户 {user.email} 处理订单时发生错误: {str(e)}")
+            successful_orders = summary.get("successful_count", 0)
+            already_ordered = summary.get("already_ordered_count", 0)
+            unavailable = summary.get("unavailable_count", 0)
 
-    logger.info(f"自动点餐任务执行完成 - 成功:{total_success}, 失败:{total_failed}")
+            logger.info(
+                f"用户 {user.email} 处理完成 - 新订餐:{successful_orders}, 已有订单:{already_ordered}, 不可用:{unavailable}"
+            )
+            outcome = "success"
+        else:
+            error = str(result_info)
+            logger.warning(f"用户 {user.email} 处理失败: {result_info}")
+        return outcome
+
+    except leases.LeaseLost:
+        # 接管租约的流程会继续处理该用户，不计入连续失败
+        logger.warning(f"用户 {user.email} 的租约已被其他流程接管，中止处理")
+        outcome = "busy"
+        return outcome
+    except Exception as e:
+        error = str(e)
+        logger.error(f"为用户 {user.email} 处理订单时发生错误: {str(e)}")
+        return outcome
+    finally:
+        if outcome != "busy":
+            # 连续失败的用户按退避时间隔离，成功后清零
+            quarantine.record(user.id, outcome == "success", error, writer)
+        if item:
+            item.finish(journal.OUTCOME_STATUS[outcome], error)
+        # 租约在该用户的数据落盘后才释放
+        lease.release(writer)
+        # 每处理完一个用户推送一次进度，经由写线程时排在该用户的数据之后落盘
+        record = EventRecord(
+            events.KIND_JOB,
+            {
+                **(job or {"job": "cron"}),
+                "stage": "progress",
+                "email": user.email,
+                "outcome": outcome,
+            },
+            user.id,
+        )
+        if writer:
+            writer.submit(record)
+            # 工作线程各自持有 SQLite 连接，用完即关
+            connection.close()
+        else:
+            apply_now(record)
 
 
-def _process_user_complete_flow(user):
+def _process_user_complete_flow(user, writer=None, item=None, lease=None):
     """
     为单个用户执行完整流程：登录 -> 同步 Tab 状态 -> 批量订餐
     :param user: MeicanUser 实例
+    :param writer: DBWriter 对象，并发执行时由写线程负责数据库写入
+    :param item: journal.ItemProgress，记录进度；从日志恢复时跳过上次已完成的同步
+    :param lease: 该用户的 LeaseHolder，每个阶段开始前确认租约仍然有效
     :return: (success, result_info)
+    :raises leases.LeaseLost: 处理中途租约被其他流程接管
     """
-    meican_service = MeicanService()
+    meican_service = MeicanService(writer=writer)
 
     try:
         logger.info(f"开始为用户 {user.email} 执行完整流程...")
 
         # 1. 登录（只登录一次）
+        _enter_stage(item, journal.STAGE_LOGIN, lease)
         success, _, error = meican_service.login(user.email)
         if not success:
             return False, f"登录失败: {error}"
@@ -76,7 +398,14 @@ def _process_user_complete_flow(user):
         logger.info(f"用户 {user.email} 登录成功")
 
         # 2. 同步 Tab 状态到数据库
-        sync_success, sync_info, sync_error = meican_service.sync_user_tabs_status(user)
+        if item and item.completed(journal.STAGE_SYNC):
+            logger.info(f"用户 {user.email} 上次运行已完成同步，从下单阶段继续")
+            sync_success, sync_info, sync_error = True, {"resumed": True}, None
+        else:
+            _enter_stage(item, journal.STAGE_SYNC, lease)
+            sync_success, sync_info, sync_error = meican_service.sync_user_tabs_status(
+                user
+            )
         if not sync_success:
             logger.warning(f"用户 {user.email} 同步状态失败: {sync_error}")
             # 即使同步失败也继续尝试订餐
@@ -85,6 +414,8 @@ def _process_user_complete_flow(user):
             logger.info(f"用户 {user.email} 已同步 {len(synced_tabs)} 个 Tab 状态")
 
         # 3. 批量订购所有可用的自助餐
+        # 下单前必须确认租约仍然有效，避免与接管的流程重复下单
+        _enter_stage(item, journal.STAGE_ORDER, lease)
         order_success, order_info, order_error = (
             meican_service.order_all_available_buffets(user)
         )
@@ -94,7 +425,10 @@ def _process_user_complete_flow(user):
 
         # 4. 更新用户最后登录时间
         user.last_login_attempt = timezone.now()
-        user.save()
+        if writer:
+            writer.submit(UserTouchRecord(user.id, user.last_login_attempt))
+        else:
+            user.save()
 
         # 汇总结果
         result_info = {
@@ -109,12 +443,21 @@ def _process_user_complete_flow(user):
 
         return overall_success, result_info
 
+    except leases.LeaseLost:
+        raise
     except Exception as e:
         error_msg = f"处理用户流程时发生异常: {str(e)}"
         logger.error(f"用户 {user.email}: {error_msg}")
         return False, error_msg
 
 
+def _enter_stage(item, stage, lease=None):
+    if lease is not None:
+        lease.check()
+    if item:
+        item.enter(stage)
+
+
 def manual_order_for_user(user_email, force_refresh=True):
     """
     手动为指定用户执行完整流程（用于测试或手动触发）
@@ -124,53 +467,67 @@ def manual_order_for_user(user_email, force_refresh=True):
     """
     try:
         user = MeicanUser.objects.get(email=user_email, is_active=True)
-
-        if force_refresh:
-            # 使用完整流程
-            success, result_info = _process_user_complete_flow(user)
-        else:
-            # 只执行订餐，不刷新状态
-            meican_service = MeicanService()
-            success, _, error = meican_service.login(user.email)
-            if not success:
-                return False, f"登录失败: {error}"
-
-            order_success, order_info, order_error = (
-                meican_service.order_all_available_buffets(user)
-            )
-            success = order_success
-            result_info = order_info if order_success else order_error
-
-        if success:
-            if isinstance(result_info, dict) and "order_info" in result_info:
-                summary = result_info["order_info"].get("summary", {})
-                successful_count = summary.get("successful_count", 0)
-                already_ordered_count = summary.get("already_ordered_count", 0)
-
-                message_parts = []
-                if successful_count > 0:
-                    message_parts.append(f"新订餐成功: {successful_count} 个时段")
-                if already_ordered_count > 0:
-                    message_parts.append(f"已有订单: {already_ordered_count} 个时段")
-
-                message = (
-                    f"用户 {user_email} 处理完成 - " + "; ".join(message_parts)
-                    if message_parts
-                    else f"用户 {user_email} 处理完成，无可订餐时段"
-                )
-            else:
-                message = f"用户 {user_email} 处理完成"
-
-            return True, message
-        else:
-            return False, f"用户 {user_email} 处理失败: {result_info}"
+        with leases.LeaseHolder(
+            leases.user_lease_name(user.id), wait=settings.MEICAN_LEASE_WAIT
+        ) as lease:
+            success, message = _manual_order(user, user_email, force_refresh, lease)
+        # 手动执行不受隔离限制，结果同样计入连续失败次数
+        quarantine.record(user.id, success, "" if success else message)
+        return success, message
 
     except MeicanUser.DoesNotExist:
         return False, f"用户 {user_email} 不存在或未激活"
+    except leases.LeaseBusy:
+        return False, f"用户 {user_email} 正在被其他任务处理，请稍后再试"
+    except leases.LeaseLost:
+        return False, f"用户 {user_email} 的处理被其他任务接管，已中止"
     except Exception as e:
         return False, f"手动处理时发生错误: {str(e)}"
 
 
+def _manual_order(user, user_email, force_refresh, lease=None):
+    """持有用户租约后执行 manual_order_for_user"""
+    if force_refresh:
+        # 使用完整流程
+        success, result_info = _process_user_complete_flow(user, lease=lease)
+    else:
+        # 只执行订餐，不刷新状态
+        meican_service = MeicanService()
+        success, _, error = meican_service.login(user.email)
+        if not success:
+            return False, f"登录失败: {error}"
+
+        order_success, order_info, order_error = (
+            meican_service.order_all_available_buffets(user)
+        )
+        success = order_success
+        result_info = order_info if order_success else order_error
+
+    if success:
+        if isinstance(result_info, dict) and "order_info" in result_info:
+            summary = result_info["order_info"].get("summary", {})
+            successful_count = summary.get("successful_count", 0)
+            already_ordered_count = summary.get("already_ordered_count", 0)
+
+            message_parts = []
+            if successful_count > 0:
+                message_parts.append(f"新订餐成功: {successful_count} 个时段")
+            if already_ordered_count > 0:
+                message_parts.append(f"已有订单: {already_ordered_count} 个时段")
+
+            message = (
+                f"用户 {user_email} 处理完成 - " + "; ".join(message_parts)
+                if message_parts
+                else f"用户 {user_email} 处理完成，无可订餐时段"
+            )
+        else:
+            message = f"用户 {user_email} 处理完成"
+
+        return True, message
+    else:
+        return False, f"用户 {user_email} 处理失败: {result_info}"
+
+
 def refresh_user_tabs_only(user_email):
     """
     仅刷新用户的 Tab 状态，不执行订餐（用于前端刷新功能）
@@ -182,13 +539,18 @@ def refresh_user_tabs_only(user_email):
 
         meican_service = MeicanService()
 
-        # 登录
-        success, _, error = meican_service.login(user.email)
-        if not success:
-            return False, f"登录失败: {error}"
+        with leases.LeaseHolder(
+            leases.user_lease_name(user.id), wait=settings.MEICAN_LEASE_WAIT
+        ):
+            # 登录
+            success, _, error = meican_service.login(user.email)
+            if not success:
+                return False, f"登录失败: {error}"
 
-        # 只同步状态，不订餐
-        sync_success, sync_info, sync_error = meican_service.sync_user_tabs_status(user)
+            # 只同步状态，不订餐
+            sync_success, sync_info, sync_error = meican_service.sync_user_tabs_status(
+                user
+            )
 
         if sync_success:
             synced_tabs = sync_info.get("synced_tabs", [])
@@ -201,6 +563,8 @@ def refresh_user_tabs_only(user_email):
 
     except MeicanUser.DoesNotExist:
         return False, f"用户 {user_email} 不存在或未激活"
+    except leases.LeaseBusy:
+        return False, f"用户 {user_email} 正在被其他任务处理，请稍后再试"
     except Exception as e:
         return False, f"刷新状态时发生错误: {str(e)}"
 
@@ -213,7 +577,15 @@ def _order_for_user(user, date):
     :param date: 日期对象（暂时未使用，因为新逻辑会处理所有可用日期）
     :return: (success, error_message)
     """
-    success, result_info = _process_user_complete_flow(user)
+    try:
+        with leases.LeaseHolder(
+            leases.user_lease_name(user.id), wait=settings.MEICAN_LEASE_WAIT
+        ) as lease:
+            success, result_info = _process_user_complete_flow(user, lease=lease)
+    except leases.LeaseBusy:
+        return False, "用户正在被其他任务处理"
+    except leases.LeaseLost:
+        return False, "用户的处理被其他任务接管，已中止"
     if success:
         return True, "处理完成"
     else:
@@ -0,0 +1,94 @@
+"""
+用户面板缓存
+每个用户的面板数据（按日期分组的 Tab 状态、订单汇总）缓存在 Django cache 中，
+缓存 key 带有用户的版本号（保存在数据库里）；同步、下单时递增版本号，页面只重新读取版本变化了的用户，
+未命中时从物化读模型 DashboardDay 读取（见 read_model）
+"""
+
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import DashboardDay, MeicanUser
+
+VIEW_MODEL_KEY = "meican:dashboard:user:{user_id}:{version}:{date}"
+# 面板数据只和版本号有关，TTL 只用于清理不再访问的旧版本
+VIEW_MODEL_TTL = 7 * 24 * 3600
+
+
+def bump_user_version(user_id):
+    """
+    用户数据发生变化后调用，使该用户的面板缓存失效。
+    版本号保存在 MeicanUser.dashboard_version，用 F() 原子递增，并发的递增不会丢失；
+    在写入数据的事务里调用时与数据一起提交，读者不会用新版本号缓存到提交前的数据
+    """
+    MeicanUser.objects.filter(pk=user_id).update(
+        dashboard_version=F("dashboard_version") + 1
+    )
+
+
+def get_view_models(users, today, using="default"):
+    """
+    获取用户面板数据，未命中缓存的用户批量重新计算
+
+    :param users: MeicanUser 列表（版本号取自读取用户时的 dashboard_version）
+    :type today: datetime.date
+    :return: 与 users 顺序一致的面板数据列表，每项包含 "user" 对象
+    """
+    keys = {
+        user.id: VIEW_MODEL_KEY.format(
+            user_id=user.id, version=user.dashboard_version, date=today.isoformat()
+        )
+        for user in users
+    }
+    cached = cache.get_many(keys.values())
+
+    missing = [user.id for user in users if keys[user.id] not in cached]
+    if missing:
+        built = build_view_models(missing, today, using)
+        cache.set_many(
+            {keys[user_id]: built[user_id] for user_id in missing},
+            timeout=VIEW_MODEL_TTL,
+        )
+        cached.update({keys[user_id]: built[user_id] for user_id in missing})
+
+    return [{"user": user, **cached[keys[user.id]]} for user in users]
+
+
+def build_view_models(user_ids, today, using="default"):
+    """
+    从物化读模型 DashboardDay 用一条查询批量读取多个用户今天及以后的面板数据
+    :return: {user_id: view_model}
+    """
+    days_by_user = {user_id: [] for user_id in user_ids}
+    for day in (
+        DashboardDay.objects.using(using)
+        .filter(user_id__in=user_ids, date__gte=today)
+        .order_by("user_id", "date")
+        .only("user_id", "date", "tabs", "orders", "meals")
+    ):
+        days_by_user[day.user_id].append(day)
+
+    return {user_id: _view_model(days_by_user[user_id], today) for user_id in user_ids}
+
+
+def _view_model(days, today):
+    tabs_by_date = {day.date.isoformat(): day.tabs for day in days if day.tabs}
+    orders_by_date = {day.date.isoformat(): day.orders for day in days if day.orders}
+    by_date = {day.date: day for day in days}
+
+    # 今天和明天的状态（为了兼容现有模板）
+    today_day = by_date.get(today)
+    tomorrow_day = by_date.get(today + timedelta(days=1))
+
+    return {
+        "today_ordered": bool(today_day and today_day.orders),
+        "today_meal": (today_day.meals or None) if today_day else None,
+        "tomorrow_ordered": bool(tomorrow_day and tomorrow_day.orders),
+        "tomorrow_meal": (tomorrow_day.meals or None) if tomorrow_day else None,
+        "tabs_by_date": tabs_by_date,
+        "orders_by_date": orders_by_date,
+        "tab_status_count": sum(len(day.tabs) for day in days),
+        "order_count": sum(len(day.orders) for day in days),
+    }
@@ -0,0 +1,415 @@
+"""
+数据库写入阶段
+并发执行用户流程时，工作线程只负责网络请求，把结果记录投递到队列，
+由单独的写线程按批合并成大事务写入 SQLite，避免多个线程争抢同一把写锁
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import analytics, events, read_model
+from .dashboard_cache import bump_user_version
+
+logger = logging.getLogger("meican")
+
+
+class TabSyncRecord(object):
+    """一次 Tab 同步结果：清除用户今天及以后的 Tab / 订单记录后重建"""
+
+    def __init__(self, user_id, today, tabs):
+        """
+        :type user_id: int
+        :type today: datetime.date
+        :param tabs: [{"tab_uid", "tab_title", "target_time", "close_time", "status", "order_date"}]
+        """
+        self.user_id = user_id
+        self.today = today
+        self.tabs = tabs
+
+    def apply(self):
+        """
+        :return: {"created": [bool]，与 tabs 一一对应，表示该行是否真正写入；
+                  "conflicts": [{"tab_title", "order_date", "reason"}]，因唯一约束冲突而没有写入的行}
+        """
+        from .models import OrderRecord, TabStatus
+
+        previous = {
+            (row["tab_uid"], row["order_date"]): row["status"]
+            for row in TabStatus.objects.filter(
+                user_id=self.user_id, order_date__gte=self.today
+            ).values("tab_uid", "order_date", "status")
+        }
+
+        TabStatus.objects.filter(
+            user_id=self.user_id, order_date__gte=self.today
+        ).delete()
+        OrderRecord.objects.filter(
+            user_id=self.user_id, order_date__gte=self.today
+        ).delete()
+
+        TabStatus.objects.bulk_create(
+            [TabStatus(user_id=self.user_id, **tab) for tab in self.tabs],
+            ignore_conflicts=True,
+        )
+        # 已点餐的时段同时创建对应的 OrderRecord，菜品名称使用占位符（因为无法从Tab状态获取具体菜品）
+        ordered = [tab for tab in self.tabs if tab["status"] == "ORDERED"]
+        OrderRecord.objects.bulk_create(
+            [
+                OrderRecord(
+                    user_id=self.user_id,
+                    order_date=tab["order_date"],
+                    meal_period=tab["tab_title"],
+                    meal_name="已点餐（从美餐同步）",
+                    success=True,
+                    error_message=None,
+                    tab_uid=tab["tab_uid"],
+                )
+                for tab in ordered
+            ],
+            ignore_conflicts=True,
+        )
+
+        # ignore_conflicts 不会报告被跳过的行：按唯一键重新查询，实际写入的行与提交的行一致才算写入，
+        # 同一个键提交了多行时只有第一行生效
+        stored_tabs = {
+            (row["tab_uid"], row["order_date"]): row
+            for row in TabStatus.objects.filter(
+                user_id=self.user_id, order_date__gte=self.today
+            ).values("tab_uid", "order_date", "tab_title", "status")
+        }
+        stored_orders = {
+            (row["order_date"], row["meal_period"]): row["tab_uid"]
+            for row in OrderRecord.objects.filter(
+                user_id=self.user_id, order_date__gte=self.today
+            ).values("order_date", "meal_period", "tab_uid")
+        }
+        created = []
+        conflicts = []
+        claimed_tabs = set()
+        claimed_orders = set()
+        for tab in self.tabs:
+            tab_key = (tab["tab_uid"], tab["order_date"])
+            stored = stored_tabs.get(tab_key)
+            inserted = (
+                tab_key not in claimed_tabs
+                and stored is not None
+                and stored["tab_title"] == tab["tab_title"]
+                and stored["status"] == tab["status"]
+            )
+            claimed_tabs.add(tab_key)
+            reason = None if inserted else "同一时段重复"
+            if inserted and tab["status"] == "ORDERED":
+                order_key = (tab["order_date"], tab["tab_title"])
+                if (
+                    order_key in claimed_orders
+                    or stored_orders.get(order_key) != tab["tab_uid"]
+                ):
+                    reason = "同一天同名时段的订单重复"
+                claimed_orders.add(order_key)
+            created.append(inserted)
+            if reason:
+                conflicts.append(
+                    {
+                        "tab_title": tab["tab_title"],
+                        "order_date": tab["order_date"].isoformat(),
+                        "reason": reason,
+                    }
+                )
+        if conflicts:
+            logger.warning(
+                f"用户 {self.user_id} 同步 Tab 时有 {len(conflicts)} 行因唯一约束冲突没有写入: {conflicts}"
+            )
+
+        read_model.refresh_user(self.user_id, self.today)
+        bump_user_version(self.user_id)
+        # 跨过零点时 self.today 可能已经是昨天，重建的是缓存过的历史日期
+        analytics.invalidate_past(
+            {self.today, *(tab["order_date"] for tab in self.tabs)}
+        )
+
+        changes = [
+            {
+                "tab_title": tab["tab_title"],
+                "order_date": tab["order_date"].isoformat(),
+                "from": previous.get((tab["tab_uid"], tab["order_date"])),
+                "to": tab["status"],
+            }
+            for tab, inserted in zip(self.tabs, created)
+            if inserted
+            and previous.get((tab["tab_uid"], tab["order_date"])) != tab["status"]
+        ]
+        if changes:
+            events.emit(events.KIND_TAB_STATUS, {"changes": changes}, self.user_id)
+        return {"created": created, "conflicts": conflicts}
+
+
+class OrderResultRecord(object):
+    """一次下单结果（成功或失败）"""
+
+    def __init__(
+        self,
+        user_id,
+        order_date,
+        meal_period,
+        meal_name,
+        success,
+        error_message,
+        tab_uid,
+    ):
+        self.user_id = user_id
+        self.order_date = order_date
+        self.meal_period = meal_period
+        self.meal_name = meal_name
+        self.success = success
+        self.error_message = error_message
+        self.tab_uid = tab_uid
+
+    def apply(self):
+        from .models import OrderRecord, TabStatus
+
+        if self.success and self.tab_uid:
+            # 同步更新本地 Tab 状态，规划时不必等到下次同步才知道这个时段已点餐
+            TabStatus.objects.filter(
+                user_id=self.user_id, tab_uid=self.tab_uid, order_date=self.order_date
+            ).update(status="ORDERED")
+        OrderRecord.objects.update_or_create(
+            user_id=self.user_id,
+            order_date=self.order_date,
+            meal_period=self.meal_period,
+            defaults={
+                "meal_name": self.meal_name,
+                "success": self.success,
+                "error_message": self.error_message,
+                "tab_uid": self.tab_uid,
+            },
+        )
+        read_model.refresh_days(self.user_id, [self.order_date])
+        bump_user_version(self.user_id)
+        analytics.invalidate_past([self.order_date])
+        events.emit(
+            events.KIND_ORDER,
+            {
+                "order_date": self.order_date.isoformat(),
+                "meal_period": self.meal_period,
+                "meal_name": self.meal_name,
+                "success": self.success,
+                "error_message": self.error_message,
+            },
+            self.user_id,
+        )
+
+
+class UserTouchRecord(object):
+    """更新用户最后登录时间"""
+
+    def __init__(self, user_id, last_login_attempt):
+        self.user_id = user_id
+        self.last_login_attempt = last_login_attempt
+
+    def apply(self):
+        from .models import MeicanUser
+
+        MeicanUser.objects.filter(pk=self.user_id).update(
+            last_login_attempt=self.last_login_attempt
+        )
+
+
+class QuarantineRecord(object):
+    """一次处理结果：成功时清除失败计数，失败时累加并按退避时间隔离"""
+
+    def __init__(self, user_id, success, error=""):
+        self.user_id = user_id
+        self.success = success
+        self.error = error
+
+    def apply(self):
+        from django.db.models import F, Q
+        from django.utils import timezone
+
+        from .models import MeicanUser
+        from .quarantine import backoff_delay
+
+        users = MeicanUser.objects.filter(pk=self.user_id)
+        if self.success:
+            users.filter(
+                Q(consecutive_failures__gt=0) | Q(next_eligible_at__isnull=False)
+            ).update(consecutive_failures=0, next_eligible_at=None, last_failure="")
+            return
+
+        users.update(
+            consecutive_failures=F("consecutive_failures") + 1,
+            last_failure=self.error[:500],
+        )
+        row = users.values("email", "consecutive_failures").first()
+        if row is None:
+            return
+        delay = backoff_delay(row["consecutive_failures"])
+        if delay is not None:
+            users.update(next_eligible_at=timezone.now() + delay)
+            logger.warning(
+                f"用户 {row['email']} 已连续失败 {row['consecutive_failures']} 次，隔离 {delay}"
+            )
+
+
+class EventRecord(object):
+    """面板事件（如任务进度）"""
+
+    def __init__(self, kind, payload, user_id=None):
+        self.kind = kind
+        self.payload = payload
+        self.user_id = user_id
+
+    def apply(self):
+        events.emit(self.kind, self.payload, self.user_id)
+
+
+class LeaseReleaseRecord(object):
+    """释放租约：经由写线程时与该用户的数据在同一批事务里提交"""
+
+    def __init__(self, name, owner):
+        self.name = name
+        self.owner = owner
+
+    def apply(self):
+        from .leases import release
+
+        release(self.name, self.owner)
+
+
+class RunItemRecord(object):
+    """运行日志中单个用户的进度变化"""
+
+    def __init__(self, item_id, status=None, stage=None, error=None, attempt=False):
+        """
+        :param attempt: 为 True 时尝试次数加一
+        """
+        self.item_id = item_id
+        self.status = status
+        self.stage = stage
+        self.error = error
+        self.attempt = attempt
+
+    def apply(self):
+        from django.db.models import F
+        from django.utils import timezone
+
+        from .models import OrderRunItem
+
+        fields = {"updated_at": timezone.now()}
+        if self.status is not None:
+            fields["status"] = self.status
+        if self.stage is not None:
+            fields["stage"] = self.stage
+        if self.error is not None:
+            fields["error"] = self.error
+        if self.attempt:
+            fields["attempts"] = F("attempts") + 1
+        OrderRunItem.objects.filter(pk=self.item_id).update(**fields)
+
+
+def apply_now(record):
+    """
+    不经过写线程，直接在一个事务里写入
+    :return: record.apply() 的返回值
+    """
+    with transaction.atomic():
+        return record.apply()
+
+
+class DBWriter(object):
+    """
+    单写线程：按 flush_interval / flush_size 把队列里的记录合并成一个事务写入。
+    close() 会等待队列中所有记录落盘后才返回。
+    """
+
+    _STOP = object()
+
+    def __init__(self, flush_interval=None, flush_size=None):
+        self.flush_interval = (
+            settings.MEICAN_DB_FLUSH_INTERVAL
+            if flush_interval is None
+            else flush_interval
+        )
+        self.flush_size = (
+            settings.MEICAN_DB_FLUSH_SIZE if flush_size is None else flush_size
+        )
+        self.written = 0
+        self.errors = []
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="meican-db-writer", daemon=True
+        )
+        self._closed = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, record):
+        if self._closed:
+            raise RuntimeError("DBWriter 已关闭")
+        self._queue.put(record)
+
+    def close(self):
+        """停止接收新记录，等待所有记录写入数据库"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _run(self):
+        try:
+            stopping = False
+            while not stopping:
+                batch = []
+                deadline = None
+                while len(batch) < self.flush_size:
+                    timeout = None if deadline is None else deadline - time.monotonic()
+                    if timeout is not None and timeout <= 0:
+                        break
+                    try:
+                        record = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if record is self._STOP:
+                        stopping = True
+                        break
+                    batch.append(record)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                if batch:
+                    self._flush(batch)
+        finally:
+            connection.close()
+
+    def _flush(self, batch):
+        try:
+            with transaction.atomic():
+                for record in batch:
+                    record.apply()
+            self.written += len(batch)
+            logger.debug(f"写线程提交 {len(batch)} 条记录")
+            return
+        except Exception as e:
+            logger.error(f"批量写入失败，改为逐条写入: {e}")
+
+        # 整批失败时逐条重试，避免一条坏记录拖累整批
+        for record in batch:
+            try:
+                apply_now(record)
+                self.written += 1
+            except Exception as e:
+                logger.error(f"写入 {type(record).__name__} 失败: {e}")
+                self.errors.append(f"{type(record).__name__}: {e}")
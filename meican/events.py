@@ -0,0 +1,158 @@
+"""
+面板实时事件
+同步、下单和任务进度把增量写入 DashboardEvent 表（与数据写入在同一个事务里），
+SSE 接口轮询该表并推送给页面；表存在数据库里，cron 进程产生的事件 Web 进程也能推送
+"""
+
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import dashboard_cache
+from .models import DashboardEvent, MeicanUser
+
+logger = logging.getLogger("meican")
+
+KIND_TAB_STATUS = "tab_status"
+KIND_ORDER = "order"
+KIND_JOB = "job"
+KIND_USER_DELETED = "user_deleted"
+
+# 这些事件会改变用户那一行的展示，推送时附带最新的行数据（任务进度事件带 user_id 时也附带）
+ROW_KINDS = {KIND_TAB_STATUS, KIND_ORDER, KIND_JOB}
+
+
+def emit(kind, payload, user_id=None):
+    """记录一个事件，失败不影响主流程"""
+    try:
+        # 嵌套在写入事务里时用保存点，插入失败不会破坏外层事务
+        with transaction.atomic():
+            DashboardEvent.objects.create(user_id=user_id, kind=kind, payload=payload)
+    except Exception as e:
+        logger.error(f"记录面板事件失败: {e}")
+
+
+def prune(max_age=None):
+    """删除过期事件"""
+    max_age = max_age or settings.DASHBOARD_EVENT_TTL
+    try:
+        DashboardEvent.objects.filter(
+            created_at__lt=timezone.now() - timedelta(seconds=max_age)
+        ).delete()
+    except Exception as e:
+        logger.error(f"清理面板事件失败: {e}")
+
+
+def latest_event_id():
+    latest = DashboardEvent.objects.order_by("-id").values_list("id", flat=True).first()
+    return latest or 0
+
+
+def stream(last_event_id, using="default"):
+    """
+    SSE 事件流生成器：轮询 id 大于 last_event_id 的事件并推送，
+    每隔一段时间发送心跳；连接到达最长时间后结束，浏览器会带着 Last-Event-ID 自动重连
+    """
+    started = time.monotonic()
+    last_sent = started
+    yield f"retry: {settings.DASHBOARD_EVENT_RETRY_MS}\n\n"
+
+    while time.monotonic() - started < settings.DASHBOARD_EVENT_STREAM_SECONDS:
+        chunks, last_event_id = _poll(last_event_id, using)
+        if chunks:
+            yield "".join(chunks)
+            last_sent = time.monotonic()
+            continue
+
+        if time.monotonic() - last_sent >= settings.DASHBOARD_EVENT_HEARTBEAT:
+            yield ": heartbeat\n\n"
+            last_sent = time.monotonic()
+        time.sleep(settings.DASHBOARD_EVENT_POLL_INTERVAL)
+
+
+async def astream(last_event_id, using="default"):
+    """
+    stream 的异步版本，供 ASGI 部署使用：
+    ASGI 下同步生成器会被完整消费后才发送，等待期间也不应占用线程
+    """
+    started = time.monotonic()
+    last_sent = started
+    yield f"retry: {settings.DASHBOARD_EVENT_RETRY_MS}\n\n"
+
+    while time.monotonic() - started < settings.DASHBOARD_EVENT_STREAM_SECONDS:
+        chunks, last_event_id = await sync_to_async(_poll)(last_event_id, using)
+        if chunks:
+            yield "".join(chunks)
+            last_sent = time.monotonic()
+            continue
+
+        if time.monotonic() - last_sent >= settings.DASHBOARD_EVENT_HEARTBEAT:
+            yield ": heartbeat\n\n"
+            last_sent = time.monotonic()
+        await asyncio.sleep(settings.DASHBOARD_EVENT_POLL_INTERVAL)
+
+
+def _poll(last_event_id, using):
+    """
+    取一批新事件并格式化
+    :return: (chunks, last_event_id)
+    """
+    events = list(
+        DashboardEvent.objects.using(using)
+        .filter(id__gt=last_event_id)
+        .order_by("id")[:100]
+    )
+    if not events:
+        return [], last_event_id
+    rows = _rows_for(events, using)
+    chunks = []
+    for event in events:
+        data = {"user_id": event.user_id, **event.payload}
+        if event.user_id in rows:
+            data["row"] = rows[event.user_id]
+        chunks.append(_format(event.id, event.kind, data))
+    return chunks, events[-1].id
+
+
+def _rows_for(events, using):
+    """
+    为受影响的用户计算最新的行数据，每批每个用户只算一次。
+    直接查数据库而不走面板缓存：事件提交和缓存版本号递增之间有一个很短的窗口
+    """
+    user_ids = {
+        event.user_id
+        for event in events
+        if event.kind in ROW_KINDS and event.user_id is not None
+    }
+    user_ids &= set(
+        MeicanUser.objects.using(using)
+        .filter(id__in=user_ids)
+        .values_list("id", flat=True)
+    )
+    if not user_ids:
+        return {}
+    view_models = dashboard_cache.build_view_models(
+        list(user_ids), datetime.now().date(), using=using
+    )
+    return {
+        user_id: {
+            "today_ordered": view_model["today_ordered"],
+            "today_meal": view_model["today_meal"],
+            "tomorrow_ordered": view_model["tomorrow_ordered"],
+            "tomorrow_meal": view_model["tomorrow_meal"],
+        }
+        for user_id, view_model in view_models.items()
+    }
+
+
+def _format(event_id, kind, data):
+    return "id: {}\nevent: {}\ndata: {}\n\n".format(
+        event_id, kind, json.dumps(data, ensure_ascii=False, default=str)
+    )
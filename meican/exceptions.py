@@ -15,5 +15,13 @@ class MeiCanLoginFail(MeiCanError):
     """用户名或密码错误，导致的登录失败"""
 
 
+class MeiCanSessionExpired(MeiCanError):
+    """登录会话已失效，需要重新登录"""
+
+
 class NoOrderAvailable(MeiCanError):
     """目前还点不了餐"""
+
+
+class CassetteMiss(MeiCanError):
+    """回放模式下 cassette 中找不到匹配的请求"""
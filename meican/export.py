@@ -0,0 +1,264 @@
+"""
+历史数据流式导出
+按 (日期, id) 键集分页逐块读取 OrderRecord / TabStatus / DailyOrderSummary，每读完一块立即写出：
+CSV 逐块输出文本，Parquet（需要安装 pyarrow）每块写成一个 row group。
+分页只依赖上一块最后一行的 (日期, id)，不使用 OFFSET，内存中最多只有一块数据
+"""
+
+import csv
+import io
+
+from django.conf import settings
+from django.db import models
+
+from .models import DailyOrderSummary, MeicanUser, OrderRecord, TabStatus
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - 未安装 pyarrow 时只支持 CSV
+    pyarrow = None
+
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+CONTENT_TYPES = {
+    FORMAT_CSV: "text/csv; charset=utf-8",
+    FORMAT_PARQUET: "application/vnd.apache.parquet",
+}
+
+
+class ExportTable(object):
+    """可导出的表：模型、用于分页和日期过滤的日期字段、导出的列"""
+
+    def __init__(self, model, date_field, columns):
+        self.model = model
+        self.date_field = date_field
+        # 导出的列名，user__email 导出为 email
+        self.columns = columns
+
+    @property
+    def headers(self):
+        return [column.replace("user__", "") for column in self.columns]
+
+    def field(self, column):
+        if column == "user__email":
+            return MeicanUser._meta.get_field("email")
+        return self.model._meta.get_field(column)
+
+
+TABLES = {
+    "orders": ExportTable(
+        OrderRecord,
+        "order_date",
+        [
+            "id",
+            "user_id",
+            "user__email",
+            "order_date",
+            "meal_period",
+            "meal_name",
+            "success",
+            "error_message",
+            "order_time",
+            "tab_uid",
+        ],
+    ),
+    "tabs": ExportTable(
+        TabStatus,
+        "order_date",
+        [
+            "id",
+            "user_id",
+            "user__email",
+            "order_date",
+            "tab_uid",
+            "tab_title",
+            "status",
+            "target_time",
+            "close_time",
+            "last_updated",
+        ],
+    ),
+    # 已压缩的历史（按用户按天的汇总）
+    "daily": ExportTable(
+        DailyOrderSummary,
+        "date",
+        [
+            "id",
+            "user_id",
+            "user__email",
+            "date",
+            "tabs_total",
+            "buffet_tabs",
+            "tabs_ordered",
+            "tabs_closed",
+            "orders_success",
+            "orders_failed",
+        ],
+    ),
+}
+
+
+def available_formats():
+    return [FORMAT_CSV, FORMAT_PARQUET] if pyarrow is not None else [FORMAT_CSV]
+
+
+def resolve_users(values):
+    """
+    :param values: 用户 id 或邮箱
+    :return: user_id 列表，找不到的用户忽略
+    """
+    ids = {int(value) for value in values if str(value).isdigit()}
+    emails = [value for value in values if not str(value).isdigit()]
+    if emails:
+        ids.update(
+            MeicanUser.objects.filter(email__in=emails).values_list("id", flat=True)
+        )
+    return sorted(ids)
+
+
+def iter_chunks(
+    table, start=None, end=None, user_ids=None, chunk_size=None, using="default"
+):
+    """
+    键集分页逐块读取
+    :param table: TABLES 中的名称
+    :param start: 起始日期（含）
+    :param end: 结束日期（含）
+    :param user_ids: 只导出这些用户，为 None 表示所有用户
+    :return: 生成器，每次产生一块 [tuple]，列顺序与 TABLES[table].columns 一致
+    """
+    spec = TABLES[table]
+    chunk_size = chunk_size or settings.MEICAN_EXPORT_CHUNK_SIZE
+    date_field = spec.date_field
+    date_index = spec.columns.index(date_field)
+    id_index = spec.columns.index("id")
+
+    queryset = spec.model.objects.using(using)
+    if start:
+        queryset = queryset.filter(**{f"{date_field}__gte": start})
+    if end:
+        queryset = queryset.filter(**{f"{date_field}__lte": end})
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    queryset = queryset.order_by(date_field, "id").values_list(*spec.columns)
+
+    page = queryset
+    while True:
+        rows = list(page[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        # 下一块从上一块最后一行之后开始：日期更大，或同一天 id 更大
+        last_date, last_id = rows[-1][date_index], rows[-1][id_index]
+        page = queryset.filter(**{f"{date_field}__gte": last_date}).exclude(
+            **{date_field: last_date, "id__lte": last_id}
+        )
+
+
+def iter_csv(table, **filters):
+    """
+    :return: 生成器，产生 UTF-8 编码（带 BOM，方便 Excel 打开）的 CSV 字节块
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(TABLES[table].headers)
+    for rows in iter_chunks(table, **filters):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # 没有任何数据时只输出表头
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(object):
+    """ParquetWriter 的输出：缓存写入的字节，每写完一个 row group 取走一次"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _arrow_type(field):
+    if isinstance(field, models.DateTimeField):
+        return pyarrow.timestamp("us", tz="UTC")
+    if isinstance(field, models.DateField):
+        return pyarrow.date32()
+    if isinstance(field, models.BooleanField):
+        return pyarrow.bool_()
+    if isinstance(field, (models.IntegerField, models.AutoField, models.ForeignKey)):
+        return pyarrow.int64()
+    return pyarrow.string()
+
+
+def iter_parquet(table, **filters):
+    """
+    :return: 生成器，产生 Parquet 文件的字节块（每块数据一个 row group）
+    """
+    spec = TABLES[table]
+    schema = pyarrow.schema(
+        [
+            (header, _arrow_type(spec.field(column)))
+            for header, column in zip(spec.headers, spec.columns)
+        ]
+    )
+    sink = _ChunkSink()
+    with pyarrow.parquet.ParquetWriter(
+        pyarrow.PythonFile(sink, mode="w"), schema
+    ) as writer:
+        for rows in iter_chunks(table, **filters):
+            columns = list(zip(*rows))
+            writer.write_table(
+                pyarrow.Table.from_arrays(
+                    [
+                        pyarrow.array(values, type=field.type)
+                        for values, field in zip(columns, schema)
+                    ],
+                    schema=schema,
+                )
+            )
+            yield sink.drain()
+    # 关闭时写入文件尾
+    yield sink.drain()
+
+
+def iter_export(table, fmt=FORMAT_CSV, **filters):
+    """
+    :param fmt: csv 或 parquet
+    :raises ValueError: 未知的表或格式，或导出 Parquet 时未安装 pyarrow
+    """
+    if table not in TABLES:
+        raise ValueError(f"未知的表: {table}，可选: {', '.join(TABLES)}")
+    if fmt == FORMAT_CSV:
+        return iter_csv(table, **filters)
+    if fmt == FORMAT_PARQUET:
+        if pyarrow is None:
+            raise ValueError("导出 Parquet 需要安装 pyarrow")
+        return iter_parquet(table, **filters)
+    raise ValueError(f"未知的格式: {fmt}，可选: {', '.join(CONTENT_TYPES)}")
@@ -0,0 +1,201 @@
+"""
+历史数据保留、压缩与汇总
+超过保留期的 TabStatus / OrderRecord 按用户按天汇总到 DailyOrderSummary 后分批删除
+（面板读模型 DashboardDay 中同样过期的行一并删除），
+历史区间的统计同时读取汇总表和尚未压缩的原始数据
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from . import analytics
+from .models import DailyOrderSummary, DashboardDay, OrderRecord, TabStatus
+
+logger = logging.getLogger("meican")
+
+SUMMARY_FIELDS = [
+    "tabs_total",
+    "buffet_tabs",
+    "tabs_ordered",
+    "tabs_closed",
+    "orders_success",
+    "orders_failed",
+]
+TAB_ROLLUP_FIELDS = ["pk", "user_id", "order_date", "tab_title", "status"]
+ORDER_ROLLUP_FIELDS = ["pk", "user_id", "order_date", "success"]
+
+
+def compact_history(retention_days=None, batch_size=None, dry_run=False):
+    """
+    压缩超过保留期的历史数据
+
+    每一批最多处理 batch_size 行：汇总后累加到 DailyOrderSummary，并在同一个短事务里删除这些行，
+    既不会长时间占用写锁，中途中断也不会重复计数
+    :return: {"cutoff", "tab_statuses", "order_records"}
+    """
+    retention_days = (
+        settings.HISTORY_RETENTION_DAYS if retention_days is None else retention_days
+    )
+    batch_size = batch_size or settings.HISTORY_COMPACT_BATCH_SIZE
+    cutoff = datetime.now().date() - timedelta(days=retention_days)
+
+    result = {"cutoff": cutoff.isoformat(), "tab_statuses": 0, "order_records": 0}
+    if dry_run:
+        result["tab_statuses"] = TabStatus.objects.filter(order_date__lt=cutoff).count()
+        result["order_records"] = OrderRecord.objects.filter(
+            order_date__lt=cutoff
+        ).count()
+        return result
+
+    logger.info(f"开始压缩 {cutoff} 之前的历史数据")
+    for model, key, fields, rollup in (
+        (TabStatus, "tab_statuses", TAB_ROLLUP_FIELDS, _rollup_tabs),
+        (OrderRecord, "order_records", ORDER_ROLLUP_FIELDS, _rollup_orders),
+    ):
+        while True:
+            with transaction.atomic():
+                # 按 order_date 取批次，可以走 order_date 索引；按 pk 排序会退化成全表扫描
+                rows = list(
+                    model.objects.filter(order_date__lt=cutoff)
+                    .order_by("order_date")
+                    .values(*fields)[:batch_size]
+                )
+                if not rows:
+                    break
+                _add_to_summary(rollup(rows))
+                model.objects.filter(pk__in=[row["pk"] for row in rows]).delete()
+            result[key] += len(rows)
+
+    # 面板只读取今天及以后的行，过期的行直接删除
+    result["dashboard_days"], _ = DashboardDay.objects.filter(date__lt=cutoff).delete()
+
+    logger.info(
+        f"历史数据压缩完成 - TabStatus:{result['tab_statuses']}, OrderRecord:{result['order_records']}"
+    )
+    return result
+
+
+def _rollup_tabs(rows):
+    counts = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        item = counts[(row["user_id"], row["order_date"])]
+        item["tabs_total"] += 1
+        if "自助" in row["tab_title"]:
+            item["buffet_tabs"] += 1
+        if row["status"] == "ORDERED":
+            item["tabs_ordered"] += 1
+        elif row["status"] == "CLOSED":
+            item["tabs_closed"] += 1
+    return counts
+
+
+def _rollup_orders(rows):
+    counts = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        item = counts[(row["user_id"], row["order_date"])]
+        item["orders_success" if row["success"] else "orders_failed"] += 1
+    return counts
+
+
+def _add_to_summary(counts):
+    """把一批汇总结果累加到 DailyOrderSummary"""
+    if not counts:
+        return
+    user_ids = {user_id for user_id, _ in counts}
+    dates = {date for _, date in counts}
+    existing = {
+        (summary.user_id, summary.date): summary
+        for summary in DailyOrderSummary.objects.filter(
+            user_id__in=user_ids, date__in=dates
+        )
+    }
+
+    to_create = []
+    to_update = []
+    for (user_id, date), values in counts.items():
+        summary = existing.get((user_id, date))
+        if summary is None:
+            to_create.append(DailyOrderSummary(user_id=user_id, date=date, **values))
+            continue
+        for field, value in values.items():
+            setattr(summary, field, getattr(summary, field) + value)
+        to_update.append(summary)
+
+    DailyOrderSummary.objects.bulk_create(to_create)
+    if to_update:
+        DailyOrderSummary.objects.bulk_update(to_update, SUMMARY_FIELDS)
+    # 压缩后的日期只剩汇总数据（没有失败原因和提前量），缓存的统计需要重新计算
+    analytics.invalidate(dates)
+
+
+def daily_history(start, end, user_ids=None, using="default"):
+    """
+    历史区间内按用户按天的统计：已压缩的部分读汇总表，未压缩的部分用数据库聚合原始数据。
+    同一行数据要么在汇总表里要么还是原始数据，两者直接相加即可
+
+    :type start: datetime.date
+    :type end: datetime.date
+    :param user_ids: 只统计这些用户，None 表示全部
+    :return: {(user_id, date): {field: count}}
+    """
+    stats = defaultdict(lambda: dict.fromkeys(SUMMARY_FIELDS, 0))
+
+    def scoped(queryset, date_field):
+        queryset = queryset.using(using).filter(
+            **{f"{date_field}__gte": start, f"{date_field}__lte": end}
+        )
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        return queryset
+
+    for row in scoped(DailyOrderSummary.objects, "date").values(
+        "user_id", "date", *SUMMARY_FIELDS
+    ):
+        item = stats[(row["user_id"], row["date"])]
+        for field in SUMMARY_FIELDS:
+            item[field] += row[field]
+
+    tab_rows = (
+        scoped(TabStatus.objects, "order_date")
+        .values("user_id", "order_date")
+        .annotate(
+            tabs_total=Count("id"),
+            buffet_tabs=Count("id", filter=Q(tab_title__contains="自助")),
+            tabs_ordered=Count("id", filter=Q(status="ORDERED")),
+            tabs_closed=Count("id", filter=Q(status="CLOSED")),
+        )
+        .order_by()
+    )
+    order_rows = (
+        scoped(OrderRecord.objects, "order_date")
+        .values("user_id", "order_date")
+        .annotate(
+            orders_success=Count("id", filter=Q(success=True)),
+            orders_failed=Count("id", filter=Q(success=False)),
+        )
+        .order_by()
+    )
+    for rows in (tab_rows, order_rows):
+        for row in rows:
+            item = stats[(row.pop("user_id"), row.pop("order_date"))]
+            for field, value in row.items():
+                item[field] += value
+
+    return dict(stats)
+
+
+def user_history_totals(start, end, user_ids=None, using="default"):
+    """
+    按用户汇总历史区间的统计
+    :return: {user_id: {field: count}}
+    """
+    totals = defaultdict(lambda: dict.fromkeys(SUMMARY_FIELDS, 0))
+    for (user_id, _), values in daily_history(start, end, user_ids, using).items():
+        for field, value in values.items():
+            totals[user_id][field] += value
+    return dict(totals)
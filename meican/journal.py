@@ -0,0 +1,163 @@
+"""
+自动点餐任务的运行日志
+每轮任务开始时为需要处理的用户写入 OrderRunItem（pending），处理过程中记录所处阶段，
+结束时标记 done / failed。进程在中途退出（OOM、容器重启、SQLite 锁超时等）后，
+下一次启动同一范围的任务会恢复未完成的运行：跳过已完成的用户，处理中的用户从上次的阶段继续
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .db_writer import RunItemRecord, apply_now
+from .models import MeicanUser, OrderRun, OrderRunItem
+
+logger = logging.getLogger("meican")
+
+# 运行状态
+RUN_RUNNING = "running"
+RUN_FINISHED = "finished"
+RUN_ABANDONED = "abandoned"  # 超过恢复窗口、不再恢复的运行
+
+# 用户状态
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"  # 用户正被其他流程处理
+
+# 处理阶段，按执行顺序排列
+STAGE_LOGIN = "login"
+STAGE_SYNC = "sync"
+STAGE_ORDER = "order"
+STAGES = (STAGE_LOGIN, STAGE_SYNC, STAGE_ORDER)
+
+# 已结束的运行日志保留时间
+RUN_TTL = timedelta(days=7)
+
+# _run_user 的结果与用户状态的对应关系
+OUTCOME_STATUS = {"success": DONE, "failed": FAILED, "busy": SKIPPED}
+
+
+def unfinished_run(scope):
+    """
+    查找 scope 下可以恢复的运行；超过 MEICAN_RUN_RESUME_MINUTES 的运行标记为放弃
+
+    :rtype: OrderRun | None
+    """
+    run = (
+        OrderRun.objects.filter(scope=scope, status=RUN_RUNNING)
+        .order_by("-started_at")
+        .first()
+    )
+    if run is None:
+        return None
+    window = timedelta(minutes=settings.MEICAN_RUN_RESUME_MINUTES)
+    if run.started_at < timezone.now() - window:
+        OrderRun.objects.filter(scope=scope, status=RUN_RUNNING).update(
+            status=RUN_ABANDONED, finished_at=timezone.now()
+        )
+        logger.warning(f"运行 {run.id} 已超过恢复窗口，不再恢复")
+        return None
+    return run
+
+
+def start_run(scope, users, full=False):
+    """
+    :param users: 本轮需要处理的用户
+    :return: (run, {user_id: ItemProgress})
+    """
+    with transaction.atomic():
+        run = OrderRun.objects.create(scope=scope, full=full)
+        OrderRunItem.objects.bulk_create(
+            [OrderRunItem(run=run, user=user) for user in users]
+        )
+    return run, _progress_for(run)
+
+
+def resume_run(run):
+    """
+    :return: (users, {user_id: ItemProgress}, finished)，users 为尚未完成的用户，
+             finished 为上次已经处理完的用户数
+    """
+    progress = _progress_for(run, statuses=(PENDING, IN_PROGRESS))
+    users = list(MeicanUser.objects.filter(id__in=progress.keys(), is_active=True))
+    finished = run.items.exclude(status__in=(PENDING, IN_PROGRESS)).count()
+    return users, progress, finished
+
+
+def _progress_for(run, statuses=None):
+    items = run.items.all()
+    if statuses:
+        items = items.filter(status__in=statuses)
+    return {
+        item.user_id: ItemProgress(item.id, item.status, item.stage)
+        for item in items.only("id", "user_id", "status", "stage")
+    }
+
+
+def finish_run(run, summary):
+    OrderRun.objects.filter(pk=run.pk).update(
+        status=RUN_FINISHED, finished_at=timezone.now(), summary=summary
+    )
+
+
+def prune():
+    """删除过期的运行日志"""
+    try:
+        OrderRun.objects.filter(
+            started_at__lt=timezone.now() - RUN_TTL,
+        ).exclude(status=RUN_RUNNING).delete()
+    except Exception as e:
+        logger.error(f"清理运行日志失败: {e}")
+
+
+class ItemProgress(object):
+    """
+    记录单个用户的处理进度。
+    传入 writer 时进度经由写线程落盘，排在该用户已投递的数据之后：日志里记录的阶段不会超前于已落盘的数据
+    """
+
+    def __init__(self, item_id, status=PENDING, stage=""):
+        self.item_id = item_id
+        self.status = status
+        self.stage = stage
+        # 上次运行中断时所处的阶段，该阶段之前的阶段已经完成
+        self.resume_stage = stage if status == IN_PROGRESS else ""
+        # 并发执行时由调用方设置为 DBWriter
+        self.writer = None
+
+    def completed(self, stage):
+        """上次运行中 stage 是否已经完成（中断发生在它之后的阶段）"""
+        if not self.resume_stage:
+            return False
+        return STAGES.index(stage) < STAGES.index(self.resume_stage)
+
+    def enter(self, stage):
+        """进入某个阶段；恢复时已经越过的阶段不重复记录"""
+        first = self.status != IN_PROGRESS
+        if not first and self.stage and STAGES.index(stage) <= STAGES.index(self.stage):
+            return
+        self.status = IN_PROGRESS
+        self.stage = stage
+        self._write(
+            RunItemRecord(self.item_id, status=IN_PROGRESS, stage=stage, attempt=first)
+        )
+
+    def resume(self):
+        """从日志恢复时，重新开始处理也算一次尝试"""
+        if self.resume_stage:
+            self._write(RunItemRecord(self.item_id, attempt=True))
+
+    def finish(self, status, error=""):
+        self.status = status
+        self._write(RunItemRecord(self.item_id, status=status, error=error or ""))
+
+    def _write(self, record):
+        if self.writer:
+            self.writer.submit(record)
+        else:
+            apply_now(record)
@@ -0,0 +1,233 @@
+"""
+基于数据库的租约
+定时任务、手动点餐、刷新等流程在处理某个用户之前必须先拿到该用户的租约，
+拿不到时跳过该用户或在限定时间内等待；持有期间后台线程定期续约，
+进程崩溃后租约过期即可被其他流程接管。定时任务还会持有整轮运行的租约，避免重叠执行
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger("meican")
+
+USER_LEASE = "user:{user_id}"
+RUN_LEASE = "cron:run"
+
+# 等待租约时的轮询间隔（秒）
+POLL_INTERVAL = 0.2
+
+
+class LeaseBusy(Exception):
+    """租约被其他流程持有"""
+
+
+class LeaseLost(Exception):
+    """持有期间租约已被其他流程接管"""
+
+
+def user_lease_name(user_id):
+    return USER_LEASE.format(user_id=user_id)
+
+
+def run_lease_name(shard=None):
+    """整轮定时任务的租约，分片执行时每个分片各自一个"""
+    return f"{RUN_LEASE}:{shard}" if shard else RUN_LEASE
+
+
+def new_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def try_acquire(name, owner, ttl):
+    """
+    尝试获取租约：不存在时创建，已过期或本来就由 owner 持有时接管
+    :rtype: bool
+    """
+    from .models import Lease
+
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=ttl)
+    if (
+        Lease.objects.filter(name=name)
+        .filter(Q(expires_at__lte=now) | Q(owner=owner))
+        .update(owner=owner, acquired_at=now, expires_at=expires_at)
+    ):
+        return True
+    try:
+        with transaction.atomic():
+            Lease.objects.create(
+                name=name, owner=owner, acquired_at=now, expires_at=expires_at
+            )
+        return True
+    except IntegrityError:
+        return False
+
+
+def renew(name, owner, ttl):
+    """
+    续约，租约已被他人接管时返回 False
+    :rtype: bool
+    """
+    from .models import Lease
+
+    return bool(
+        Lease.objects.filter(name=name, owner=owner).update(
+            expires_at=timezone.now() + timedelta(seconds=ttl)
+        )
+    )
+
+
+def release(name, owner):
+    from .models import Lease
+
+    Lease.objects.filter(name=name, owner=owner).delete()
+
+
+class LeaseHolder(object):
+    """
+    用法：
+        with LeaseHolder(leases.user_lease_name(user.id), wait=10):
+            ...  # 拿不到租约时抛出 LeaseBusy
+
+        holder = LeaseHolder(name)
+        if holder.acquire():
+            try:
+                ...
+            finally:
+                holder.release()
+    """
+
+    def __init__(self, name, ttl=None, wait=0, owner=None):
+        """
+        :param ttl: 租约有效秒数，默认读取 MEICAN_LEASE_TTL；持有期间每 ttl/3 秒续约一次
+        :param wait: 作为上下文管理器使用时最多等待的秒数
+        """
+        self.name = name
+        self.ttl = settings.MEICAN_LEASE_TTL if ttl is None else ttl
+        self.wait = wait
+        self.owner = owner or new_owner()
+        self.held = False
+        # 续约失败（租约已被他人接管）时置为 True
+        self._lost = False
+        self._renewed_at = 0
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def acquire(self, wait=0):
+        """
+        :param wait: 最多等待的秒数，0 表示拿不到立即返回
+        :rtype: bool
+        """
+        deadline = time.monotonic() + wait
+        while True:
+            attempted_at = time.monotonic()
+            if try_acquire(self.name, self.owner, self.ttl):
+                self._held(attempted_at)
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(POLL_INTERVAL)
+
+    async def aacquire(self, wait=0):
+        """acquire 的协程版本，等待期间不占用工作线程"""
+        deadline = time.monotonic() + wait
+        while True:
+            attempted_at = time.monotonic()
+            if await sync_to_async(try_acquire)(self.name, self.owner, self.ttl):
+                self._held(attempted_at)
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(POLL_INTERVAL)
+
+    @property
+    def lost(self):
+        """
+        租约是否已经失效：续约时发现已被他人接管，或者超过 ttl 没有续约成功
+        （进程被挂起、数据库不可用时续约线程来不及发现，租约可能已被接管）
+        """
+        return self._lost or (
+            self.held and time.monotonic() - self._renewed_at >= self.ttl
+        )
+
+    def check(self):
+        """租约已经失效时抛出 LeaseLost，在耗时操作的每个阶段开始前调用"""
+        if self.lost:
+            raise LeaseLost(self.name)
+
+    def release(self, writer=None):
+        """
+        :param writer: DBWriter 对象，传入时释放操作排在该用户已投递的写入之后，
+                       保证下一个持有者看到的是已经落盘的数据
+        """
+        if not self.held:
+            return
+        self.held = False
+        self._stop.set()
+        if writer:
+            from .db_writer import LeaseReleaseRecord
+
+            writer.submit(LeaseReleaseRecord(self.name, self.owner))
+        else:
+            release(self.name, self.owner)
+
+    async def arelease(self):
+        if self.held:
+            await sync_to_async(self.release)()
+
+    def __enter__(self):
+        if not self.acquire(self.wait):
+            raise LeaseBusy(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    async def __aenter__(self):
+        if not await self.aacquire(self.wait):
+            raise LeaseBusy(self.name)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.arelease()
+
+    def _held(self, renewed_at):
+        self.held = True
+        self._lost = False
+        self._renewed_at = renewed_at
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(
+            target=self._run_heartbeat,
+            args=(self._stop,),
+            name=f"meican-lease-{self.name}",
+            daemon=True,
+        )
+        self._heartbeat.start()
+
+    def _run_heartbeat(self, stop):
+        try:
+            while not stop.wait(self.ttl / 3):
+                renewing_at = time.monotonic()
+                try:
+                    if not renew(self.name, self.owner, self.ttl):
+                        self._lost = True
+                        logger.warning(f"租约 {self.name} 已被其他流程接管")
+                        return
+                    self._renewed_at = renewing_at
+                except Exception as e:
+                    logger.error(f"租约 {self.name} 续约失败: {e}")
+        finally:
+            # 续约线程持有自己的数据库连接，退出时关闭
+            connection.close()
@@ -0,0 +1,144 @@
+"""
+Django 管理命令 - 热点查询执行计划审计
+对面板、同步、下单路径上的热点查询获取执行计划并计时，标记全表扫描和临时排序
+"""
+
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from meican.models import MeicanUser, OrderRecord, TabStatus
+
+# 执行计划中需要关注的关键字：(关键字, 说明)
+PLAN_WARNINGS = [
+    ("SCAN ", "全表/全索引扫描"),
+    ("USE TEMP B-TREE", "临时排序"),
+    ("Seq Scan", "全表扫描"),
+    ("Sort", "排序"),
+]
+
+
+def hot_queries(user, today, cutoff):
+    """
+    热点查询列表：(名称, queryset)
+    删除语句使用相同 WHERE 条件的 SELECT 代替，执行计划中的索引选择一致
+    """
+    return [
+        (
+            "面板: TabStatus 今天及以后",
+            TabStatus.objects.filter(user=user, order_date__gte=today).order_by(
+                "order_date", "target_time"
+            ),
+        ),
+        (
+            "面板: OrderRecord 今天及以后的成功订单",
+            OrderRecord.objects.filter(
+                user=user, order_date__gte=today, success=True
+            ).order_by("order_date", "meal_period"),
+        ),
+        (
+            "API: OrderRecord 某天的成功订单",
+            OrderRecord.objects.filter(user=user, order_date=today, success=True),
+        ),
+        (
+            "下单: OrderRecord update_or_create 查找",
+            OrderRecord.objects.filter(
+                user=user, order_date=today, meal_period="午餐自助"
+            ),
+        ),
+        (
+            "同步: 删除 TabStatus 今天及以后",
+            TabStatus.objects.filter(user=user, order_date__gte=today).values("pk"),
+        ),
+        (
+            "同步: 删除 OrderRecord 今天及以后",
+            OrderRecord.objects.filter(user=user, order_date__gte=today).values("pk"),
+        ),
+        (
+            "压缩: 过期 TabStatus",
+            TabStatus.objects.filter(order_date__lt=cutoff)
+            .order_by("order_date")
+            .values("pk")[:1000],
+        ),
+        (
+            "压缩: 过期 OrderRecord",
+            OrderRecord.objects.filter(order_date__lt=cutoff)
+            .order_by("order_date")
+            .values("pk")[:1000],
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = "审计热点查询的执行计划，标记全表扫描和临时排序，并输出耗时"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user-id",
+            type=int,
+            help="用于查询的用户 ID，默认选 TabStatus 最多的用户",
+        )
+        parser.add_argument("--repeat", type=int, default=20, help="每条查询执行次数")
+        parser.add_argument(
+            "--retention-days", type=int, default=180, help="压缩查询使用的保留天数"
+        )
+
+    def handle(self, *args, **options):
+        user = self._pick_user(options["user_id"])
+        today = datetime.now().date()
+        cutoff = today - timedelta(days=options["retention_days"])
+
+        self.stdout.write(
+            f"数据库: {connection.vendor}，用户: {user.email}，"
+            f"TabStatus:{TabStatus.objects.count()}，OrderRecord:{OrderRecord.objects.count()}"
+        )
+
+        flagged = 0
+        for name, queryset in hot_queries(user, today, cutoff):
+            plan = queryset.explain()
+            warnings = sorted(
+                {label for keyword, label in PLAN_WARNINGS if keyword in plan}
+            )
+            timing = self._time(queryset, options["repeat"])
+
+            style = self.style.WARNING if warnings else self.style.SUCCESS
+            self.stdout.write(
+                style(
+                    f"\n[{'!' if warnings else 'ok'}] {name}  median {timing:.3f}ms"
+                    + (f"  ({', '.join(warnings)})" if warnings else "")
+                )
+            )
+            for line in plan.splitlines():
+                self.stdout.write(f"    {line}")
+            flagged += bool(warnings)
+
+        self.stdout.write(f"\n共 {flagged} 条查询存在全表扫描或临时排序")
+
+    @staticmethod
+    def _pick_user(user_id):
+        if user_id:
+            try:
+                return MeicanUser.objects.get(pk=user_id)
+            except MeicanUser.DoesNotExist:
+                raise CommandError(f"用户 {user_id} 不存在")
+        user = (
+            MeicanUser.objects.annotate(tab_count=Count("tab_statuses"))
+            .order_by("-tab_count")
+            .first()
+        )
+        if not user:
+            raise CommandError("数据库中没有用户，请先执行 generate_dashboard_data")
+        return user
+
+    @staticmethod
+    def _time(queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
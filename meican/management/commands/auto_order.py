@@ -4,7 +4,9 @@ Django 管理命令 - 手动触发自动点餐
 
 from django.core.management.base import BaseCommand
 
+from meican import profiling
 from meican.cron import auto_order_meals, manual_order_for_user
+from meican.sharding import ShardSpec
 
 
 class Command(BaseCommand):
@@ -21,8 +23,53 @@ class Command(BaseCommand):
             type=str,
             help="指定日期 (YYYY-MM-DD 格式)",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="并发处理的用户数（默认读取 MEICAN_CRON_WORKERS）",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="不跳过任何用户，全量登录并同步所有活跃用户",
+        )
+        parser.add_argument(
+            "--shard",
+            type=str,
+            help="只处理指定分片的用户，格式 k/N（例如 2/4），按用户 id 的哈希分片",
+        )
+        parser.add_argument(
+            "--resume-only",
+            action="store_true",
+            help="只恢复中途退出的运行（容器启动时使用），没有未完成的运行时直接退出；"
+            "整轮租约仍被崩溃的进程持有时最多等待 MEICAN_LEASE_TTL 秒",
+        )
+        parser.add_argument(
+            "--spread",
+            type=float,
+            help="分散执行的窗口（分钟），用户在窗口内按各自的偏移量陆续处理，0 表示不分散"
+            "（默认读取 MEICAN_SPREAD_WINDOW_MINUTES）",
+        )
+        parser.add_argument(
+            "--profile",
+            nargs="?",
+            const=profiling.MODE_SAMPLE,
+            help="剖析本次运行：sample（默认，采样）或 cprofile（确定性，以单线程执行），"
+            "结果写入 MEICAN_PROFILE_DIR（默认读取 MEICAN_PROFILE）",
+        )
+        parser.add_argument(
+            "--run-id",
+            type=str,
+            help="分片汇总的运行编号（默认取启动时间，精确到分钟）",
+        )
 
     def handle(self, *args, **options):
+        try:
+            mode = profiling.resolve_mode(options["profile"])
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
         if options["user"]:
             # 为指定用户下单
             user_email = options["user"]
@@ -41,7 +88,14 @@ class Command(BaseCommand):
             else:
                 date = None
 
-            success, message = manual_order_for_user(user_email, date)
+            if mode:
+                with profiling.RunProfiler(
+                    mode, f"auto_order-{user_email}"
+                ) as profiler:
+                    success, message = manual_order_for_user(user_email, date)
+                self._print_profile(profiler.report)
+            else:
+                success, message = manual_order_for_user(user_email, date)
 
             if success:
                 self.stdout.write(self.style.SUCCESS(message))
@@ -49,9 +103,48 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR(message))
         else:
             # 执行全体用户自动点餐
+            if options["shard"]:
+                try:
+                    ShardSpec.parse(options["shard"])
+                except ValueError as e:
+                    self.stdout.write(self.style.ERROR(str(e)))
+                    return
+
             self.stdout.write("开始执行自动点餐任务...")
-            auto_order_meals()
-            self.stdout.write(self.style.SUCCESS("自动点餐任务执行完成"))
+            summary = auto_order_meals(
+                workers=options["workers"],
+                full=options["full"],
+                shard=options["shard"],
+                run_id=options["run_id"],
+                resume_only=options["resume_only"],
+                spread=options["spread"],
+                profile=mode or False,
+            )
+            self._print_profile(summary.get("profile"))
+            if summary.get("locked"):
+                self.stdout.write(
+                    self.style.WARNING("上一轮自动点餐任务仍在执行，本轮已跳过")
+                )
+                return
+            if summary.get("resumed"):
+                self.stdout.write(
+                    f"已从运行日志恢复运行 {summary['run']}，跳过上次已完成的 {summary['resumed']} 个用户"
+                )
+            elif options["resume_only"] and not summary.get("run"):
+                self.stdout.write("没有需要恢复的运行")
+                return
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"自动点餐任务执行完成 - 成功:{summary['success']}, 失败:{summary['failed']}, "
+                    f"跳过:{summary['skipped']}, 被占用:{summary['busy']}, "
+                    f"隔离中:{summary['quarantined']}, 错过截止:{summary['deadline_missed']}"
+                )
+            )
+
+    def _print_profile(self, report):
+        """耗时分类和热点函数已经输出到日志，这里只提示结果文件的位置"""
+        if report:
+            self.stdout.write(f"剖析结果: {', '.join(report['files'])}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+"""
+Django 管理命令 - 压缩历史数据
+"""
+
+from django.core.management.base import BaseCommand
+
+from meican.history import compact_history
+
+
+class Command(BaseCommand):
+    help = "把超过保留期的 TabStatus / OrderRecord 汇总到 DailyOrderSummary 后分批删除"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            help="保留天数（默认读取 HISTORY_RETENTION_DAYS）",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="每个事务处理的行数（默认读取 HISTORY_COMPACT_BATCH_SIZE）",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="只统计将被压缩的行数，不做修改",
+        )
+
+    def handle(self, *args, **options):
+        result = compact_history(
+            retention_days=options["retention_days"],
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+        )
+        prefix = "将压缩" if options["dry_run"] else "已压缩"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix} {result['cutoff']} 之前的数据 - "
+                f"TabStatus:{result['tab_statuses']}, OrderRecord:{result['order_records']}"
+            )
+        )
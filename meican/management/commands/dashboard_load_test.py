@@ -0,0 +1,192 @@
+"""
+Django 管理命令 - 用户面板压测
+测量 MeicanUsersView / UsersApiView / 删除接口的耗时、SQL 次数和内存峰值，
+输出 JSON 报告，便于不同版本之间对比
+"""
+
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from meican.models import MeicanUser, OrderRecord, TabStatus
+
+
+class Command(BaseCommand):
+    help = "压测用户面板相关接口，输出耗时 / SQL 次数 / 内存峰值报告"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="每个接口执行次数")
+        parser.add_argument(
+            "--output",
+            type=str,
+            help="报告输出路径，默认写到 data/logs/loadtest-<时间>.json",
+        )
+        parser.add_argument("--label", type=str, default="", help="报告标签，如版本号")
+        parser.add_argument("--compare", type=str, help="与之前的报告对比")
+
+    def handle(self, *args, **options):
+        user_ids = list(
+            MeicanUser.objects.order_by("id").values_list("id", flat=True)[
+                : options["repeat"] * 2
+            ]
+        )
+        if not user_ids:
+            raise CommandError("数据库中没有用户，请先执行 generate_dashboard_data")
+
+        client = Client()
+        scenarios = [
+            ("MeicanUsersView.get", lambda i: client.get(reverse("get_meican_users"))),
+            ("UsersApiView.get", lambda i: client.get(reverse("api_users"))),
+            (
+                "DeleteUserView.post",
+                lambda i: client.post(
+                    reverse("delete_user", args=[user_ids[i % len(user_ids)]])
+                ),
+            ),
+            (
+                "DeleteUserApiView.delete",
+                lambda i: client.delete(
+                    reverse("api_delete_user", args=[user_ids[-1 - i % len(user_ids)]])
+                ),
+            ),
+        ]
+
+        results = {}
+        for name, request in scenarios:
+            self.stdout.write(f"压测 {name} ...")
+            results[name] = self._measure(request, options["repeat"])
+
+        report = {
+            "label": options["label"],
+            "git_revision": self._git_revision(),
+            "created_at": datetime.now().isoformat(),
+            "dataset": {
+                "users": MeicanUser.objects.count(),
+                "tab_statuses": TabStatus.objects.count(),
+                "order_records": OrderRecord.objects.count(),
+            },
+            "repeat": options["repeat"],
+            "results": results,
+        }
+
+        output = Path(
+            options["output"]
+            or settings.LOG_DIR
+            / "loadtest-{}.json".format(datetime.now().strftime("%Y%m%d-%H%M%S"))
+        )
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+
+        self._print_report(report)
+        if options["compare"]:
+            self._print_compare(
+                json.loads(Path(options["compare"]).read_text()), report
+            )
+        self.stdout.write(self.style.SUCCESS(f"报告已写入 {output}"))
+
+    def _measure(self, request, repeat):
+        """
+        每次请求都在事务中执行并回滚，删除接口不会破坏数据集；
+        内存峰值单独跑一次（tracemalloc 会明显拖慢执行）
+        """
+        latencies = []
+        queries = []
+        status_codes = set()
+        for i in range(repeat):
+            with transaction.atomic():
+                with CaptureQueriesContext(connections["default"]) as ctx:
+                    with CaptureQueriesContext(
+                        connections[settings.MEICAN_READ_DB]
+                    ) as read_ctx:
+                        started = time.perf_counter()
+                        response = request(i)
+                        latencies.append(time.perf_counter() - started)
+                query_count = len(ctx.captured_queries)
+                if settings.MEICAN_READ_DB != "default":
+                    query_count += len(read_ctx.captured_queries)
+                queries.append(query_count)
+                status_codes.add(response.status_code)
+                transaction.set_rollback(True)
+
+        tracemalloc.start()
+        try:
+            with transaction.atomic():
+                request(repeat)
+                transaction.set_rollback(True)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        latencies_ms = sorted(value * 1000 for value in latencies)
+        return {
+            "status_codes": sorted(status_codes),
+            "latency_ms": {
+                "min": round(latencies_ms[0], 2),
+                "median": round(statistics.median(latencies_ms), 2),
+                "p95": round(
+                    latencies_ms[
+                        min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.95))
+                    ],
+                    2,
+                ),
+                "max": round(latencies_ms[-1], 2),
+            },
+            "queries": {"min": min(queries), "max": max(queries)},
+            "peak_memory_kb": round(peak / 1024, 1),
+        }
+
+    @staticmethod
+    def _git_revision():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                timeout=5,
+            ).stdout.strip()
+        except Exception:
+            return ""
+
+    def _print_report(self, report):
+        self.stdout.write(f"数据集: {report['dataset']}")
+        for name, result in report["results"].items():
+            latency = result["latency_ms"]
+            self.stdout.write(
+                f"{name:<26} median {latency['median']:>10.2f}ms"
+                f"  p95 {latency['p95']:>10.2f}ms"
+                f"  queries {result['queries']['max']:>7}"
+                f"  peak {result['peak_memory_kb']:>10.1f}KB"
+            )
+
+    def _print_compare(self, old, new):
+        self.stdout.write(
+            f"与报告 {old.get('label') or old.get('git_revision')} 对比（新 / 旧）:"
+        )
+        for name, result in new["results"].items():
+            before = old.get("results", {}).get(name)
+            if not before:
+                continue
+            self.stdout.write(
+                f"{name:<26}"
+                f" median {self._ratio(result['latency_ms']['median'], before['latency_ms']['median'])}"
+                f"  queries {self._ratio(result['queries']['max'], before['queries']['max'])}"
+                f"  peak {self._ratio(result['peak_memory_kb'], before['peak_memory_kb'])}"
+            )
+
+    @staticmethod
+    def _ratio(new, old):
+        if not old:
+            return "   n/a"
+        return f"{new / old:6.2f}x"
@@ -0,0 +1,100 @@
+"""
+Django 管理命令 - 流式导出历史数据
+"""
+
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from meican import export
+
+
+class Command(BaseCommand):
+    help = "按日期范围和用户流式导出 OrderRecord / TabStatus / 已压缩的每日汇总（CSV 或 Parquet）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--table",
+            choices=sorted(export.TABLES),
+            default="orders",
+            help="导出的表：orders（订单）、tabs（Tab 状态）、daily（已压缩的每日汇总）",
+        )
+        parser.add_argument(
+            "--format",
+            choices=[export.FORMAT_CSV, export.FORMAT_PARQUET],
+            default=export.FORMAT_CSV,
+            help="输出格式，parquet 需要安装 pyarrow",
+        )
+        parser.add_argument(
+            "--start",
+            type=str,
+            help="起始日期 (YYYY-MM-DD 格式，含)",
+        )
+        parser.add_argument(
+            "--end",
+            type=str,
+            help="结束日期 (YYYY-MM-DD 格式，含)",
+        )
+        parser.add_argument(
+            "--user",
+            action="append",
+            default=[],
+            help="只导出指定用户（id 或邮箱），可重复",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            help="每块读取的行数（默认读取 MEICAN_EXPORT_CHUNK_SIZE）",
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            default="-",
+            help="输出文件路径，- 表示标准输出",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start, end = (
+                (
+                    datetime.strptime(options[key], "%Y-%m-%d").date()
+                    if options[key]
+                    else None
+                )
+                for key in ("start", "end")
+            )
+        except ValueError:
+            raise CommandError("日期格式错误，请使用 YYYY-MM-DD 格式")
+
+        try:
+            chunks = export.iter_export(
+                options["table"],
+                options["format"],
+                start=start,
+                end=end,
+                user_ids=(
+                    export.resolve_users(options["user"]) if options["user"] else None
+                ),
+                chunk_size=options["chunk_size"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        to_stdout = options["output"] == "-"
+        out = sys.stdout.buffer if to_stdout else open(options["output"], "wb")
+        written = 0
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if to_stdout:
+                out.flush()
+            else:
+                out.close()
+
+        if not to_stdout:
+            self.stdout.write(
+                self.style.SUCCESS(f"已导出到 {options['output']}，共 {written} 字节")
+            )
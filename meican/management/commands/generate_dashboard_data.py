@@ -0,0 +1,151 @@
+"""
+Django 管理命令 - 生成用于压测的合成数据
+"""
+
+import random
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from meican import analytics, read_model
+from meican.models import MeicanUser, OrderRecord, TabStatus
+
+EMAIL_TEMPLATE = "loadtest-{:06d}@example.com"
+EMAIL_PREFIX = "loadtest-"
+
+# 每天的用餐时段：(标题, 用餐时间)
+MEAL_TABS = [
+    ("午餐自助", time(12, 0)),
+    ("晚餐自助", time(18, 0)),
+    ("午餐", time(12, 30)),
+]
+
+
+class Command(BaseCommand):
+    help = "生成压测用的 MeicanUser / TabStatus / OrderRecord 合成数据"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000, help="用户数量")
+        parser.add_argument(
+            "--days", type=int, default=365, help="生成多少天的历史记录"
+        )
+        parser.add_argument(
+            "--future-days", type=int, default=7, help="生成多少天的未来 Tab"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="bulk_create 的批大小"
+        )
+        parser.add_argument("--seed", type=int, default=0, help="随机种子")
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="先删除之前生成的压测用户（及其关联数据）",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+
+        if options["clear"]:
+            deleted, _ = MeicanUser.objects.filter(
+                email__startswith=EMAIL_PREFIX
+            ).delete()
+            self.stdout.write(f"已删除 {deleted} 条旧的压测数据")
+
+        start_index = MeicanUser.objects.filter(email__startswith=EMAIL_PREFIX).count()
+        now = timezone.now()
+        MeicanUser.objects.bulk_create(
+            [
+                MeicanUser(
+                    email=EMAIL_TEMPLATE.format(start_index + i),
+                    token="login_success",
+                    last_login_attempt=now,
+                    is_active=rng.random() > 0.05,
+                )
+                for i in range(options["users"])
+            ],
+            batch_size=batch_size,
+        )
+        user_ids = list(
+            MeicanUser.objects.filter(email__startswith=EMAIL_PREFIX)
+            .order_by("-id")
+            .values_list("id", flat=True)[: options["users"]]
+        )
+        self.stdout.write(f"已创建 {len(user_ids)} 个用户")
+
+        today = datetime.now().date()
+        dates = [
+            today + timedelta(days=offset)
+            for offset in range(-options["days"], options["future_days"] + 1)
+        ]
+        tz = timezone.get_current_timezone()
+
+        tab_count = 0
+        order_count = 0
+        tabs = []
+        orders = []
+        for user_id in user_ids:
+            for order_date in dates:
+                # 周末没有点餐时段
+                if order_date.weekday() >= 5:
+                    continue
+                for index, (title, meal_time) in enumerate(MEAL_TABS):
+                    status = self._status_for(rng, order_date, today)
+                    tabs.append(
+                        TabStatus(
+                            user_id=user_id,
+                            tab_uid=f"tab-{user_id}-{index}",
+                            tab_title=title,
+                            target_time=timezone.make_aware(
+                                datetime.combine(order_date, meal_time), tz
+                            ),
+                            status=status,
+                            order_date=order_date,
+                        )
+                    )
+                    if "自助" in title and status in ("ORDERED", "CLOSED"):
+                        success = status == "ORDERED" or rng.random() > 0.3
+                        orders.append(
+                            OrderRecord(
+                                user_id=user_id,
+                                order_date=order_date,
+                                meal_period=title,
+                                meal_name=f"{title}套餐" if success else "",
+                                success=success,
+                                error_message=None if success else "下单失败: 已截止",
+                                tab_uid=f"tab-{user_id}-{index}",
+                            )
+                        )
+            if len(tabs) >= batch_size:
+                tab_count += self._flush(TabStatus, tabs, batch_size)
+                order_count += self._flush(OrderRecord, orders, batch_size)
+                tabs, orders = [], []
+
+        tab_count += self._flush(TabStatus, tabs, batch_size)
+        order_count += self._flush(OrderRecord, orders, batch_size)
+        # 明细是直接批量写入的，重建这些用户的面板读模型
+        read_model.rebuild(user_ids=user_ids)
+        # 历史日期的统计缓存已经过时
+        analytics.invalidate(dates)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"生成完成 - 用户:{len(user_ids)}, TabStatus:{tab_count}, OrderRecord:{order_count}"
+            )
+        )
+
+    @staticmethod
+    def _status_for(rng, order_date, today):
+        if order_date < today:
+            return "ORDERED" if rng.random() > 0.2 else "CLOSED"
+        return rng.choice(["AVAILABLE", "ORDERED", "NOT_YET", "CLOSED"])
+
+    @staticmethod
+    def _flush(model, objs, batch_size):
+        if not objs:
+            return 0
+        with transaction.atomic():
+            model.objects.bulk_create(objs, batch_size=batch_size)
+        return len(objs)
@@ -0,0 +1,88 @@
+"""
+Django 管理命令 - 批量导入用户
+"""
+
+import asyncio
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from meican import onboarding
+
+
+class Command(BaseCommand):
+    help = "从 CSV 文件或命令行批量导入用户：并发验证登录，一次性创建，首次点餐交给定时任务"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "emails",
+            nargs="*",
+            help="要导入的邮箱",
+        )
+        parser.add_argument(
+            "--file",
+            type=str,
+            help="CSV 文件路径（有 email 表头时读取该列，否则读取第一列），- 表示标准输入",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            help="同时验证登录的数量（默认读取 MEICAN_IMPORT_CONCURRENCY）",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="只验证登录，不创建用户",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="以 JSON 格式输出每个邮箱的结果",
+        )
+
+    def handle(self, *args, **options):
+        emails = list(options["emails"])
+        if options["file"]:
+            if options["file"] == "-":
+                text = sys.stdin.read()
+            else:
+                with open(options["file"], encoding="utf-8-sig") as f:
+                    text = f.read()
+            emails.extend(onboarding.parse_emails(text))
+        if not emails:
+            self.stdout.write(self.style.ERROR("没有找到邮箱地址"))
+            return
+
+        try:
+            report = asyncio.run(
+                onboarding.import_users(
+                    emails,
+                    concurrency=options["concurrency"],
+                    dry_run=options["dry_run"],
+                )
+            )
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        for item in report["results"]:
+            line = f"{item['email']}: {onboarding.RESULT_LABELS[item['result']]} - {item['message']}"
+            if item["result"] in (onboarding.CREATED, onboarding.VALID):
+                self.stdout.write(self.style.SUCCESS(line))
+            elif item["result"] == onboarding.LOGIN_FAILED:
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(self.style.WARNING(line))
+        self.stdout.write(
+            f"共 {report['total']} 个邮箱 - "
+            + ", ".join(
+                f"{label}:{report[key]}"
+                for key, label in onboarding.RESULT_LABELS.items()
+                if report[key]
+            )
+        )
@@ -0,0 +1,40 @@
+"""
+Django 管理命令 - 重建面板读模型
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from meican import read_model
+
+
+class Command(BaseCommand):
+    help = "按 TabStatus / OrderRecord 重建面板读模型 DashboardDay（升级后或直接修改明细表之后执行）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=str,
+            help="起始日期 (YYYY-MM-DD 格式)，默认今天",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="每个事务处理的用户数",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = datetime.strptime(options["since"], "%Y-%m-%d").date()
+            except ValueError:
+                self.stdout.write(
+                    self.style.ERROR("日期格式错误，请使用 YYYY-MM-DD 格式")
+                )
+                return
+
+        written = read_model.rebuild(since=since, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"面板读模型重建完成，共 {written} 行"))
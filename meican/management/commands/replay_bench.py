@@ -0,0 +1,90 @@
+"""
+Django 管理命令 - 基于 cassette 回放的解析 / 点餐流程基准测试
+不访问网络，可重复执行
+"""
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from meican import cassette
+from meican.api_client import MeiCan
+from meican.meican_models import TabStatus
+
+
+class Command(BaseCommand):
+    help = "使用录制好的 cassette 回放美餐接口，测量解析和点餐流程的耗时"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "cassette",
+            type=str,
+            help="cassette 文件路径（*.jsonl.gz）",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="重复执行次数",
+        )
+        parser.add_argument(
+            "--latency",
+            action="store_true",
+            help="按录制时的耗时回放响应",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="随机选菜使用的随机种子，保证每次结果一致",
+        )
+
+    def handle(self, *args, **options):
+        path = options["cassette"]
+        username = cassette.recorded_username(path)
+        if not username:
+            raise CommandError("cassette 中没有登录请求，无法回放")
+
+        random.seed(options["seed"])
+        timings = {"login": [], "calendar": [], "menus": [], "order": [], "total": []}
+
+        for _ in range(options["repeat"]):
+            session = cassette.replay_session(path, latency=options["latency"])
+            started = time.perf_counter()
+
+            mark = time.perf_counter()
+            client = MeiCan(username, cassette.SCRUBBED, session=session)
+            timings["login"].append(time.perf_counter() - mark)
+
+            mark = time.perf_counter()
+            tabs = client.tabs
+            timings["calendar"].append(time.perf_counter() - mark)
+
+            buffet_tabs = [
+                tab
+                for tab in tabs
+                if tab.status == TabStatus.AVAIL and "自助" in tab.title
+            ]
+            menus_time = 0.0
+            order_time = 0.0
+            for tab in buffet_tabs:
+                mark = time.perf_counter()
+                dishes = [d for d in client.list_dishes(tab) if "自助" in d.name]
+                menus_time += time.perf_counter() - mark
+                if dishes:
+                    mark = time.perf_counter()
+                    client.order(random.choice(dishes))
+                    order_time += time.perf_counter() - mark
+            timings["menus"].append(menus_time)
+            timings["order"].append(order_time)
+            timings["total"].append(time.perf_counter() - started)
+
+        self.stdout.write(f"回放 {path}，共 {options['repeat']} 次（用户 {username}）")
+        for stage, values in timings.items():
+            self.stdout.write(
+                f"{stage:>9}: min {min(values) * 1000:8.2f}ms"
+                f"  median {statistics.median(values) * 1000:8.2f}ms"
+                f"  mean {statistics.mean(values) * 1000:8.2f}ms"
+            )
@@ -0,0 +1,64 @@
+"""
+Django 管理命令 - 合并分片汇总
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from meican import sharding
+
+
+class Command(BaseCommand):
+    help = "合并一次自动点餐运行中各分片写入的汇总"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--run-id",
+            type=str,
+            help="运行编号（默认取最近一次写入汇总的运行）",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="以 JSON 格式输出合并结果",
+        )
+
+    def handle(self, *args, **options):
+        run_id = options["run_id"] or sharding.latest_run_id()
+        combined = sharding.aggregate(run_id) if run_id else None
+        if combined is None:
+            self.stdout.write(self.style.ERROR("没有找到分片汇总"))
+            return
+
+        if options["json"]:
+            self.stdout.write(json.dumps(combined, ensure_ascii=False, indent=2))
+            return
+
+        for shard in combined["shards"]:
+            self.stdout.write(
+                f"分片 {shard['shard_index']}/{shard['shard_count']} - "
+                f"用户:{shard['total']}, 处理:{shard['planned']}, 跳过:{shard['skipped']}, "
+                f"成功:{shard['success']}, 失败:{shard['failed']}, 被占用:{shard.get('busy', 0)}, "
+                f"隔离中:{shard.get('quarantined', 0)}, 错过截止:{shard.get('deadline_missed', 0)}, "
+                f"耗时:{shard['finished_at'] - shard['started_at']:.2f}s"
+            )
+        if combined["missing"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    "尚未完成的分片: "
+                    + ", ".join(
+                        f"{index}/{combined['shard_count']}"
+                        for index in combined["missing"]
+                    )
+                )
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"运行 {combined['run_id']} 合计 - 用户:{combined['total']}, "
+                f"处理:{combined['planned']}, 跳过:{combined['skipped']}, "
+                f"成功:{combined['success']}, 失败:{combined['failed']}, 被占用:{combined['busy']}, "
+                f"隔离中:{combined['quarantined']}, 错过截止:{combined['deadline_missed']}, "
+                f"耗时:{combined['wall_seconds']:.2f}s"
+            )
+        )
@@ -68,6 +68,23 @@ class Tab(ReadableObject):
         self.status = TabStatus.parse(data["status"])
         self.uid = data["userTab"]["uniqueId"]
         self.addresses = [Address(_) for _ in data["userTab"]["corp"]["addressList"]]
+        self.close_time = self._parse_close_time(data.get("openingTime"))
+
+    def _parse_close_time(self, opening_time):
+        """
+        截止点餐时间：openingTime.closeTime 是用餐当天的 "HH:MM"，没有时返回 None
+
+        :rtype: datetime.datetime | None
+        """
+        try:
+            hour, minute = (int(_) for _ in opening_time["closeTime"].split(":")[:2])
+        except (TypeError, KeyError, ValueError, AttributeError):
+            return None
+        close_time = self.target_time.replace(
+            hour=hour, minute=minute, second=0, microsecond=0
+        )
+        # 截止时间不会晚于用餐时间
+        return min(close_time, self.target_time)
 
     def __repr__(self):
         return "{} {} {}".format(
@@ -5,17 +5,310 @@ from datetime import datetime, timedelta
 from django.conf import settings
 
 # 导入美餐 API 客户端和异常
+from . import cassette, menu_cache, session_pool
 from .api_client import MeiCan
+from .db_writer import OrderResultRecord, TabSyncRecord, apply_now
 from .exceptions import MeiCanLoginFail, NoOrderAvailable
 
 logger = logging.getLogger("meican")
 
 
+def tab_status_value(tab):
+    """统一处理 Tab 状态值"""
+    if hasattr(tab.status, "value"):
+        return tab.status.value
+    elif hasattr(tab.status, "name"):
+        return tab.status.name
+    else:
+        return str(tab.status)
+
+
+def build_tab_rows(user, all_tabs, today):
+    """
+    把美餐返回的 Tab 整理成待写入数据库的行（只保留今天及以后的 Tab）
+    :return: (tab_rows, synced_tabs)
+    """
+    synced_tabs = []
+    tab_rows = []
+
+    for tab in all_tabs:
+        try:
+            # 计算对应的用餐日期
+            order_date = tab.target_time.date()
+
+            # 只同步今天及以后的 Tab
+            if order_date < today:
+                continue
+
+            status_value = tab_status_value(tab)
+
+            tab_rows.append(
+                {
+                    "tab_uid": tab.uid,
+                    "tab_title": tab.title,
+                    "target_time": tab.target_time,
+                    "close_time": getattr(tab, "close_time", None),
+                    "status": status_value,
+                    "order_date": order_date,
+                }
+            )
+
+            if status_value == "ORDERED":
+                logger.info(
+                    f"用户 {user.email} 时段 {tab.title} 已有订单，已同步到本地"
+                )
+
+            synced_tabs.append(
+                {
+                    "tab_title": tab.title,
+                    "order_date": order_date.isoformat(),
+                    "status": status_value,
+                    # 是否真正写入，交给写线程批量写入时要到落盘后才知道，为 None
+                    "created": None,
+                }
+            )
+
+            logger.info(
+                f"用户 {user.email} Tab '{tab.title}' 状态已同步: {status_value}"
+            )
+
+        except Exception as tab_error:
+            logger.error(f"同步 Tab {tab.title} 状态时出错: {tab_error}")
+            continue
+
+    return tab_rows, synced_tabs
+
+
+def sync_result(synced_tabs, applied):
+    """
+    :param applied: TabSyncRecord.apply() 的返回值，交给写线程时为 None
+    :return: sync_user_tabs_status 返回的同步信息
+    """
+    if applied is None:
+        return {"synced_tabs": synced_tabs}
+    for item, created in zip(synced_tabs, applied["created"]):
+        item["created"] = created
+    return {"synced_tabs": synced_tabs, "conflicts": applied["conflicts"]}
+
+
+def split_buffet_tabs(all_tabs):
+    """
+    把自助餐 Tab 分为可下单、已订餐、不可订餐三类
+    :return: (orderable_tabs, already_ordered, unavailable_tabs)
+    """
+    orderable_tabs = []
+    already_ordered = []
+    unavailable_tabs = []
+
+    for tab in [tab for tab in all_tabs if "自助" in tab.title]:
+        print(f"检查自助餐标签页: {tab.title}, 状态: {tab.status}")
+
+        status_value = tab_status_value(tab)
+
+        # 计算订单日期
+        order_date = tab.target_time.date()
+
+        # 如果这个时段已经订过餐，跳过
+        if status_value == "ORDERED":
+            already_ordered.append(
+                {
+                    "tab_title": tab.title,
+                    "order_date": order_date.isoformat(),
+                    "status": status_value,
+                }
+            )
+            logger.info(f"时段 {tab.title} 已订餐，跳过")
+            continue
+
+        # 如果这个时段不可用，跳过
+        if status_value not in ["AVAILABLE", "AVAIL"]:
+            unavailable_tabs.append(
+                {
+                    "tab_title": tab.title,
+                    "order_date": order_date.isoformat(),
+                    "status": status_value,
+                }
+            )
+            logger.info(f"时段 {tab.title} 不可订餐 (状态: {status_value})，跳过")
+            continue
+
+        orderable_tabs.append(tab)
+
+    return orderable_tabs, already_ordered, unavailable_tabs
+
+
+def closed_menu_tabs(all_tabs, previous_states):
+    """状态发生了变化且已不可下单的时段，它们缓存的菜单不再需要"""
+    if previous_states is None:
+        return []
+    return [
+        tab
+        for tab in all_tabs
+        if tab_status_value(tab) not in ["AVAILABLE", "AVAIL"]
+        and menu_cache.state_changed(tab, tab_status_value(tab), previous_states)
+    ]
+
+
+def tabs_to_order(orderable_tabs, previous_states):
+    """
+    :param previous_states: 本次同步前本地保存的 Tab 状态，为 None 表示没有可对比的状态
+    :return: [(tab, changed)]，changed 表示时段状态相对上一次同步是否发生了变化
+    """
+    return [
+        (tab, menu_cache.state_changed(tab, tab_status_value(tab), previous_states))
+        for tab in orderable_tabs
+    ]
+
+
+def previous_failure(tab, changed):
+    """
+    状态未变化的时段上次下单失败且记录未过期时，本次不再拉取菜单和下单
+    :return: 上次的失败原因，需要下单时返回 None
+    """
+    if changed:
+        return None
+    error = menu_cache.get_failure(tab)
+    if error is not None:
+        logger.info(f"时段 {tab.title} 状态未变化，上次下单失败，暂不重试: {error}")
+    return error
+
+
+def select_buffet_dish(tab, dishes):
+    """
+    从时段的菜品中随机选择一个自助餐（包含"自助"关键词的菜品）
+    :return: (dish, error_message)，没有可选的自助餐时 dish 为 None
+    """
+    if not dishes:
+        return None, f"时段 {tab.title} 没有可订购的菜品"
+
+    buffet_dishes = [dish for dish in dishes if "自助" in dish.name]
+    if not buffet_dishes:
+        return None, f"时段 {tab.title} 没有找到自助餐菜品"
+
+    selected_dish = random.choice(buffet_dishes)
+    logger.info(f"为时段 {tab.title} 选择自助餐: {selected_dish.name}")
+    return selected_dish, None
+
+
+def order_record(user, tab, meal_name="", error_message=None):
+    """时段下单结果对应的订单记录，error_message 为 None 表示下单成功"""
+    return OrderResultRecord(
+        user_id=user.id,
+        order_date=tab.target_time.date(),
+        meal_period=tab.title,
+        meal_name=meal_name,
+        success=error_message is None,
+        error_message=error_message,
+        tab_uid=tab.uid,
+    )
+
+
+def order_failed(tab, error):
+    """
+    下单时发生异常
+    :return: 错误信息
+    """
+    logger.error(f"时段 {tab.title} 订餐失败: {error}")
+    return f"下单失败: {str(error)}"
+
+
+def collect_order_result(successful_orders, user, tab, meal_name, error):
+    """记录单个时段的下单结果，成功时加入 successful_orders"""
+    if error is None:
+        successful_orders.append(
+            {
+                "tab_title": tab.title,
+                "order_date": tab.target_time.date().isoformat(),
+                "meal_name": meal_name,
+                "tab_uid": tab.uid,
+            }
+        )
+        logger.info(f"用户 {user.email} 在时段 {tab.title} 成功下单: {meal_name}")
+    else:
+        logger.error(f"用户 {user.email} 在时段 {tab.title} 下单失败: {error}")
+
+
+def refresh_result(user, sync_info, order_success, order_info, order_error):
+    """refresh_user_status 的汇总结果"""
+    result_info = {
+        "user_email": user.email,
+        "sync_info": sync_info,
+        "order_info": order_info,
+        "refresh_time": datetime.now().isoformat(),
+    }
+    if not order_success:
+        result_info["order_error"] = order_error
+    return result_info
+
+
+def order_results_summary(successful_orders, already_ordered, unavailable_tabs):
+    return {
+        "successful_orders": successful_orders,
+        "already_ordered": already_ordered,
+        "unavailable_tabs": unavailable_tabs,
+        "summary": {
+            "successful_count": len(successful_orders),
+            "already_ordered_count": len(already_ordered),
+            "unavailable_count": len(unavailable_tabs),
+        },
+    }
+
+
+def compat_order_result(order_info):
+    """把批量订餐结果转换为 find_and_order_buffet 的兼容格式"""
+    summary = order_info.get("summary", {})
+    successful_count = summary.get("successful_count", 0)
+    already_ordered_count = summary.get("already_ordered_count", 0)
+
+    messages = []
+    if successful_count > 0:
+        messages.append(f"新订餐成功: {successful_count} 个时段")
+    if already_ordered_count > 0:
+        messages.append(f"已有订单: {already_ordered_count} 个时段")
+
+    message = "; ".join(messages) if messages else "没有找到可订购的自助餐"
+
+    return {
+        "successful_orders": [
+            f"{item['tab_title']}: {item['meal_name']}"
+            for item in order_info.get("successful_orders", [])
+        ],
+        "ordered_meals": [
+            item["tab_title"] for item in order_info.get("already_ordered", [])
+        ],
+        "message": message,
+    }
+
+
+def _close_all(clients):
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            logger.debug(f"关闭美餐客户端失败: {e}")
+
+
 class MeicanService:
     """美餐服务类，处理登录、获取菜单、下单等操作"""
 
-    def __init__(self):
+    def __init__(self, writer=None, pooled=False):
+        """
+        :param writer: DBWriter 对象，传入时数据库写入交给写线程批量执行，否则直接写入
+        :param pooled: 是否从进程内连接池复用已登录的客户端（Web 进程使用），用完需调用 release()
+        """
         self.meican_client = None
+        self.writer = writer
+        self.pooled = pooled and session_pool.clients.enabled
+        self._email = None
+        # 本次同步前本地保存的 Tab 状态 {user_id: {(tab_uid, order_date): status}}
+        self._previous_states = {}
+
+    def _write(self, record):
+        """:return: 直接写入时为 record.apply() 的返回值，交给写线程时为 None"""
+        if self.writer:
+            self.writer.submit(record)
+            return None
+        return apply_now(record)
 
     def login(self, email, password=None):
         """
@@ -24,13 +317,29 @@ class MeicanService:
         :param password: 密码，如果为None则使用全局密码
         :return: (success, token, error_message)
         """
+        # 已经为该用户登录过，不再重复登录
+        if (
+            self.meican_client
+            and self._email == email
+            and not self.meican_client.expired
+        ):
+            return True, "login_success", None
+        self.release()
+
+        # 只有使用全局密码的登录才放入连接池
+        if self.pooled and password is None and self._checkout(email):
+            return True, "login_success", None
+
         if password is None:
             password = settings.MEICAN_GLOBAL_PASSWORD
 
         try:
             # 使用新的 API 客户端进行登录
             print(f"正在尝试登录用户: {email}")
-            self.meican_client = MeiCan(email, password)
+            self.meican_client = MeiCan(
+                email, password, session=cassette.session_for(email)
+            )
+            self._email = email
             logger.info(f"用户 {email} 登录成功")
             return True, "login_success", None
         except MeiCanLoginFail as e:
@@ -40,6 +349,33 @@ class MeicanService:
             logger.error(f"登录异常: {e}")
             return False, None, f"登录异常: {str(e)}"
 
+    def _checkout(self, email):
+        """从连接池取出已登录的客户端，刷新日历的同时确认会话仍然有效"""
+        client, discarded = session_pool.clients.checkout(email)
+        _close_all(discarded)
+        if client is None:
+            return False
+        try:
+            client.load_tabs(refresh=True)
+        except Exception as e:
+            logger.info(f"用户 {email} 的会话已失效，重新登录: {e}")
+            _close_all([client])
+            return False
+        logger.info(f"用户 {email} 复用已登录的会话")
+        self.meican_client = client
+        self._email = email
+        return True
+
+    def release(self):
+        """释放当前客户端：开启连接池时归还到池中，否则直接丢弃"""
+        client, self.meican_client = self.meican_client, None
+        if client is None:
+            return
+        if self.pooled:
+            _close_all(session_pool.clients.checkin(self._email, client))
+        else:
+            _close_all([client])
+
     def sync_user_tabs_status(self, user):
         """
         同步用户的所有 Tab 状态到数据库
@@ -50,87 +386,23 @@ class MeicanService:
             if not self.meican_client:
                 return False, {}, "未登录"
 
-            from .models import TabStatus
-
             # 获取所有 tabs
             all_tabs = self.meican_client.tabs
             if not all_tabs:
                 return False, {}, "未获取到任何 Tab 信息"
 
-            synced_tabs = []
             today = datetime.now().date()
+            tab_rows, synced_tabs = build_tab_rows(user, all_tabs, today)
 
-            # 清除该用户今天及以后的所有 Tab 状态记录
-            TabStatus.objects.filter(user=user, order_date__gte=today).delete()
+            # 覆盖之前先记下上一次的状态，下单时据此判断是否需要重新拉取菜单
+            previous_states = menu_cache.stored_tab_states(user.id, today)
+            self._previous_states[user.id] = previous_states
+            menu_cache.discard_menus(closed_menu_tabs(all_tabs, previous_states))
 
-            # 同时清除今天及以后的 OrderRecord，以确保数据一致性
-            from .models import OrderRecord
+            # 清除该用户今天及以后的 Tab 状态和 OrderRecord 后重建，以确保数据一致性
+            applied = self._write(TabSyncRecord(user.id, today, tab_rows))
 
-            OrderRecord.objects.filter(user=user, order_date__gte=today).delete()
-
-            for tab in all_tabs:
-                try:
-                    # 计算对应的用餐日期
-                    order_date = tab.target_time.date()
-
-                    # 只同步今天及以后的 Tab
-                    if order_date < today:
-                        continue
-
-                    # 统一处理状态值
-                    if hasattr(tab.status, "value"):
-                        status_value = tab.status.value
-                    elif hasattr(tab.status, "name"):
-                        status_value = tab.status.name
-                    else:
-                        status_value = str(tab.status)
-
-                    # 创建或更新 Tab 状态记录
-                    tab_status, created = TabStatus.objects.update_or_create(
-                        user=user,
-                        tab_uid=tab.uid,
-                        order_date=order_date,
-                        defaults={
-                            "tab_title": tab.title,
-                            "target_time": tab.target_time,
-                            "status": status_value,
-                        },
-                    )
-
-                    # 如果状态为已点餐，同时创建对应的 OrderRecord 记录
-                    if status_value == "ORDERED":
-                        # 创建订单记录，菜品名称使用占位符（因为无法从Tab状态获取具体菜品）
-                        OrderRecord.objects.create(
-                            user=user,
-                            order_date=order_date,
-                            meal_period=tab.title,
-                            meal_name="已点餐（从美餐同步）",
-                            success=True,
-                            error_message=None,
-                            tab_uid=tab.uid,
-                        )
-                        logger.info(
-                            f"用户 {user.email} 时段 {tab.title} 已有订单，已同步到本地"
-                        )
-
-                    synced_tabs.append(
-                        {
-                            "tab_title": tab.title,
-                            "order_date": order_date.isoformat(),
-                            "status": status_value,
-                            "created": created,
-                        }
-                    )
-
-                    logger.info(
-                        f"用户 {user.email} Tab '{tab.title}' 状态已同步: {status_value}"
-                    )
-
-                except Exception as tab_error:
-                    logger.error(f"同步 Tab {tab.title} 状态时出错: {tab_error}")
-                    continue
-
-            return True, {"synced_tabs": synced_tabs}, None
+            return True, sync_result(synced_tabs, applied), None
 
         except Exception as e:
             logger.error(f"同步用户 Tab 状态失败: {e}")
@@ -154,81 +426,22 @@ class MeicanService:
             if not all_buffet_tabs:
                 return True, {"message": "当前没有自助餐可订"}, None
 
+            orderable_tabs, already_ordered, unavailable_tabs = split_buffet_tabs(
+                all_buffet_tabs
+            )
             successful_orders = []
-            already_ordered = []
-            unavailable_tabs = []
-
-            for tab in all_buffet_tabs:
-                print(f"检查自助餐标签页: {tab.title}, 状态: {tab.status}")
-
-                # 统一处理状态检查
-                if hasattr(tab.status, "value"):
-                    status_value = tab.status.value
-                elif hasattr(tab.status, "name"):
-                    status_value = tab.status.name
-                else:
-                    status_value = str(tab.status)
-
-                # 计算订单日期
-                order_date = tab.target_time.date()
-
-                # 如果这个时段已经订过餐，跳过
-                if status_value == "ORDERED":
-                    already_ordered.append(
-                        {
-                            "tab_title": tab.title,
-                            "order_date": order_date.isoformat(),
-                            "status": status_value,
-                        }
-                    )
-                    logger.info(f"时段 {tab.title} 已订餐，跳过")
-                    continue
-
-                # 如果这个时段不可用，跳过
-                if status_value not in ["AVAILABLE", "AVAIL"]:
-                    unavailable_tabs.append(
-                        {
-                            "tab_title": tab.title,
-                            "order_date": order_date.isoformat(),
-                            "status": status_value,
-                        }
-                    )
-                    logger.info(
-                        f"时段 {tab.title} 不可订餐 (状态: {status_value})，跳过"
-                    )
-                    continue
-
-                # 尝试下单
-                order_success, meal_name, error = self._order_buffet_for_tab(tab, user)
-
-                if order_success:
-                    successful_orders.append(
-                        {
-                            "tab_title": tab.title,
-                            "order_date": order_date.isoformat(),
-                            "meal_name": meal_name,
-                            "tab_uid": tab.uid,
-                        }
-                    )
-                    logger.info(
-                        f"用户 {user.email} 在时段 {tab.title} 成功下单: {meal_name}"
-                    )
-                else:
-                    logger.error(
-                        f"用户 {user.email} 在时段 {tab.title} 下单失败: {error}"
-                    )
+
+            for tab, changed in tabs_to_order(
+                orderable_tabs, self._previous_states.get(user.id)
+            ):
+                # 尝试下单，状态未变化的时段优先使用缓存的菜单
+                _, meal_name, error = self._order_buffet_for_tab(tab, user, changed)
+                collect_order_result(successful_orders, user, tab, meal_name, error)
 
             # 汇总结果
-            order_results = {
-                "successful_orders": successful_orders,
-                "already_ordered": already_ordered,
-                "unavailable_tabs": unavailable_tabs,
-                "summary": {
-                    "successful_count": len(successful_orders),
-                    "already_ordered_count": len(already_ordered),
-                    "unavailable_count": len(unavailable_tabs),
-                },
-            }
+            order_results = order_results_summary(
+                successful_orders, already_ordered, unavailable_tabs
+            )
 
             return True, order_results, None
 
@@ -236,73 +449,55 @@ class MeicanService:
             logger.error(f"批量订餐失败: {e}")
             return False, {}, f"批量订餐失败: {str(e)}"
 
-    def _order_buffet_for_tab(self, tab, user):
+    def _menu_dishes(self, tab, changed):
+        """
+        获取时段的菜品：状态未变化且缓存未过期时使用缓存的菜单，否则从美餐拉取并缓存
+        :return: list[Dish]
+        """
+        menu = None if changed else menu_cache.get_menu(tab)
+        if menu is not None:
+            logger.info(f"时段 {tab.title} 状态未变化，使用缓存的菜单")
+            return menu_cache.dishes_from_menu(tab, menu)
+        menu = self.meican_client.load_menu(tab)
+        menu_cache.set_menu(tab, menu)
+        return menu_cache.dishes_from_menu(tab, menu)
+
+    def _order_buffet_for_tab(self, tab, user, changed=True):
         """
         为特定 Tab 下单自助餐
         :param tab: Tab 对象
         :param user: MeicanUser 对象
+        :param changed: 时段状态相对上一次同步是否发生了变化
         :return: (success, meal_name, error_message)
         """
         try:
-            # 获取这个时段的所有菜品
-            dishes = self.meican_client.list_dishes(tab)
-            if not dishes:
-                return False, None, f"时段 {tab.title} 没有可订购的菜品"
-
-            # 查找自助餐（包含"自助"关键词的菜品）
-            buffet_dishes = [dish for dish in dishes if "自助" in dish.name]
+            error = previous_failure(tab, changed)
+            if error is not None:
+                return False, None, error
 
-            if not buffet_dishes:
-                return False, None, f"时段 {tab.title} 没有找到自助餐菜品"
-
-            # 随机选择一个自助餐
-            selected_dish = random.choice(buffet_dishes)
-            logger.info(f"为时段 {tab.title} 选择自助餐: {selected_dish.name}")
+            # 获取这个时段的所有菜品，随机选择一个自助餐
+            selected_dish, error = select_buffet_dish(
+                tab, self._menu_dishes(tab, changed)
+            )
+            if selected_dish is None:
+                return False, None, error
 
             # 下单
             order_result = self.meican_client.order(selected_dish)
             logger.info(f"时段 {tab.title} 订餐结果: {order_result}")
 
             # 记录到数据库
-            from .models import OrderRecord
-
-            order_date = tab.target_time.date()
-
-            OrderRecord.objects.update_or_create(
-                user=user,
-                order_date=order_date,
-                meal_period=tab.title,
-                defaults={
-                    "meal_name": selected_dish.name,
-                    "success": True,
-                    "error_message": None,
-                    "tab_uid": tab.uid,
-                },
-            )
-
+            self._write(order_record(user, tab, selected_dish.name))
             return True, selected_dish.name, None
 
         except Exception as e:
-            error_msg = f"下单失败: {str(e)}"
-            logger.error(f"时段 {tab.title} 订餐失败: {e}")
+            error_msg = order_failed(tab, e)
+            # 状态变化或缓存过期之前不再重试，届时重新拉取菜单
+            menu_cache.set_failure(tab, error_msg)
 
             # 记录失败的订单
             try:
-                from .models import OrderRecord
-
-                order_date = tab.target_time.date()
-
-                OrderRecord.objects.update_or_create(
-                    user=user,
-                    order_date=order_date,
-                    meal_period=tab.title,
-                    defaults={
-                        "meal_name": "",
-                        "success": False,
-                        "error_message": error_msg,
-                        "tab_uid": tab.uid,
-                    },
-                )
+                self._write(order_record(user, tab, error_message=error_msg))
             except Exception as db_error:
                 logger.error(f"记录失败订单时出错: {db_error}")
 
@@ -332,17 +527,11 @@ class MeicanService:
             )
 
             # 汇总结果
-            result_info = {
-                "user_email": user.email,
-                "sync_info": sync_info,
-                "order_info": order_info,
-                "refresh_time": datetime.now().isoformat(),
-            }
-
-            if not order_success:
-                result_info["order_error"] = order_error
-
-            return True, result_info, None
+            return (
+                True,
+                refresh_result(user, sync_info, order_success, order_info, order_error),
+                None,
+            )
 
         except Exception as e:
             logger.error(f"刷新用户 {user.email} 状态失败: {e}")
@@ -383,32 +572,8 @@ class MeicanService:
             )
 
             if order_success:
-                summary = order_info.get("summary", {})
-                successful_count = summary.get("successful_count", 0)
-                already_ordered_count = summary.get("already_ordered_count", 0)
-
-                messages = []
-                if successful_count > 0:
-                    messages.append(f"新订餐成功: {successful_count} 个时段")
-                if already_ordered_count > 0:
-                    messages.append(f"已有订单: {already_ordered_count} 个时段")
-
-                message = "; ".join(messages) if messages else "没有找到可订购的自助餐"
-
                 # 返回兼容格式
-                return_data = {
-                    "successful_orders": [
-                        f"{item['tab_title']}: {item['meal_name']}"
-                        for item in order_info.get("successful_orders", [])
-                    ],
-                    "ordered_meals": [
-                        item["tab_title"]
-                        for item in order_info.get("already_ordered", [])
-                    ],
-                    "message": message,
-                }
-
-                return True, return_data, ""
+                return True, compat_order_result(order_info), ""
             else:
                 return False, order_error if order_error else "订餐失败"
 
@@ -444,9 +609,11 @@ class MeicanService:
                 "tab": {
                     "uid": tab.uid,
                     "name": getattr(tab, "name", "Unknown"),
-                    "status": tab.status.name
-                    if hasattr(tab.status, "name")
-                    else str(tab.status),
+                    "status": (
+                        tab.status.name
+                        if hasattr(tab.status, "name")
+                        else str(tab.status)
+                    ),
                 },
                 "restaurants": [
                     {
@@ -0,0 +1,133 @@
+"""
+Tab 状态驱动的菜单拉取
+每次执行只轻量地拉取日历，与本地保存的上一次 TabStatus 对比：
+只有状态发生变化（例如刚开放点餐）或缓存已过期时，才重新拉取餐厅和菜品列表并下单；
+状态未变的时段直接使用缓存的菜单挑选菜品，缓存中没有自助餐菜品时不再发起任何请求；
+上次下单失败的时段记下失败原因，状态变化或缓存过期之前不再拉取菜单和下单
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .utils import get_dishes, get_restaurants
+
+logger = logging.getLogger("meican")
+
+MENU_KEY = "meican:menu:{tab_uid}:{target_time}"
+FAILURE_KEY = "meican:menu-failure:{tab_uid}:{target_time}"
+
+
+def stored_tab_states(user_id, today):
+    """
+    读取本地保存的上一次 Tab 状态，需要在本次同步写入之前调用
+
+    :type today: datetime.date
+    :return: {(tab_uid, order_date): status}
+    """
+    from .models import TabStatus
+
+    return {
+        (row["tab_uid"], row["order_date"]): row["status"]
+        for row in TabStatus.objects.filter(
+            user_id=user_id, order_date__gte=today
+        ).values("tab_uid", "order_date", "status")
+    }
+
+
+def state_changed(tab, status_value, previous_states):
+    """
+    :param previous_states: stored_tab_states 的返回值，为 None 表示没有可对比的状态
+    :rtype: bool
+    """
+    if previous_states is None:
+        return True
+    return previous_states.get((tab.uid, tab.target_time.date())) != status_value
+
+
+def _key(tab, template=MENU_KEY):
+    return template.format(
+        tab_uid=tab.uid, target_time=int(tab.target_time.timestamp())
+    )
+
+
+def get_menu(tab):
+    """
+    :return: 缓存的原始菜单数据，未命中或未开启缓存时返回 None
+    """
+    if settings.MEICAN_MENU_CACHE_SECONDS <= 0:
+        return None
+    try:
+        return cache.get(_key(tab))
+    except Exception as e:
+        logger.warning(f"读取菜单缓存失败: {e}")
+        return None
+
+
+def set_menu(tab, menu):
+    """
+    :param menu: {"restaurants": 餐厅列表原始数据, "dishes": {餐厅 uid: 菜品列表原始数据}}
+    """
+    if settings.MEICAN_MENU_CACHE_SECONDS <= 0:
+        return
+    try:
+        cache.set(_key(tab), menu, timeout=settings.MEICAN_MENU_CACHE_SECONDS)
+    except Exception as e:
+        logger.warning(f"写入菜单缓存失败: {e}")
+
+
+def get_failure(tab):
+    """
+    :return: 上次下单失败的原因，没有失败记录或未开启缓存时返回 None
+    """
+    if settings.MEICAN_MENU_CACHE_SECONDS <= 0:
+        return None
+    try:
+        return cache.get(_key(tab, FAILURE_KEY))
+    except Exception as e:
+        logger.warning(f"读取下单失败记录失败: {e}")
+        return None
+
+
+def set_failure(tab, error):
+    """下单失败：丢弃可能已经过时的菜单，记下失败原因，与菜单使用相同的有效期"""
+    if settings.MEICAN_MENU_CACHE_SECONDS <= 0:
+        return
+    try:
+        cache.delete(_key(tab))
+        cache.set(
+            _key(tab, FAILURE_KEY), error, timeout=settings.MEICAN_MENU_CACHE_SECONDS
+        )
+    except Exception as e:
+        logger.warning(f"写入下单失败记录失败: {e}")
+
+
+def discard_menus(tabs):
+    """状态变化后不再可订的时段，丢弃其缓存的菜单和下单失败记录"""
+    if not tabs:
+        return
+    try:
+        cache.delete_many(
+            [
+                _key(tab, template)
+                for tab in tabs
+                for template in (MENU_KEY, FAILURE_KEY)
+            ]
+        )
+    except Exception as e:
+        logger.warning(f"清除菜单缓存失败: {e}")
+
+
+def dishes_from_menu(tab, menu):
+    """
+    把原始菜单数据解析为菜品列表
+
+    :rtype: list[Dish]
+    """
+    dishes = []
+    for restaurant in get_restaurants(tab, menu["restaurants"]):
+        data = menu["dishes"].get(restaurant.uid)
+        if data is not None:
+            dishes.extend(get_dishes(restaurant, data))
+    return dishes
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meican", "0004_orderrecord_tab_uid_tabstatus"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyOrderSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("tabs_total", models.PositiveIntegerField(default=0)),
+                ("buffet_tabs", models.PositiveIntegerField(default=0)),
+                ("tabs_ordered", models.PositiveIntegerField(default=0)),
+                ("tabs_closed", models.PositiveIntegerField(default=0)),
+                ("orders_success", models.PositiveIntegerField(default=0)),
+                ("orders_failed", models.PositiveIntegerField(default=0)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_summaries",
+                        to="meican.meicanuser",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["date"], name="meican_dail_date_3534c7_idx")
+                ],
+                "unique_together": {("user", "date")},
+            },
+        ),
+    ]
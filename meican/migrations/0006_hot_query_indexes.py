@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meican", "0005_dailyordersummary"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="tabstatus",
+            name="meican_tabs_user_id_2e68f8_idx",
+        ),
+        migrations.AddIndex(
+            model_name="orderrecord",
+            index=models.Index(
+                fields=["order_date"], name="meican_orde_order_d_f32e06_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tabstatus",
+            index=models.Index(
+                fields=["user", "order_date", "target_time"],
+                name="meican_tabs_user_id_1fd492_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meican", "0006_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="orderrecord",
+            index=models.Index(
+                fields=["order_time"], name="meican_orde_order_t_367120_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tabstatus",
+            index=models.Index(
+                fields=["last_updated"], name="meican_tabs_last_up_c273cb_idx"
+            ),
+        ),
+    ]
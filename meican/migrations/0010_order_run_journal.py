@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meican", "0009_lease"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("scope", models.CharField(max_length=100)),
+                ("status", models.CharField(default="running", max_length=20)),
+                ("full", models.BooleanField(default=False)),
+                ("started_at", models.DateTimeField(auto_now_add=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("summary", models.JSONField(default=dict)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["scope", "status"], name="meican_orde_scope_db4b4d_idx"
+                    ),
+                    models.Index(
+                        fields=["started_at"], name="meican_orde_started_50912f_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="OrderRunItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("status", models.CharField(default="pending", max_length=20)),
+                ("stage", models.CharField(blank=True, default="", max_length=20)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("error", models.TextField(blank=True, default="")),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="items",
+                        to="meican.orderrun",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="run_items",
+                        to="meican.meicanuser",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["run", "status"], name="meican_orde_run_id_72387f_idx"
+                    )
+                ],
+                "unique_together": {("run", "user")},
+            },
+        ),
+    ]
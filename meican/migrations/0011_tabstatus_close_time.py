@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meican", "0010_order_run_journal"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tabstatus",
+            name="close_time",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meican", "0011_tabstatus_close_time"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="meicanuser",
+            name="consecutive_failures",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="meicanuser",
+            name="last_failure",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="meicanuser",
+            name="next_eligible_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
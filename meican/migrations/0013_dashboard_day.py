@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meican", "0012_meicanuser_quarantine"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardDay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("tabs", models.JSONField(default=list)),
+                ("orders", models.JSONField(default=list)),
+                ("meals", models.TextField(blank=True, default="")),
+                ("has_buffet", models.BooleanField(default=False)),
+                ("ordered", models.BooleanField(default=False)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="dashboard_days",
+                        to="meican.meicanuser",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["date"], name="meican_dash_date_926827_idx")
+                ],
+                "unique_together": {("user", "date")},
+            },
+        ),
+    ]
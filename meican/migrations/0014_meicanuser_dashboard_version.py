@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meican", "0013_dashboard_day"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="meicanuser",
+            name="dashboard_version",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
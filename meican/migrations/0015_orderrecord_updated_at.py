@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:07
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_order_time(apps, schema_editor):
+    # 已有记录的更新时间取下单时间，避免迁移后所有记录的更新时间都相同
+    OrderRecord = apps.get_model("meican", "OrderRecord")
+    OrderRecord.objects.using(schema_editor.connection.alias).update(
+        updated_at=F("order_time")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meican", "0014_meicanuser_dashboard_version"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="orderrecord",
+            name="meican_orde_order_t_367120_idx",
+        ),
+        migrations.AddField(
+            model_name="orderrecord",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copy_order_time, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="orderrecord",
+            index=models.Index(
+                fields=["updated_at"], name="meican_orde_updated_f122e9_idx"
+            ),
+        ),
+    ]
@@ -7,6 +7,10 @@ class MeicanUser(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     last_login_attempt = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    consecutive_failures = models.PositiveIntegerField(default=0)  # 批量任务中连续失败的次数，成功后清零
+    next_eligible_at = models.DateTimeField(null=True, blank=True)  # 隔离到期时间，到期前批量任务跳过该用户
+    last_failure = models.TextField(blank=True, default="")  # 最近一次失败的原因
+    dashboard_version = models.PositiveBigIntegerField(default=0)  # 面板缓存版本号，数据变化时在同一个事务里原子递增
 
     def __str__(self):
         return self.email
@@ -20,6 +24,7 @@ class TabStatus(models.Model):
     tab_uid = models.CharField(max_length=100)  # Tab 的唯一标识
     tab_title = models.CharField(max_length=200)  # Tab 标题（如"午餐 12:00-13:00"）
     target_time = models.DateTimeField()  # 目标时间
+    close_time = models.DateTimeField(null=True, blank=True)  # 截止点餐时间（美餐返回时才有）
     status = models.CharField(max_length=20)  # 状态（AVAILABLE, ORDERED, CLOSED 等）
     order_date = models.DateField()  # 对应的用餐日期
     last_updated = models.DateTimeField(auto_now=True)  # 最后更新时间
@@ -27,8 +32,10 @@ class TabStatus(models.Model):
     class Meta:
         unique_together = ["user", "tab_uid", "order_date"]  # 每个用户每个Tab每天只有一条记录
         indexes = [
-            models.Index(fields=['user', 'order_date']),
+            # 面板按 (order_date, target_time) 排序，带上 target_time 可以省掉临时排序
+            models.Index(fields=['user', 'order_date', 'target_time']),
             models.Index(fields=['order_date', 'status']),
+            models.Index(fields=['last_updated']),  # 条件 GET 的校验值
         ]
 
     def __str__(self):
@@ -46,9 +53,128 @@ class OrderRecord(models.Model):
     success = models.BooleanField(default=False)
     error_message = models.TextField(blank=True, null=True)
     tab_uid = models.CharField(max_length=100, blank=True, null=True)  # 关联的 Tab UID
+    updated_at = models.DateTimeField(auto_now=True)  # 最后更新时间（update_or_create 更新已有记录时也会变化）
 
     class Meta:
         unique_together = ["user", "order_date", "meal_period"]  # 每个用户每天每个时段只能有一个订单记录
+        indexes = [
+            models.Index(fields=["order_date"]),  # 历史压缩 / 按天统计
+            models.Index(fields=["updated_at"]),  # 条件 GET 的校验值
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.order_date} - {self.meal_period} - {self.meal_name}"
+
+
+class DailyOrderSummary(models.Model):
+    """按用户按天汇总的历史数据 - 超过保留期的 TabStatus / OrderRecord 压缩后写入这里"""
+    user = models.ForeignKey(
+        MeicanUser, on_delete=models.CASCADE, related_name="daily_summaries"
+    )
+    date = models.DateField()  # 用餐日期
+    tabs_total = models.PositiveIntegerField(default=0)  # Tab 总数
+    buffet_tabs = models.PositiveIntegerField(default=0)  # 自助餐 Tab 数
+    tabs_ordered = models.PositiveIntegerField(default=0)  # 已点餐的 Tab 数
+    tabs_closed = models.PositiveIntegerField(default=0)  # 已关闭的 Tab 数
+    orders_success = models.PositiveIntegerField(default=0)  # 成功订单数
+    orders_failed = models.PositiveIntegerField(default=0)  # 失败订单数
+
+    class Meta:
+        unique_together = ["user", "date"]
+        indexes = [
+            models.Index(fields=["date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.date} - {self.orders_success}/{self.tabs_total}"
+
+
+class DashboardDay(models.Model):
+    """用户面板的物化读模型 - 每个用户每个用餐日期一行，同步 Tab 状态和下单时在同一个事务里维护"""
+    user = models.ForeignKey(
+        MeicanUser, on_delete=models.CASCADE, related_name="dashboard_days"
+    )
+    date = models.DateField()  # 用餐日期
+    tabs = models.JSONField(default=list)  # 按用餐时间排列的 Tab [{"title", "status", "target_time", "has_buffet"}]
+    orders = models.JSONField(default=list)  # 成功订单 [{"meal_period", "meal_name"}]
+    meals = models.TextField(blank=True, default="")  # 面板展示的菜品摘要（"时段: 菜品; ..."）
+    has_buffet = models.BooleanField(default=False)  # 当天是否有自助餐时段
+    ordered = models.BooleanField(default=False)  # 当天是否有成功订单
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ["user", "date"]
+        indexes = [
+            models.Index(fields=["date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.date} - {self.meals}"
+
+
+class DashboardEvent(models.Model):
+    """面板实时事件 - 同步、下单、任务进度产生的增量，由 SSE 接口推送给页面"""
+    user_id = models.BigIntegerField(null=True, blank=True)  # 不用外键，用户删除后事件仍可推送
+    kind = models.CharField(max_length=20)  # tab_status / order / job / user_deleted
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.id} - {self.kind} - {self.user_id}"
+
+
+class Lease(models.Model):
+    """租约 - 处理用户（或执行整轮定时任务）前必须持有，避免同一用户被多个流程并发处理"""
+    name = models.CharField(max_length=100, unique=True)  # user:<id> / cron:run / cron:run:2/4
+    owner = models.CharField(max_length=100)  # 持有者标识（主机名:进程号:随机串）
+    acquired_at = models.DateTimeField()
+    expires_at = models.DateTimeField()  # 持有者定期续约，过期未续约的租约可以被其他流程接管
+
+    def __str__(self):
+        return f"{self.name} - {self.owner} - {self.expires_at}"
+
+
+class OrderRun(models.Model):
+    """一轮自动点餐任务的日志 - 进程中途退出后，下一次启动从这里恢复未完成的用户"""
+    scope = models.CharField(max_length=100)  # 与整轮租约同名：cron:run / cron:run:2/4
+    status = models.CharField(max_length=20, default="running")  # running / finished / abandoned
+    full = models.BooleanField(default=False)  # 是否全量执行
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    summary = models.JSONField(default=dict)  # 结束时的汇总
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["scope", "status"]),
+            models.Index(fields=["started_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.id} - {self.scope} - {self.status}"
+
+
+class OrderRunItem(models.Model):
+    """一轮任务中单个用户的进度"""
+    run = models.ForeignKey(OrderRun, on_delete=models.CASCADE, related_name="items")
+    user = models.ForeignKey(
+        MeicanUser, on_delete=models.CASCADE, related_name="run_items"
+    )
+    status = models.CharField(max_length=20, default="pending")  # pending / in_progress / done / failed / skipped
+    stage = models.CharField(max_length=20, blank=True, default="")  # login / sync / order
+    attempts = models.PositiveIntegerField(default=0)  # 开始处理的次数（恢复后重试会累加）
+    error = models.TextField(blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ["run", "user"]
+        indexes = [
+            models.Index(fields=["run", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.run_id} - {self.user_id} - {self.status} - {self.stage}"
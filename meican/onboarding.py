@@ -0,0 +1,206 @@
+"""
+批量导入用户
+一次导入一批邮箱：在 MEICAN_IMPORT_CONCURRENCY 的并发限制下同时验证美餐登录，
+验证通过的邮箱在一个事务里批量创建。导入时不再逐个点餐，
+新用户没有本地 Tab 状态，下一次定时任务规划时会被选中，由批量流程完成首次点餐
+"""
+
+import asyncio
+import csv
+import io
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils import timezone
+
+from . import events
+from .async_service import AsyncMeicanService
+from .models import MeicanUser
+
+logger = logging.getLogger("meican")
+
+# 单次导入的邮箱数上限
+MAX_EMAILS = 2000
+
+# 每个邮箱的导入结果
+CREATED = "created"
+EXISTS = "exists"  # 已经是用户
+DUPLICATE = "duplicate"  # 在本次列表中重复出现
+INVALID = "invalid"  # 邮箱格式不正确
+LOGIN_FAILED = "login_failed"
+VALID = "valid"  # 只验证不创建时，登录验证通过
+
+RESULT_LABELS = {
+    CREATED: "已创建",
+    EXISTS: "已存在",
+    DUPLICATE: "重复",
+    INVALID: "格式错误",
+    LOGIN_FAILED: "登录失败",
+    VALID: "验证通过",
+}
+
+
+def parse_emails(text):
+    """
+    从 CSV 或纯文本中解析邮箱：有 email 表头时读取该列，否则读取每行第一列；
+    纯文本可以用换行、逗号或空白分隔
+
+    :rtype: list[str]
+    """
+    rows = [row for row in csv.reader(io.StringIO(text.strip())) if any(row)]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    if "email" in header:
+        column = header.index("email")
+        return [
+            row[column].strip()
+            for row in rows[1:]
+            if len(row) > column and row[column].strip()
+        ]
+    if len(rows) == 1:
+        # 单行：逗号或空白分隔的邮箱列表
+        return [cell for cell in text.replace(",", " ").split() if cell]
+    return [row[0].strip() for row in rows if row[0].strip()]
+
+
+def _check_format(email):
+    try:
+        validate_email(email)
+        return True
+    except ValidationError:
+        return False
+
+
+async def _validate_login(email, semaphore):
+    """
+    :return: (success, token, error)
+    """
+    async with semaphore:
+        # 只验证能否登录：导入的用户由之后的定时任务在其他进程里处理，会话无法复用，
+        # 验证完立即关闭，不占用连接池
+        meican_service = AsyncMeicanService(pooled=False)
+        try:
+            return await meican_service.login(email)
+        except Exception as e:
+            return False, None, f"登录异常: {str(e)}"
+        finally:
+            await meican_service.aclose()
+
+
+async def import_users(emails, concurrency=None, dry_run=False):
+    """
+    批量导入用户
+    :param emails: 邮箱列表
+    :param concurrency: 同时验证登录的数量，默认读取 MEICAN_IMPORT_CONCURRENCY
+    :param dry_run: 为 True 时只验证，不创建用户
+    :return: {"total", 各结果的数量, "results": [{"email", "result", "message", "user_id"}]}
+    :raises ValueError: 邮箱数超过 MAX_EMAILS
+    """
+    if len(emails) > MAX_EMAILS:
+        raise ValueError(f"单次最多导入 {MAX_EMAILS} 个邮箱")
+    concurrency = concurrency or settings.MEICAN_IMPORT_CONCURRENCY
+    results = {}
+    candidates = []
+    # 与输入顺序一致的 (email, 是否为重复出现)
+    entries = []
+    seen = set()
+    for email in (email.strip() for email in emails):
+        entries.append((email, email in seen))
+        if email in seen:
+            continue
+        seen.add(email)
+        if not _check_format(email):
+            results[email] = _result(email, INVALID, "邮箱格式不正确")
+        else:
+            candidates.append(email)
+
+    existing = await sync_to_async(_existing_users)(candidates)
+    for email, user_id in existing.items():
+        results[email] = _result(email, EXISTS, "该邮箱已存在", user_id)
+    candidates = [email for email in candidates if email not in existing]
+
+    # 并发验证登录
+    semaphore = asyncio.Semaphore(concurrency)
+    logins = await asyncio.gather(
+        *(_validate_login(email, semaphore) for email in candidates)
+    )
+    valid = {}
+    for email, (success, token, error) in zip(candidates, logins):
+        if success:
+            valid[email] = token
+        else:
+            results[email] = _result(email, LOGIN_FAILED, error or "登录失败")
+
+    if dry_run:
+        for email in valid:
+            results[email] = _result(email, VALID, "登录验证通过")
+    else:
+        created, raced = await sync_to_async(_create_users)(valid)
+        for email, user_id in created.items():
+            results[email] = _result(
+                email, CREATED, "创建成功，将在下一次定时任务中点餐", user_id
+            )
+        for email, user_id in raced.items():
+            results[email] = _result(email, EXISTS, "该邮箱已存在", user_id)
+
+    # 按输入顺序输出，重复出现的邮箱单独标记
+    report = {
+        "total": len(entries),
+        "results": [
+            _result(email, DUPLICATE, "列表中重复出现") if repeated else results[email]
+            for email, repeated in entries
+        ],
+    }
+    for key in RESULT_LABELS:
+        report[key] = sum(1 for item in report["results"] if item["result"] == key)
+    logger.info(
+        "批量导入完成 - "
+        + ", ".join(
+            f"{label}:{report[key]}"
+            for key, label in RESULT_LABELS.items()
+            if report[key]
+        )
+    )
+    return report
+
+
+def _result(email, result, message, user_id=None):
+    return {"email": email, "result": result, "message": message, "user_id": user_id}
+
+
+def _existing_users(emails):
+    return dict(MeicanUser.objects.filter(email__in=emails).values_list("email", "id"))
+
+
+def _create_users(tokens):
+    """
+    在一个事务里批量创建用户
+    :param tokens: {email: token}
+    :return: (created, raced)，均为 {email: user_id}；raced 为验证期间已被其他请求创建的邮箱
+    """
+    if not tokens:
+        return {}, {}
+    now = timezone.now()
+    with transaction.atomic():
+        before = _existing_users(list(tokens))
+        MeicanUser.objects.bulk_create(
+            [
+                MeicanUser(email=email, token=token, last_login_attempt=now)
+                for email, token in tokens.items()
+                if email not in before
+            ],
+            ignore_conflicts=True,
+        )
+        ids = _existing_users(list(tokens))
+    created = {email: ids[email] for email in ids if email not in before}
+    if created:
+        events.emit(
+            events.KIND_JOB,
+            {"job": "import", "stage": "finish", "created": len(created)},
+        )
+    return created, before
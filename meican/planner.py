@@ -0,0 +1,270 @@
+"""
+定时任务的用户规划
+登录前先批量读取本地 TabStatus，判断哪些用户可能有需要处理的自助餐时段；
+所有未来的自助餐时段都已点餐或已关闭的用户本轮跳过，超过一定时间没有同步的用户强制全量同步。
+需要处理的用户按最早截止时间优先（EDF）排队，截止时间最近的用户先处理；
+开启分散执行时，每个用户在时间窗口内有一个稳定的偏移量，到点后再按限速放行
+"""
+
+import heapq
+import logging
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, Min, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import TabStatus
+
+logger = logging.getLogger("meican")
+
+# 不需要再处理的 Tab 状态
+FINAL_STATUSES = ("ORDERED", "CLOSED")
+
+# 需要处理的原因
+REASON_FULL = "full"  # 指定了全量执行
+REASON_NO_STATE = "no_state"  # 本地没有今天及以后的 Tab 状态
+REASON_STALE = "stale"  # 超过强制同步间隔
+REASON_ACTIONABLE = "actionable"  # 有尚未点餐且未关闭的自助餐时段
+
+REASON_LABELS = {
+    REASON_FULL: "全量执行",
+    REASON_NO_STATE: "无本地状态",
+    REASON_STALE: "强制同步",
+    REASON_ACTIONABLE: "有待处理时段",
+}
+
+
+def plan_users(users, full=False, force_resync_hours=None, now=None):
+    """
+    :param users: MeicanUser 列表
+    :param full: 为 True 时所有用户都需要处理
+    :param force_resync_hours: 强制同步间隔（小时），默认读取 MEICAN_FORCE_RESYNC_HOURS
+    :return: (to_process, skipped)，to_process 为 [(user, reason)]，skipped 为 [user]
+    """
+    if full:
+        return [(user, REASON_FULL) for user in users], []
+
+    now = now or timezone.now()
+    force_resync_hours = (
+        settings.MEICAN_FORCE_RESYNC_HOURS
+        if force_resync_hours is None
+        else force_resync_hours
+    )
+    stale_before = now - timedelta(hours=force_resync_hours)
+
+    # 一条聚合查询取出每个用户的最后同步时间和待处理的自助餐时段数
+    state = {
+        row["user_id"]: row
+        for row in TabStatus.objects.filter(
+            user_id__in=[user.id for user in users],
+            order_date__gte=datetime.now().date(),
+        )
+        .values("user_id")
+        .annotate(
+            last_synced=Max("last_updated"),
+            actionable=Count(
+                "id",
+                filter=Q(tab_title__contains="自助", target_time__gte=now)
+                & ~Q(status__in=FINAL_STATUSES),
+            ),
+        )
+        .order_by()
+    }
+
+    to_process = []
+    skipped = []
+    for user in users:
+        row = state.get(user.id)
+        if row is None:
+            to_process.append((user, REASON_NO_STATE))
+        elif row["last_synced"] < stale_before:
+            to_process.append((user, REASON_STALE))
+        elif row["actionable"]:
+            to_process.append((user, REASON_ACTIONABLE))
+        else:
+            skipped.append(user)
+
+    reasons = Counter(reason for _, reason in to_process)
+    logger.info(
+        f"规划完成 - 需要处理:{len(to_process)}, 跳过:{len(skipped)} ("
+        + ", ".join(f"{REASON_LABELS[key]}:{value}" for key, value in reasons.items())
+        + ")"
+    )
+    return to_process, skipped
+
+
+def user_deadlines(user_ids, now=None):
+    """
+    每个用户最近的截止时间：尚未点餐、未关闭、还没截止的自助餐时段中，
+    截止点餐时间（没有时用用餐时间）最早的一个
+
+    :return: {user_id: deadline}，没有待处理时段的用户不在其中
+    """
+    now = now or timezone.now()
+    rows = (
+        TabStatus.objects.filter(
+            user_id__in=user_ids,
+            tab_title__contains="自助",
+            target_time__gte=now,
+        )
+        .filter(Q(close_time__isnull=True) | Q(close_time__gte=now))
+        .exclude(status__in=FINAL_STATUSES)
+        .values("user_id")
+        .annotate(deadline=Min(Coalesce("close_time", "target_time")))
+        .order_by()
+    )
+    return {row["user_id"]: row["deadline"] for row in rows}
+
+
+class DeadlineQueue(object):
+    """
+    最早截止优先的待处理队列，供多个工作线程共享。
+    每隔 MEICAN_EDF_REFRESH_SECONDS 从数据库重新读取剩余用户的截止时间并重新排序，
+    Web 刷新等其他流程写入的新日历数据会反映到处理顺序上；没有已知截止时间的用户排在最后
+    """
+
+    def __init__(self, users, refresh_interval=None):
+        self.refresh_interval = (
+            settings.MEICAN_EDF_REFRESH_SECONDS
+            if refresh_interval is None
+            else refresh_interval
+        )
+        self._users = {user.id: user for user in users}
+        self._lock = threading.Lock()
+        self._deadlines = {}
+        self._heap = []
+        self._loaded_at = 0
+        # 开始处理前截止时间就已经过去的用户
+        self.missed = set()
+        if self._users:
+            self._load()
+
+    def __len__(self):
+        return len(self._users)
+
+    def pop(self):
+        """
+        :return: 截止时间最早的用户，队列为空时返回 None
+        """
+        with self._lock:
+            if not self._users:
+                return None
+            if time.monotonic() - self._loaded_at >= self.refresh_interval:
+                self._load()
+            _, user_id = heapq.heappop(self._heap)
+            user = self._users.pop(user_id)
+            self._check_missed(user, timezone.now())
+            return user
+
+    def _load(self):
+        now = timezone.now()
+        # 重新排序前，等待期间截止时间已经过去的用户记为错过
+        for user_id, user in self._users.items():
+            self._check_missed(user, now)
+        self._deadlines = user_deadlines(list(self._users), now=now)
+        self._heap = [(self._key(user_id), user_id) for user_id in self._users]
+        heapq.heapify(self._heap)
+        self._loaded_at = time.monotonic()
+
+    def _key(self, user_id):
+        deadline = self._deadlines.get(user_id)
+        if deadline is None:
+            return (1, 0)
+        return (0, deadline.timestamp())
+
+    def _check_missed(self, user, now):
+        deadline = self._deadlines.get(user.id)
+        if deadline is not None and deadline <= now and user.id not in self.missed:
+            self.missed.add(user.id)
+            logger.warning(f"用户 {user.email} 错过了截止时间 {deadline}")
+
+
+class SpreadQueue(DeadlineQueue):
+    """
+    分散执行的待处理队列：避免所有用户在定时任务启动的同一分钟集中请求美餐和写入数据库。
+    每个用户按 user id 的哈希在 window 秒的窗口内得到一个稳定的偏移量，到点后才放行；
+    截止时间早于偏移时刻的用户提前到截止前 margin 秒放行。
+    两次放行之间至少间隔 60 / rate 秒，同时到点的用户仍按最早截止优先。
+    pop() 会阻塞到下一个用户的放行时刻，多个工作线程共享时各自预约不同的放行时刻
+    """
+
+    def __init__(
+        self,
+        users,
+        window,
+        rate=None,
+        margin=None,
+        started=None,
+        refresh_interval=None,
+    ):
+        """
+        :param window: 窗口长度（秒）
+        :param rate: 每分钟最多放行的用户数，默认读取 MEICAN_SPREAD_RATE，0 表示不限速
+        :param margin: 截止前预留的秒数，默认读取 MEICAN_SPREAD_DEADLINE_MARGIN_MINUTES
+        :param started: 窗口起点（时间戳），默认当前时间；恢复运行时传入原运行的开始时间
+        """
+        rate = settings.MEICAN_SPREAD_RATE if rate is None else rate
+        self.window = window
+        self.interval = 60 / rate if rate > 0 else 0
+        self.margin = (
+            settings.MEICAN_SPREAD_DEADLINE_MARGIN_MINUTES * 60
+            if margin is None
+            else margin
+        )
+        self.started = time.time() if started is None else started
+        # 尚未到放行时刻的用户 [(release_at, user_id)]，到点后移入按截止时间排序的 _heap
+        self._waiting = []
+        self._next_slot = 0
+        super().__init__(users, refresh_interval)
+
+    def pop(self):
+        """
+        :return: 下一个放行的用户（等到其放行时刻后返回），队列为空时返回 None
+        """
+        with self._lock:
+            if not self._users:
+                return None
+            if time.monotonic() - self._loaded_at >= self.refresh_interval:
+                self._load()
+            slot = max(time.time(), self._next_slot)
+            while self._waiting and self._waiting[0][0] <= slot:
+                _, user_id = heapq.heappop(self._waiting)
+                heapq.heappush(self._heap, (self._key(user_id), user_id))
+            if self._heap:
+                _, user_id = heapq.heappop(self._heap)
+            else:
+                release_at, user_id = heapq.heappop(self._waiting)
+                slot = max(slot, release_at)
+            self._next_slot = slot + self.interval
+            user = self._users.pop(user_id)
+
+        # 在锁外等待，其他工作线程可以继续预约后面的放行时刻
+        delay = slot - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            self._check_missed(user, timezone.now())
+        return user
+
+    def release_at(self, user_id):
+        """用户的放行时刻（时间戳）：窗口起点 + 稳定偏移，不晚于截止前 margin 秒"""
+        # 加上前缀，避免与分片使用的 crc32(user_id) 相关
+        offset = zlib.crc32(f"spread:{user_id}".encode()) / 2**32 * self.window
+        release_at = self.started + offset
+        deadline = self._deadlines.get(user_id)
+        if deadline is not None:
+            release_at = min(release_at, deadline.timestamp() - self.margin)
+        return max(release_at, self.started)
+
+    def _load(self):
+        super()._load()
+        # 截止时间变化后重新计算放行时刻；已经到点但还没取走的用户会在下次 pop 时重新移入
+        self._waiting = [(self.release_at(user_id), user_id) for user_id in self._users]
+        heapq.heapify(self._waiting)
+        self._heap = []
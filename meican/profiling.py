@@ -0,0 +1,315 @@
+"""
+运行剖析
+定时任务或管理命令运行缓慢时，用剖析模式执行一次，查看时间花在网络等待、JSON 解析、
+meican.utils 的模型构造还是 ORM 写入上：
+- sample：采样剖析，后台线程每隔 MEICAN_PROFILE_INTERVAL_MS 毫秒记录一次各工作线程的调用栈（墙钟时间，
+  网络等待同样计入），开销小，支持并发执行
+- cprofile：确定性剖析（cProfile），记录当前线程每个函数的调用次数和耗时，同时采样生成调用栈
+每次运行在 MEICAN_PROFILE_DIR 下写入 {名称}.collapsed（折叠调用栈，flamegraph.pl / speedscope 的输入）、
+{名称}.txt（耗时分类和热点函数），cprofile 模式另外写入 {名称}.prof（可用 pstats / snakeviz 查看）
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger("meican")
+
+MODE_SAMPLE = "sample"
+MODE_CPROFILE = "cprofile"
+MODES = (MODE_SAMPLE, MODE_CPROFILE)
+
+# 输出的热点函数个数
+TOP = 20
+
+# 耗时分类：从栈顶（正在执行的函数）往下找，第一个匹配的文件决定分类；
+# 工作线程的栈底都是 threading / 线程池，线程等待只看栈顶
+CATEGORIES = (
+    (
+        "network",
+        (
+            "socket.py",
+            "ssl.py",
+            "selectors.py",
+            "http/client.py",
+            "urllib3/",
+            "requests/",
+            "httpx/",
+            "httpcore/",
+            "meican/cassette.py",
+        ),
+    ),
+    ("json", ("json/",)),
+    ("models", ("meican/utils.py", "meican/meican_models.py")),
+    ("orm", ("django/db/", "sqlite3/")),
+)
+CATEGORY_WAIT = "wait"
+WAIT_PREFIXES = ("threading.py", "queue.py", "concurrent/futures/")
+CATEGORY_OTHER = "other"
+CATEGORY_LABELS = {
+    "network": "网络等待",
+    "json": "JSON 解析",
+    "models": "模型构造",
+    "orm": "ORM / 数据库",
+    CATEGORY_WAIT: "线程等待",
+    CATEGORY_OTHER: "其他",
+}
+
+# 不采样的线程：租约续约线程大部分时间在等待，与任务耗时无关
+IGNORED_THREADS = ("meican-lease-",)
+
+
+def resolve_mode(value=None):
+    """
+    :param value: 剖析模式，None 表示读取 MEICAN_PROFILE；空字符串、0、false、off 表示不剖析，
+                  1、true、on 表示 sample
+    :return: MODE_SAMPLE、MODE_CPROFILE 或 None
+    :raises ValueError: 未知的模式
+    """
+    if value is None:
+        value = settings.MEICAN_PROFILE
+    value = str(value or "").strip().lower()
+    if value in ("", "0", "false", "off", "none"):
+        return None
+    if value in ("1", "true", "on"):
+        return MODE_SAMPLE
+    if value not in MODES:
+        raise ValueError(f"未知的剖析模式: {value}，可选: {', '.join(MODES)}")
+    return value
+
+
+def _short_path(filename, roots):
+    path = filename.replace(os.sep, "/")
+    if "site-packages/" in path:
+        return path.rsplit("site-packages/", 1)[1]
+    for root in roots:
+        if path.startswith(root):
+            return path[len(root) :]
+    return path
+
+
+class RunProfiler(object):
+    """
+    剖析一次运行::
+
+        with RunProfiler(MODE_SAMPLE, "auto_order") as profiler:
+            ...
+        profiler.report  # 耗时分类、热点函数、输出文件
+    """
+
+    def __init__(self, mode, name, interval=None, directory=None):
+        """
+        :param name: 输出文件名前缀，会附加启动时间和进程号
+        :param interval: 采样间隔（秒），默认读取 MEICAN_PROFILE_INTERVAL_MS
+        """
+        self.mode = mode
+        self.name = re.sub(r"[^\w.@-]+", "_", name)
+        self.interval = (
+            settings.MEICAN_PROFILE_INTERVAL_MS / 1000 if interval is None else interval
+        )
+        self.directory = Path(directory or settings.MEICAN_PROFILE_DIR)
+        self.report = None
+        self._stacks = Counter()
+        self._ticks = 0
+        self._labels = {}
+        self._roots = [
+            str(Path(settings.BASE_DIR)).replace(os.sep, "/") + "/",
+            sysconfig.get_paths()["stdlib"].replace(os.sep, "/") + "/",
+        ]
+        self._stop = threading.Event()
+        self._sampler = None
+        self._profile = None
+        self._started = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(
+            target=self._run_sampler, name="meican-profiler", daemon=True
+        )
+        self._sampler.start()
+        if self.mode == MODE_CPROFILE:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self):
+        """停止剖析，写入文件并在日志中输出耗时分类和热点函数"""
+        if self._profile is not None:
+            self._profile.disable()
+        self._stop.set()
+        self._sampler.join()
+        elapsed = time.perf_counter() - self._started
+
+        try:
+            self.report = self._write(elapsed)
+        except OSError as e:
+            logger.error(f"写入剖析结果失败: {e}")
+            return None
+        for line in format_report(self.report):
+            logger.info(line)
+        return self.report
+
+    def _run_sampler(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, "")
+                if ident == own or name.startswith(IGNORED_THREADS):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                # 线程池的线程名带编号，同一个池的线程合并显示
+                stack.append(re.sub(r"_\d+$", "", name))
+                self._stacks[tuple(reversed(stack))] += 1
+            self._ticks += 1
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            path = _short_path(code.co_filename, self._roots)
+            label = self._labels[code] = (
+                f"{path}:{getattr(code, 'co_qualname', code.co_name)}"
+            )
+        return label
+
+    def _write(self, elapsed):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # 名称里可能带有邮箱中的点，不能用 with_suffix
+        base = f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        files = []
+
+        collapsed = self.directory / f"{base}.collapsed"
+        with open(collapsed, "w", encoding="utf-8") as output:
+            for stack, count in self._stacks.most_common():
+                output.write(f"{';'.join(stack)} {count}\n")
+        files.append(str(collapsed))
+
+        # 每个样本约等于一个采样周期的墙钟时间
+        per_sample = elapsed / self._ticks if self._ticks else 0
+        report = {
+            "mode": self.mode,
+            "seconds": round(elapsed, 3),
+            "samples": sum(self._stacks.values()),
+            "categories": self._categories(per_sample),
+            "hotspots": self._sampled_hotspots(per_sample),
+            "files": files,
+        }
+
+        details = ""
+        if self._profile is not None:
+            prof = self.directory / f"{base}.prof"
+            self._profile.dump_stats(prof)
+            files.append(str(prof))
+            stats = pstats.Stats(self._profile)
+            report["hotspots"] = self._profiled_hotspots(stats)
+            buffer = io.StringIO()
+            stats.stream = buffer
+            stats.sort_stats("cumulative").print_stats(TOP * 2)
+            details = "\n" + buffer.getvalue()
+
+        text = self.directory / f"{base}.txt"
+        files.append(str(text))
+        text.write_text("\n".join(format_report(report)) + "\n" + details)
+        return report
+
+    def _categories(self, per_sample):
+        counts = Counter()
+        for stack, count in self._stacks.items():
+            counts[_categorize(stack)] += count
+        total = sum(counts.values()) or 1
+        return [
+            {
+                "category": category,
+                "seconds": round(count * per_sample, 3),
+                "percent": round(count * 100 / total, 1),
+            }
+            for category, count in counts.most_common()
+        ]
+
+    def _sampled_hotspots(self, per_sample):
+        own = Counter()
+        inclusive = Counter()
+        for stack, count in self._stacks.items():
+            # 第一个元素是线程名
+            if len(stack) > 1:
+                own[stack[-1]] += count
+            for label in set(stack[1:]):
+                inclusive[label] += count
+        return [
+            {
+                "function": label,
+                "self": round(count * per_sample, 3),
+                "total": round(inclusive[label] * per_sample, 3),
+            }
+            for label, count in own.most_common(TOP)
+        ]
+
+    def _profiled_hotspots(self, stats):
+        rows = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:TOP]
+        hotspots = []
+        for (filename, line, function), (_, calls, own, total, _) in rows:
+            if line:
+                function = f"{_short_path(filename, self._roots)}:{line}({function})"
+            hotspots.append(
+                {
+                    # 内置函数的名称里带有对象地址
+                    "function": re.sub(r" at 0x[0-9a-f]+", "", function),
+                    "self": round(own, 3),
+                    "total": round(total, 3),
+                    "calls": calls,
+                }
+            )
+        return hotspots
+
+
+def _categorize(stack):
+    paths = [label.rsplit(":", 1)[0] for label in reversed(stack[1:])]
+    if paths and paths[0].startswith(WAIT_PREFIXES):
+        return CATEGORY_WAIT
+    for path in paths:
+        for category, prefixes in CATEGORIES:
+            if path.startswith(prefixes):
+                return category
+    return CATEGORY_OTHER
+
+
+def format_report(report):
+    """
+    :return: 剖析结果的文本行（耗时分类 + 热点函数）
+    """
+    lines = [
+        f"剖析完成 - 模式:{report['mode']}, 耗时:{report['seconds']}s, 样本:{report['samples']}",
+        "耗时分类（各线程墙钟时间）:",
+    ]
+    for item in report["categories"]:
+        lines.append(
+            f"  {CATEGORY_LABELS[item['category']]:<12} {item['seconds']:>9.3f}s {item['percent']:>5.1f}%"
+        )
+    lines.append("热点函数（自身耗时 / 累计耗时）:")
+    for item in report["hotspots"]:
+        calls = f" x{item['calls']}" if "calls" in item else ""
+        lines.append(
+            f"  {item['self']:>9.3f}s {item['total']:>9.3f}s  {item['function']}{calls}"
+        )
+    lines.append("输出文件: " + ", ".join(report["files"]))
+    return lines
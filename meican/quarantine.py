@@ -0,0 +1,76 @@
+"""
+失败隔离
+登录失败（如密码已修改、账号已停用）或流程连续出错的用户记录连续失败次数，
+达到 MEICAN_QUARANTINE_AFTER 次后按指数退避计算下一次可以处理的时间，
+到期之前定时任务和“一键点餐”跳过该用户；任意一次成功即清零。
+面板上可以手动解除隔离：失败次数保留，立即重试仍然失败时以更长的时间重新隔离
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .db_writer import QuarantineRecord, apply_now
+from .models import MeicanUser
+
+logger = logging.getLogger("meican")
+
+
+def backoff_delay(failures):
+    """
+    连续失败 failures 次后的隔离时长：MEICAN_BACKOFF_BASE_MINUTES 起步，每多失败一次翻倍，
+    不超过 MEICAN_BACKOFF_MAX_HOURS
+
+    :rtype: timedelta | None，未达到隔离次数或未开启隔离时为 None
+    """
+    after = settings.MEICAN_QUARANTINE_AFTER
+    if after <= 0 or failures < after:
+        return None
+    minutes = min(
+        settings.MEICAN_BACKOFF_BASE_MINUTES * 2 ** min(failures - after, 32),
+        settings.MEICAN_BACKOFF_MAX_HOURS * 60,
+    )
+    return timedelta(minutes=minutes)
+
+
+def is_quarantined(user, now=None):
+    return bool(
+        user.next_eligible_at and user.next_eligible_at > (now or timezone.now())
+    )
+
+
+def split_eligible(users, now=None):
+    """
+    :param users: MeicanUser 列表
+    :return: (eligible, quarantined)
+    """
+    now = now or timezone.now()
+    eligible = []
+    quarantined = []
+    for user in users:
+        (quarantined if is_quarantined(user, now) else eligible).append(user)
+    if quarantined:
+        logger.info(f"{len(quarantined)} 个用户处于失败隔离中，本次跳过")
+    return eligible, quarantined
+
+
+def record(user_id, success, error="", writer=None):
+    """
+    记录一次处理结果
+    :param writer: DBWriter 对象，并发执行时经由写线程落盘
+    """
+    result = QuarantineRecord(user_id, success, error)
+    if writer:
+        writer.submit(result)
+    else:
+        apply_now(result)
+
+
+def retry_now(user_id):
+    """
+    手动解除隔离，下一次批量任务（或随后的刷新）立即处理该用户
+    :return: 是否存在该用户
+    """
+    return bool(MeicanUser.objects.filter(pk=user_id).update(next_eligible_at=None))
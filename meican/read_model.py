@@ -0,0 +1,147 @@
+"""
+用户面板的物化读模型
+每个用户每个用餐日期一行 DashboardDay，保存分组好的 Tab 列表、成功订单、菜品摘要和自助餐标记。
+同步 Tab 状态、下单等写入路径在同一个事务里重建受影响的行，
+面板和用户 API 只需一条查询读取今天及以后的行，页面开销与历史数据量无关
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime
+
+from django.db import transaction
+
+from .models import DashboardDay, MeicanUser, OrderRecord, TabStatus
+
+logger = logging.getLogger("meican")
+
+
+def refresh_days(user_id, dates):
+    """
+    按 TabStatus / OrderRecord 重建单个用户若干日期的行，没有数据的日期删除对应的行
+    :type dates: list[datetime.date]
+    """
+    dates = set(dates)
+    if not dates:
+        return
+    rows = _build_rows([user_id], dates=dates)
+    with transaction.atomic():
+        DashboardDay.objects.filter(user_id=user_id, date__in=dates).exclude(
+            date__in=[row.date for row in rows]
+        ).delete()
+        _save(rows)
+
+
+def refresh_user(user_id, since):
+    """
+    重建单个用户 since 及以后的所有行（Tab 同步会整体替换这部分数据）
+    :type since: datetime.date
+    """
+    rows = _build_rows([user_id], since=since)
+    with transaction.atomic():
+        DashboardDay.objects.filter(user_id=user_id, date__gte=since).exclude(
+            date__in=[row.date for row in rows]
+        ).delete()
+        _save(rows)
+
+
+def rebuild(since=None, user_ids=None, batch_size=500):
+    """
+    全量重建（升级后首次使用或绕过写入路径直接写入明细表之后）
+    :param since: 起始日期，默认今天
+    :param user_ids: 只重建这些用户，默认所有用户
+    :return: 写入的行数
+    """
+    since = since or datetime.now().date()
+    if user_ids is None:
+        user_ids = list(MeicanUser.objects.order_by("id").values_list("id", flat=True))
+    written = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start : start + batch_size]
+        rows = _build_rows(batch, since=since)
+        with transaction.atomic():
+            DashboardDay.objects.filter(user_id__in=batch, date__gte=since).delete()
+            DashboardDay.objects.bulk_create(rows, batch_size=batch_size)
+        written += len(rows)
+    logger.info(f"面板读模型重建完成 - 用户:{len(user_ids)}, 行数:{written}")
+    return written
+
+
+def _save(rows):
+    DashboardDay.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["user", "date"],
+        update_fields=[
+            "tabs",
+            "orders",
+            "meals",
+            "has_buffet",
+            "ordered",
+            "updated_at",
+        ],
+    )
+
+
+def _build_rows(user_ids, since=None, dates=None):
+    """
+    :return: [DashboardDay]，只包含有 Tab 或成功订单的日期
+    """
+    tab_filter = {"user_id__in": user_ids}
+    order_filter = {"user_id__in": user_ids, "success": True}
+    if since is not None:
+        tab_filter["order_date__gte"] = order_filter["order_date__gte"] = since
+    if dates is not None:
+        tab_filter["order_date__in"] = order_filter["order_date__in"] = dates
+
+    tabs = defaultdict(list)
+    for tab in (
+        TabStatus.objects.filter(**tab_filter)
+        .order_by("user_id", "order_date", "target_time")
+        .values("user_id", "order_date", "tab_title", "status", "target_time")
+    ):
+        tabs[(tab["user_id"], tab["order_date"])].append(
+            {
+                "title": tab["tab_title"],
+                "status": tab["status"],
+                "target_time": tab["target_time"].isoformat(),
+                "has_buffet": "自助" in tab["tab_title"],
+            }
+        )
+
+    orders = defaultdict(list)
+    for order in (
+        OrderRecord.objects.filter(**order_filter)
+        .order_by("user_id", "order_date", "meal_period")
+        .values("user_id", "order_date", "meal_period", "meal_name")
+    ):
+        orders[(order["user_id"], order["order_date"])].append(
+            {"meal_period": order["meal_period"], "meal_name": order["meal_name"]}
+        )
+
+    rows = []
+    for user_id, date in sorted(set(tabs) | set(orders)):
+        day_tabs = tabs.get((user_id, date), [])
+        day_orders = orders.get((user_id, date), [])
+        rows.append(
+            DashboardDay(
+                user_id=user_id,
+                date=date,
+                tabs=day_tabs,
+                orders=day_orders,
+                meals="; ".join(meal_names(day_orders)),
+                has_buffet=any(tab["has_buffet"] for tab in day_tabs),
+                ordered=bool(day_orders),
+            )
+        )
+    return rows
+
+
+def meal_names(orders):
+    meals = []
+    for order in orders:
+        if order["meal_period"]:
+            meals.append(f"{order['meal_period']}: {order['meal_name']}")
+        else:
+            meals.append(order["meal_name"])
+    return meals
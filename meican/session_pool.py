@@ -0,0 +1,124 @@
+"""
+已登录美餐客户端的进程内连接池
+Web 进程中重复的刷新、添加用户等操作复用已登录的客户端，省去登录请求。
+按邮箱存放，容量有限（LRU 淘汰），空闲超时的客户端丢弃；
+取出即独占，用完归还，会话过期的客户端不再放回
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class _Entry(object):
+    __slots__ = ("client", "scope", "last_used")
+
+    def __init__(self, client, scope):
+        self.client = client
+        self.scope = scope
+        self.last_used = time.monotonic()
+
+
+class SessionPool(object):
+    """
+    checkout / checkin / invalidate 都会返回被丢弃的客户端列表，由调用方负责关闭
+    （异步客户端需要 await aclose()，池本身不做 IO）
+    """
+
+    def __init__(self, max_size=None, idle_ttl=None):
+        self.max_size = (
+            settings.MEICAN_SESSION_POOL_SIZE if max_size is None else max_size
+        )
+        self.idle_ttl = (
+            settings.MEICAN_SESSION_IDLE_TTL if idle_ttl is None else idle_ttl
+        )
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def checkout(self, key, scope=None):
+        """
+        独占地取出 key 对应的客户端
+
+        :param scope: 客户端绑定的上下文（异步客户端绑定事件循环），不一致时丢弃
+        :return: (client, discarded)，client 为 None 表示需要重新登录
+        """
+        with self._lock:
+            discarded = self._prune()
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry.scope is not scope:
+                discarded.append(entry.client)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None, discarded
+            self.hits += 1
+            return entry.client, discarded
+
+    def checkin(self, key, client, scope=None):
+        """
+        归还客户端；会话已过期（client.expired）的客户端直接丢弃
+
+        :return: discarded
+        """
+        if not self.enabled or getattr(client, "expired", False):
+            return [client]
+        # 上一次使用留下的响应不再需要，避免常驻的客户端持有大量响应对象
+        responses = getattr(client, "responses", None)
+        if responses is not None:
+            responses.clear()
+        with self._lock:
+            discarded = self._prune()
+            # 并发登录的同一个用户已经归还过，保留新的
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                discarded.append(previous.client)
+            self._entries[key] = _Entry(client, scope)
+            while len(self._entries) > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                discarded.append(evicted.client)
+            return discarded
+
+    def invalidate(self, key):
+        """
+        :return: discarded
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return [entry.client] if entry is not None else []
+
+    def clear(self):
+        """
+        :return: discarded
+        """
+        with self._lock:
+            discarded = [entry.client for entry in self._entries.values()]
+            self._entries.clear()
+            return discarded
+
+    def _prune(self):
+        """丢弃空闲超时的客户端（按最近使用排序，从最旧的开始检查）"""
+        discarded = []
+        deadline = time.monotonic() - self.idle_ttl
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.last_used >= deadline:
+                break
+            del self._entries[key]
+            discarded.append(entry.client)
+        return discarded
+
+
+# 同步客户端（MeiCan）与异步客户端（AsyncMeiCan）分开存放
+clients = SessionPool()
+async_clients = SessionPool()
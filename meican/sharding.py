@@ -0,0 +1,154 @@
+"""
+定时任务分片
+多个 cron 进程 / 容器共用一张用户表时，按 MeicanUser.id 的稳定哈希把活跃用户分成 N 份，
+每个分片只处理自己的用户；各分片把汇总写入共享目录，由汇总命令（或最后完成的分片）合并
+"""
+
+import json
+import logging
+import os
+import time
+import zlib
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger("meican")
+
+SUMMARY_FILE = "{run_id}.shard-{index}-of-{count}.json"
+# 汇总文件保留时间，写入新汇总时顺带清理
+SUMMARY_TTL = 7 * 24 * 3600
+# 合并时累加的计数字段
+COUNTED_FIELDS = (
+    "total",
+    "planned",
+    "skipped",
+    "success",
+    "failed",
+    "busy",
+    "quarantined",
+    "deadline_missed",
+)
+
+
+class ShardSpec(object):
+    """分片 k/N，k 从 1 开始"""
+
+    def __init__(self, index, count):
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"无效的分片: {index}/{count}")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, value):
+        """
+        :param value: "k/N" 格式的字符串
+        :rtype: ShardSpec
+        """
+        try:
+            index, count = (int(part) for part in str(value).split("/"))
+        except ValueError:
+            raise ValueError(f"分片格式应为 k/N，例如 2/4: {value}")
+        return cls(index, count)
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+    def owns(self, user_id):
+        """用户是否属于这个分片"""
+        return shard_of(user_id, self.count) == self.index
+
+    def filter(self, users):
+        return [user for user in users if self.owns(user.id)]
+
+
+def shard_of(user_id, count):
+    """
+    用户所属的分片编号（1..count）。使用 crc32 而不是 hash()，保证不同进程的结果一致
+    """
+    return zlib.crc32(str(user_id).encode()) % count + 1
+
+
+def default_run_id(started=None):
+    """
+    同一个 cron 时间点启动的各分片使用相同的运行编号（精确到分钟）
+
+    :param started: 启动时间戳，默认当前时间
+    """
+    return time.strftime("%Y%m%d%H%M", time.localtime(started or time.time()))
+
+
+def _summary_dir():
+    return Path(settings.MEICAN_SHARD_SUMMARY_DIR)
+
+
+def write_summary(run_id, shard, summary):
+    """把一个分片的汇总写入共享目录（先写临时文件再替换，读者不会读到半个文件）"""
+    directory = _summary_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / SUMMARY_FILE.format(
+        run_id=run_id, index=shard.index, count=shard.count
+    )
+    temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    temp.write_text(json.dumps(summary, ensure_ascii=False, default=str))
+    os.replace(temp, path)
+    _prune(directory)
+    return path
+
+
+def _prune(directory):
+    deadline = time.time() - SUMMARY_TTL
+    for path in directory.glob("*.json"):
+        try:
+            if path.stat().st_mtime < deadline:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def latest_run_id():
+    """最近一次写入汇总的运行编号，没有时返回 None"""
+    paths = sorted(_summary_dir().glob("*.json"), key=lambda path: path.stat().st_mtime)
+    return paths[-1].name.split(".shard-")[0] if paths else None
+
+
+def aggregate(run_id):
+    """
+    合并一次运行中各分片的汇总
+
+    :return: {"run_id", "shard_count", "shards", "missing", "started_at", "finished_at",
+              "wall_seconds", total / planned / skipped / success / failed}，
+             没有任何分片汇总时返回 None
+    """
+    shards = []
+    for path in sorted(_summary_dir().glob(f"{run_id}.shard-*.json")):
+        try:
+            shards.append(json.loads(path.read_text()))
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取分片汇总 {path.name} 失败: {e}")
+    if not shards:
+        return None
+
+    # 不同分片数的汇总不能合并，以最新的分片数为准
+    count = max(shards, key=lambda item: item["finished_at"])["shard_count"]
+    shards = sorted(
+        (item for item in shards if item["shard_count"] == count),
+        key=lambda item: item["shard_index"],
+    )
+    reported = {item["shard_index"] for item in shards}
+
+    combined = {
+        "run_id": run_id,
+        "shard_count": count,
+        "shards": shards,
+        "missing": [index for index in range(1, count + 1) if index not in reported],
+        "started_at": min(item["started_at"] for item in shards),
+        "finished_at": max(item["finished_at"] for item in shards),
+    }
+    combined["wall_seconds"] = round(
+        combined["finished_at"] - combined["started_at"], 3
+    )
+    for field in COUNTED_FIELDS:
+        combined[field] = sum(item.get(field, 0) for item in shards)
+    return combined
@@ -0,0 +1,92 @@
+"""
+请求合并（singleflight）
+同一个 key 的并发调用只执行一次，所有等待者拿到同一个结果；
+执行完成后的一小段时间内直接返回上一次的结果，不再重新执行
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+from django.conf import settings
+
+# do() 返回的结果来源
+LEADER = "leader"  # 本次调用实际执行
+JOINED = "joined"  # 合并到了正在执行的调用
+FRESH = "fresh"  # 使用了保鲜期内的上一次结果
+
+
+class SingleFlight(object):
+    """
+    进程内的请求合并，等待的协程可以位于不同的线程 / 事件循环
+    （runserver 下每个异步请求都有自己的事件循环），因此用 concurrent.futures.Future 传递结果
+    """
+
+    def __init__(self, fresh_for=None):
+        """
+        :param fresh_for: 结果的保鲜秒数，默认读取 MEICAN_REFRESH_FRESH_SECONDS
+        """
+        self._fresh_for = fresh_for
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._results = {}
+
+    @property
+    def fresh_for(self):
+        if self._fresh_for is None:
+            return settings.MEICAN_REFRESH_FRESH_SECONDS
+        return self._fresh_for
+
+    async def do(self, key, fn, remember=None):
+        """
+        :param fn: 无参数的协程函数
+        :param remember: 判断结果是否可以在保鲜期内复用，默认全部复用（失败结果通常不应复用）
+        :return: (result, source)，source 为 LEADER / JOINED / FRESH
+        """
+        with self._lock:
+            self._prune()
+            cached = self._results.get(key)
+            if cached is not None:
+                return cached[1], FRESH
+
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self._inflight[key] = future
+
+        if not leader:
+            return await asyncio.wrap_future(future), JOINED
+
+        # 实际执行放在独立的任务里：发起者的请求被取消时，其他等待者仍能拿到结果
+        task = asyncio.ensure_future(fn())
+        task.add_done_callback(lambda done: self._finish(key, future, done, remember))
+        return await asyncio.shield(task), LEADER
+
+    def forget(self, key):
+        """丢弃 key 的保鲜结果，下一次调用重新执行"""
+        with self._lock:
+            self._results.pop(key, None)
+
+    def _finish(self, key, future, task, remember):
+        with self._lock:
+            self._inflight.pop(key, None)
+            if task.cancelled():
+                future.cancel()
+                return
+            error = task.exception()
+            if error is not None:
+                future.set_exception(error)
+                return
+            result = task.result()
+            if self.fresh_for > 0 and (remember is None or remember(result)):
+                self._results[key] = (time.monotonic() + self.fresh_for, result)
+        future.set_result(result)
+
+    def _prune(self):
+        now = time.monotonic()
+        for key in [
+            key for key, (expires, _) in self._results.items() if expires <= now
+        ]:
+            del self._results[key]
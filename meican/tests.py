@@ -1,3 +1,1341 @@
-from django.test import TestCase
+import asyncio
+import time
+from collections import Counter
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from meican import (
+    analytics,
+    async_client,
+    cron,
+    export,
+    history,
+    journal,
+    leases,
+    meican_service,
+    menu_cache,
+    onboarding,
+    planner,
+    quarantine,
+    read_model,
+    session_pool,
+    sharding,
+    singleflight,
+    views,
+)
+from meican.db_writer import (
+    DBWriter,
+    OrderResultRecord,
+    QuarantineRecord,
+    TabSyncRecord,
+    apply_now,
+)
+from meican.exceptions import MeiCanSessionExpired
+from meican.models import (
+    DailyOrderSummary,
+    DashboardDay,
+    Lease,
+    MeicanUser,
+    OrderRecord,
+    OrderRun,
+    TabStatus,
+)
+
+
+class LeaseTakeoverTests(TestCase):
+    """租约过期后被接管，原持有者续约失败"""
+
+    def test_expired_lease_taken_over(self):
+        name = leases.user_lease_name(1)
+        self.assertTrue(leases.try_acquire(name, "a", 60))
+        self.assertFalse(leases.try_acquire(name, "b", 60))
+
+        Lease.objects.filter(name=name).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertTrue(leases.try_acquire(name, "b", 60))
+        self.assertEqual(Lease.objects.get(name=name).owner, "b")
+        self.assertFalse(leases.renew(name, "a", 60))
+
+        # 原持有者释放时不能删除接管者的租约
+        leases.release(name, "a")
+        self.assertTrue(Lease.objects.filter(name=name, owner="b").exists())
+
+    def test_owner_reacquires_own_lease(self):
+        name = leases.user_lease_name(1)
+        self.assertTrue(leases.try_acquire(name, "a", 60))
+        self.assertTrue(leases.try_acquire(name, "a", 60))
+
+    def test_lost_after_ttl_without_renewal(self):
+        holder = leases.LeaseHolder(leases.user_lease_name(1), ttl=60)
+        self.assertTrue(holder.acquire())
+        try:
+            self.assertFalse(holder.lost)
+            holder.check()
+            # 续约线程没能在 ttl 内续约成功（例如进程被挂起）
+            holder._renewed_at -= 61
+            self.assertTrue(holder.lost)
+            with self.assertRaises(leases.LeaseLost):
+                holder.check()
+        finally:
+            holder.release()
+        self.assertFalse(holder.lost)
+
+
+class LeaseHeartbeatTests(TransactionTestCase):
+    """续约线程使用自己的数据库连接，需要已提交的数据"""
+
+    def test_heartbeat_detects_takeover(self):
+        holder = leases.LeaseHolder(leases.user_lease_name(1), ttl=0.3)
+        self.assertTrue(holder.acquire())
+        try:
+            Lease.objects.filter(name=holder.name).update(owner="other")
+            deadline = time.monotonic() + 5
+            while not holder.lost and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertTrue(holder.lost)
+        finally:
+            holder.release()
+        # 接管者的租约不受影响
+        self.assertTrue(Lease.objects.filter(name=holder.name, owner="other").exists())
+
+
+class LostLease(object):
+    name = "lost"
+    lost = True
+
+    def check(self):
+        raise leases.LeaseLost(self.name)
+
+
+class LeaseLostFlowTests(TestCase):
+    """租约失效后中止用户流程，不再下单"""
+
+    def setUp(self):
+        self.user = MeicanUser.objects.create(email="u@example.com")
+
+    def test_flow_aborts_before_first_stage(self):
+        with mock.patch.object(cron, "MeicanService") as service:
+            with self.assertRaises(leases.LeaseLost):
+                cron._process_user_complete_flow(self.user, lease=LostLease())
+        service.return_value.login.assert_not_called()
+        service.return_value.order_all_available_buffets.assert_not_called()
+
+    def test_flow_aborts_before_order(self):
+        lease = mock.Mock(spec=leases.LeaseHolder)
+        # 登录、同步阶段租约有效，下单前发现已被接管
+        lease.check.side_effect = [None, None, leases.LeaseLost("user")]
+        with mock.patch.object(cron, "MeicanService") as service:
+            service.return_value.login.return_value = (True, "token", None)
+            service.return_value.sync_user_tabs_status.return_value = (
+                True,
+                {"synced_tabs": []},
+                None,
+            )
+            with self.assertRaises(leases.LeaseLost):
+                cron._process_user_complete_flow(self.user, lease=lease)
+        service.return_value.order_all_available_buffets.assert_not_called()
+
+    def test_run_user_counts_lost_lease_as_busy(self):
+        run, progress = journal.start_run("test", [self.user])
+        item = progress[self.user.id]
+        with mock.patch.object(
+            cron, "_process_user_complete_flow", side_effect=leases.LeaseLost("user")
+        ):
+            self.assertEqual(cron._run_user(self.user, item=item), "busy")
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.consecutive_failures, 0)
+        self.assertEqual(run.items.get().status, journal.SKIPPED)
+        self.assertFalse(Lease.objects.exists())
+
+    def test_drain_stops_when_run_lease_lost(self):
+        queue = mock.Mock()
+        queue.pop.return_value = self.user
+        with mock.patch.object(cron, "_run_user") as run_user:
+            outcomes = cron._drain(queue, None, {}, {}, LostLease())
+        self.assertEqual(outcomes, Counter())
+        run_user.assert_not_called()
+
+
+class JournalTests(TestCase):
+    """运行日志：恢复时跳过已完成的用户和阶段"""
+
+    def setUp(self):
+        self.users = [
+            MeicanUser.objects.create(email=f"u{i}@example.com") for i in range(3)
+        ]
+
+    def test_completed_stages(self):
+        item = journal.ItemProgress(1, journal.IN_PROGRESS, journal.STAGE_ORDER)
+        self.assertTrue(item.completed(journal.STAGE_LOGIN))
+        self.assertTrue(item.completed(journal.STAGE_SYNC))
+        self.assertFalse(item.completed(journal.STAGE_ORDER))
+        # 没有中断过的用户所有阶段都要执行
+        item = journal.ItemProgress(1, journal.PENDING)
+        self.assertFalse(item.completed(journal.STAGE_LOGIN))
+
+    def test_enter_records_stage_and_attempt(self):
+        run, progress = journal.start_run("test", self.users[:1])
+        item = progress[self.users[0].id]
+        item.enter(journal.STAGE_LOGIN)
+        item.enter(journal.STAGE_SYNC)
+        row = run.items.get()
+        self.assertEqual(row.status, journal.IN_PROGRESS)
+        self.assertEqual(row.stage, journal.STAGE_SYNC)
+        self.assertEqual(row.attempts, 1)
+
+    def test_enter_skips_stages_passed_before_interrupt(self):
+        run, progress = journal.start_run("test", self.users[:1])
+        progress[self.users[0].id].enter(journal.STAGE_ORDER)
+
+        _, progress, _ = journal.resume_run(run)
+        item = progress[self.users[0].id]
+        item.enter(journal.STAGE_LOGIN)
+        self.assertEqual(run.items.get().stage, journal.STAGE_ORDER)
+        item.finish(journal.DONE)
+        self.assertEqual(run.items.get().status, journal.DONE)
+
+    def test_resume_run(self):
+        run, progress = journal.start_run("test", self.users)
+        done, interrupted, pending = self.users
+        progress[done.id].enter(journal.STAGE_LOGIN)
+        progress[done.id].finish(journal.DONE)
+        progress[interrupted.id].enter(journal.STAGE_ORDER)
+
+        self.assertEqual(journal.unfinished_run("test"), run)
+        users, progress, finished = journal.resume_run(run)
+        self.assertEqual({user.id for user in users}, {interrupted.id, pending.id})
+        self.assertEqual(finished, 1)
+        self.assertTrue(progress[interrupted.id].completed(journal.STAGE_SYNC))
+        self.assertFalse(progress[pending.id].completed(journal.STAGE_LOGIN))
+
+        journal.finish_run(run, {})
+        self.assertIsNone(journal.unfinished_run("test"))
+
+    @override_settings(MEICAN_RUN_RESUME_MINUTES=60)
+    def test_stale_run_abandoned(self):
+        run, _ = journal.start_run("test", self.users)
+        OrderRun.objects.filter(pk=run.pk).update(
+            started_at=timezone.now() - timedelta(minutes=61)
+        )
+        self.assertIsNone(journal.unfinished_run("test"))
+        run.refresh_from_db()
+        self.assertEqual(run.status, journal.RUN_ABANDONED)
+
+
+@override_settings(MEICAN_LEASE_TTL=1, MEICAN_SPREAD_WINDOW_MINUTES=0)
+class ResumeOnlyTests(TransactionTestCase):
+    """进程崩溃后立即恢复：崩溃进程的整轮租约还没过期"""
+
+    def setUp(self):
+        self.user = MeicanUser.objects.create(email="u@example.com")
+        self.run, progress = journal.start_run(leases.run_lease_name(), [self.user])
+        progress[self.user.id].enter(journal.STAGE_SYNC)
+        # 崩溃进程留下的租约，不会再续约
+        Lease.objects.create(
+            name=leases.run_lease_name(),
+            owner="crashed",
+            acquired_at=timezone.now(),
+            expires_at=timezone.now() + timedelta(seconds=0.5),
+        )
+
+    def test_resume_only_waits_for_crashed_lease(self):
+        with mock.patch.object(cron, "_run_user", return_value="success") as run_user:
+            summary = cron.auto_order_meals(workers=1, resume_only=True, profile=False)
+        self.assertNotIn("locked", summary)
+        self.assertEqual(summary["run"], self.run.id)
+        self.assertEqual(summary["success"], 1)
+        run_user.assert_called_once()
+        self.run.refresh_from_db()
+        self.assertEqual(self.run.status, journal.RUN_FINISHED)
+
+    @override_settings(MEICAN_PROFILE="flamegraph")
+    def test_unknown_profile_mode_ignored(self):
+        Lease.objects.all().delete()
+        with mock.patch.object(cron, "_run_user", return_value="success"):
+            summary = cron.auto_order_meals(workers=1, resume_only=True)
+        self.assertEqual(summary["success"], 1)
+        self.assertNotIn("profile", summary)
+
+    def test_scheduled_run_does_not_wait(self):
+        with mock.patch.object(cron, "_run_user") as run_user:
+            summary = cron.auto_order_meals(workers=1, profile=False)
+        self.assertTrue(summary["locked"])
+        run_user.assert_not_called()
+        # 与正常执行的汇总字段一致，分片合并时不缺字段
+        for field in sharding.COUNTED_FIELDS:
+            self.assertEqual(summary[field], 0)
+        self.assertIsNotNone(summary["run_id"])
+        self.assertGreaterEqual(summary["finished_at"], summary["started_at"])
+
+    def test_locked_shard_summary(self):
+        Lease.objects.create(
+            name=leases.run_lease_name(sharding.ShardSpec.parse("1/2")),
+            owner="other",
+            acquired_at=timezone.now(),
+            expires_at=timezone.now() + timedelta(minutes=5),
+        )
+        summary = cron.auto_order_meals(
+            workers=1, shard="1/2", run_id="run-1", profile=False
+        )
+        self.assertTrue(summary["locked"])
+        self.assertEqual(summary["run_id"], "run-1")
+        self.assertEqual(summary["shard_count"], 2)
+        self.assertEqual(summary["deadline_missed"], 0)
+
+
+async def _fake_login(email, semaphore):
+    if email.startswith("bad"):
+        return False, None, "密码错误"
+    return True, f"token-{email}", None
+
+
+class OnboardingTests(TestCase):
+    """批量导入：解析、去重、登录验证"""
+
+    def test_parse_csv_with_header(self):
+        text = "name,email\nA,a@example.com\nB,\nC, c@example.com \n"
+        self.assertEqual(
+            onboarding.parse_emails(text), ["a@example.com", "c@example.com"]
+        )
+
+    def test_parse_plain_text(self):
+        self.assertEqual(
+            onboarding.parse_emails("a@example.com, b@example.com c@example.com"),
+            ["a@example.com", "b@example.com", "c@example.com"],
+        )
+        self.assertEqual(
+            onboarding.parse_emails("a@example.com\n\nb@example.com\n"),
+            ["a@example.com", "b@example.com"],
+        )
+        self.assertEqual(onboarding.parse_emails("  \n"), [])
+
+    def test_import_users(self):
+        existing = MeicanUser.objects.create(email="old@example.com")
+        emails = [
+            "new@example.com",
+            "bad@example.com",
+            "not-an-email",
+            "old@example.com",
+            " new@example.com ",
+        ]
+        with mock.patch.object(onboarding, "_validate_login", _fake_login):
+            report = async_to_sync(onboarding.import_users)(emails)
+
+        self.assertEqual(
+            [item["result"] for item in report["results"]],
+            [
+                onboarding.CREATED,
+                onboarding.LOGIN_FAILED,
+                onboarding.INVALID,
+                onboarding.EXISTS,
+                onboarding.DUPLICATE,
+            ],
+        )
+        self.assertEqual(report["total"], 5)
+        self.assertEqual(report[onboarding.CREATED], 1)
+        self.assertEqual(report["results"][3]["user_id"], existing.id)
+        user = MeicanUser.objects.get(email="new@example.com")
+        self.assertEqual(user.token, "token-new@example.com")
+        self.assertFalse(MeicanUser.objects.filter(email="bad@example.com").exists())
+
+    def test_dry_run_creates_nothing(self):
+        with mock.patch.object(onboarding, "_validate_login", _fake_login):
+            report = async_to_sync(onboarding.import_users)(
+                ["new@example.com"], dry_run=True
+            )
+        self.assertEqual(report["results"][0]["result"], onboarding.VALID)
+        self.assertFalse(MeicanUser.objects.exists())
+
+
+def _buffet_tab(user, close_in):
+    now = timezone.now()
+    return TabStatus.objects.create(
+        user=user,
+        tab_uid=f"tab-{user.id}-{close_in}",
+        tab_title="午餐自助",
+        target_time=now + timedelta(minutes=close_in + 30),
+        close_time=now + timedelta(minutes=close_in),
+        status="AVAILABLE",
+        order_date=now.date(),
+    )
+
+
+class DeadlineQueueTests(TestCase):
+    """最早截止优先，定期重新读取截止时间"""
+
+    def setUp(self):
+        self.users = [
+            MeicanUser.objects.create(email=f"u{i}@example.com") for i in range(3)
+        ]
+
+    def test_earliest_deadline_first(self):
+        late, early, unknown = self.users
+        _buffet_tab(late, 180)
+        _buffet_tab(early, 60)
+        queue = planner.DeadlineQueue(self.users, refresh_interval=3600)
+        self.assertEqual(len(queue), 3)
+        self.assertEqual(
+            [queue.pop(), queue.pop(), queue.pop()], [early, late, unknown]
+        )
+        self.assertIsNone(queue.pop())
+        self.assertEqual(queue.missed, set())
+
+    def test_refresh_reorders_remaining_users(self):
+        late, early, unknown = self.users
+        _buffet_tab(late, 180)
+        _buffet_tab(early, 60)
+        queue = planner.DeadlineQueue(self.users, refresh_interval=0)
+        self.assertEqual(queue.pop(), early)
+        # 其他流程同步到了更早的截止时间
+        _buffet_tab(unknown, 30)
+        self.assertEqual(queue.pop(), unknown)
+        self.assertEqual(queue.pop(), late)
+
+
+class SpreadQueueTests(TestCase):
+    """分散执行：稳定的偏移量、截止前放行、按速率间隔"""
+
+    def setUp(self):
+        self.users = [
+            MeicanUser.objects.create(email=f"u{i}@example.com") for i in range(20)
+        ]
+
+    def test_release_within_window(self):
+        queue = planner.SpreadQueue(self.users, 600, rate=0, started=1000)
+        times = [queue.release_at(user.id) for user in self.users]
+        for release_at in times:
+            self.assertGreaterEqual(release_at, 1000)
+            self.assertLess(release_at, 1600)
+        # 偏移量只取决于 user id，恢复的运行得到相同的放行时刻
+        again = planner.SpreadQueue(self.users, 600, rate=0, started=1000)
+        self.assertEqual([again.release_at(user.id) for user in self.users], times)
+        self.assertGreater(len(set(times)), 1)
+
+    def test_release_clamped_to_deadline(self):
+        urgent, soon = self.users[:2]
+        _buffet_tab(urgent, 5)
+        _buffet_tab(soon, 30)
+        started = time.time()
+        queue = planner.SpreadQueue(
+            self.users, 3600, rate=0, margin=600, started=started
+        )
+        # 截止前 margin 秒已经早于窗口起点，立即放行
+        self.assertEqual(queue.release_at(urgent.id), started)
+        deadline = TabStatus.objects.get(user=soon).close_time.timestamp()
+        self.assertLessEqual(queue.release_at(soon.id), deadline - 600)
+
+    def test_rate_spacing(self):
+        users = self.users[:3]
+        queue = planner.SpreadQueue(users, 0, rate=600, started=time.time())
+        delays = []
+        with mock.patch.object(planner.time, "sleep", delays.append):
+            popped = [queue.pop() for _ in users]
+        self.assertIsNone(queue.pop())
+        self.assertCountEqual(popped, users)
+        # 第一个用户立即放行，之后每隔 60 / rate 秒放行一个
+        self.assertEqual(len(delays), 2)
+        self.assertAlmostEqual(delays[0], 0.1, delta=0.05)
+        self.assertAlmostEqual(delays[1], 0.2, delta=0.05)
+
+
+class CreateUserRecord(object):
+    def __init__(self, email):
+        self.email = email
+
+    def apply(self):
+        MeicanUser.objects.create(email=self.email)
+
+
+class DBWriterTests(TransactionTestCase):
+    """单写线程：按提交顺序批量写入，坏记录不影响同一批的其他记录"""
+
+    def test_writes_all_records_in_order(self):
+        with DBWriter(flush_interval=0.05, flush_size=3) as writer:
+            for i in range(10):
+                writer.submit(CreateUserRecord(f"u{i}@example.com"))
+        self.assertEqual(writer.written, 10)
+        self.assertEqual(writer.errors, [])
+        self.assertEqual(
+            list(MeicanUser.objects.order_by("id").values_list("email", flat=True)),
+            [f"u{i}@example.com" for i in range(10)],
+        )
+
+    def test_bad_record_isolated(self):
+        with DBWriter(flush_interval=1, flush_size=10) as writer:
+            writer.submit(CreateUserRecord("a@example.com"))
+            writer.submit(CreateUserRecord("a@example.com"))
+            writer.submit(CreateUserRecord("b@example.com"))
+        # 整批回滚后逐条重试，只有重复的那条失败
+        self.assertEqual(writer.written, 2)
+        self.assertEqual(len(writer.errors), 1)
+        self.assertEqual(
+            set(MeicanUser.objects.values_list("email", flat=True)),
+            {"a@example.com", "b@example.com"},
+        )
+
+    def test_submit_after_close(self):
+        writer = DBWriter()
+        writer.start()
+        writer.close()
+        with self.assertRaises(RuntimeError):
+            writer.submit(CreateUserRecord("a@example.com"))
+
+
+class ExportTests(TestCase):
+    """键集分页：按 (日期, id) 逐块读取，不重复、不遗漏"""
+
+    def setUp(self):
+        self.users = [
+            MeicanUser.objects.create(email=f"u{i}@example.com") for i in range(2)
+        ]
+        # id 顺序与日期顺序交错，同一天有多条记录跨越分块边界
+        for day in (3, 1, 2, 1, 3, 2, 1):
+            for user in self.users:
+                OrderRecord.objects.create(
+                    user=user,
+                    order_date=date(2024, 1, day),
+                    meal_period=f"period-{OrderRecord.objects.count()}",
+                    meal_name="meal",
+                    success=True,
+                )
+
+    def _rows(self, **filters):
+        return [row for rows in export.iter_chunks("orders", **filters) for row in rows]
+
+    def test_chunks_cover_all_rows_in_order(self):
+        expected = list(
+            OrderRecord.objects.order_by("order_date", "id").values_list(
+                "id", flat=True
+            )
+        )
+        for chunk_size in (1, 3, 5, len(expected), 100):
+            chunks = list(export.iter_chunks("orders", chunk_size=chunk_size))
+            self.assertTrue(all(len(rows) <= chunk_size for rows in chunks))
+            self.assertEqual(
+                [row[0] for rows in chunks for row in rows], expected, chunk_size
+            )
+
+    def test_filters(self):
+        user = self.users[1]
+        rows = self._rows(
+            start=date(2024, 1, 2),
+            end=date(2024, 1, 2),
+            user_ids=[user.id],
+            chunk_size=1,
+        )
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(all(row[2] == user.email for row in rows))
+        self.assertEqual(
+            export.resolve_users([str(self.users[0].id), user.email, "missing"]),
+            [self.users[0].id, user.id],
+        )
+
+    def test_csv(self):
+        content = b"".join(export.iter_csv("orders", chunk_size=4)).decode("utf-8")
+        lines = content.lstrip("\ufeff").splitlines()
+        self.assertEqual(lines[0].split(","), export.TABLES["orders"].headers)
+        self.assertEqual(len(lines), 1 + OrderRecord.objects.count())
+        # 没有数据时只输出表头
+        content = b"".join(export.iter_csv("orders", start=date(2030, 1, 1)))
+        self.assertEqual(len(content.decode("utf-8").splitlines()), 1)
+
+
+async def _fake_refresh(user):
+    return True, {"sync_info": {"synced_tabs": [{}, {}]}, "order_info": {}}, None
+
+
+@override_settings(MEICAN_REFRESH_FRESH_SECONDS=0)
+class UpdateOrderStatusViewTests(TestCase):
+    """刷新按钮：fetch 调用返回 JSON，表单提交重定向"""
+
+    def setUp(self):
+        self.user = MeicanUser.objects.create(email="u@example.com")
+        self.url = reverse("update_order_status", args=[self.user.id])
+
+    def test_json_when_requested(self):
+        with mock.patch.object(views, "_refresh_user", _fake_refresh):
+            response = self.client.post(self.url, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertTrue(result["success"])
+        self.assertIn("已同步 2 个时段状态", result["message"])
+
+    def test_form_post_redirects(self):
+        with mock.patch.object(views, "_refresh_user", _fake_refresh):
+            response = self.client.post(self.url)
+        self.assertRedirects(
+            response, reverse("get_meican_users"), fetch_redirect_response=False
+        )
+
+
+class OrderHelperTests(TestCase):
+    """同步、异步服务共用的下单规则"""
+
+    def setUp(self):
+        self.user = MeicanUser.objects.create(email="u@example.com")
+        self.tab = mock.Mock(
+            uid="tab-1",
+            title="午餐自助",
+            target_time=timezone.now() + timedelta(hours=2),
+        )
+
+    def test_select_buffet_dish(self):
+        dish, error = meican_service.select_buffet_dish(self.tab, [])
+        self.assertIsNone(dish)
+        self.assertIn("没有可订购的菜品", error)
+
+        plain = mock.Mock()
+        plain.name = "牛肉面"
+        dish, error = meican_service.select_buffet_dish(self.tab, [plain])
+        self.assertIsNone(dish)
+        self.assertIn("没有找到自助餐菜品", error)
+
+        buffet = mock.Mock()
+        buffet.name = "员工自助餐"
+        dish, error = meican_service.select_buffet_dish(self.tab, [plain, buffet])
+        self.assertIs(dish, buffet)
+        self.assertIsNone(error)
+
+    def test_order_records(self):
+        apply_now(meican_service.order_record(self.user, self.tab, "员工自助餐"))
+        record = OrderRecord.objects.get()
+        self.assertTrue(record.success)
+        self.assertEqual(record.meal_name, "员工自助餐")
+        self.assertEqual(record.tab_uid, "tab-1")
+
+        error = meican_service.order_failed(self.tab, RuntimeError("已售罄"))
+        apply_now(meican_service.order_record(self.user, self.tab, error_message=error))
+        record = OrderRecord.objects.get()
+        self.assertFalse(record.success)
+        self.assertEqual(record.error_message, "下单失败: 已售罄")
+
+    def test_collect_order_result(self):
+        successful = []
+        meican_service.collect_order_result(
+            successful, self.user, self.tab, "员工自助餐", None
+        )
+        meican_service.collect_order_result(
+            successful, self.user, self.tab, None, "下单失败"
+        )
+        self.assertEqual(
+            successful,
+            [
+                {
+                    "tab_title": "午餐自助",
+                    "order_date": self.tab.target_time.date().isoformat(),
+                    "meal_name": "员工自助餐",
+                    "tab_uid": "tab-1",
+                }
+            ],
+        )
+
+
+class MenuFailureTests(TestCase):
+    """下单失败的时段在状态变化或缓存过期之前不再拉取菜单和下单"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = MeicanUser.objects.create(email="u@example.com")
+        self.tab = mock.Mock(
+            uid="tab-1",
+            title="午餐自助",
+            target_time=timezone.now() + timedelta(hours=2),
+        )
+        buffet = mock.Mock()
+        buffet.name = "员工自助餐"
+        self.service = meican_service.MeicanService()
+        self.service.meican_client = mock.Mock()
+        self.service.meican_client.order.side_effect = RuntimeError("已售罄")
+        patcher = mock.patch.object(
+            meican_service.menu_cache, "dishes_from_menu", return_value=[buffet]
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unchanged_failed_tab_is_skipped(self):
+        client = self.service.meican_client
+        success, _, error = self.service._order_buffet_for_tab(self.tab, self.user)
+        self.assertFalse(success)
+        self.assertEqual(error, "下单失败: 已售罄")
+
+        success, _, error = self.service._order_buffet_for_tab(
+            self.tab, self.user, changed=False
+        )
+        self.assertFalse(success)
+        self.assertEqual(error, "下单失败: 已售罄")
+        self.assertEqual(client.load_menu.call_count, 1)
+        self.assertEqual(client.order.call_count, 1)
+
+        # 状态变化时重新拉取菜单并下单
+        self.service._order_buffet_for_tab(self.tab, self.user, changed=True)
+        self.assertEqual(client.load_menu.call_count, 2)
+        self.assertEqual(client.order.call_count, 2)
+
+    def test_discard_clears_failure(self):
+        self.service._order_buffet_for_tab(self.tab, self.user)
+        menu_cache.discard_menus([self.tab])
+        self.assertIsNone(menu_cache.get_failure(self.tab))
+
+        client = self.service.meican_client
+        client.order.side_effect = None
+        success, meal_name, _ = self.service._order_buffet_for_tab(
+            self.tab, self.user, changed=False
+        )
+        self.assertTrue(success)
+        self.assertEqual(meal_name, "员工自助餐")
+        self.assertEqual(client.load_menu.call_count, 2)
+
+    @override_settings(MEICAN_MENU_CACHE_SECONDS=0)
+    def test_disabled_cache_always_retries(self):
+        self.service._order_buffet_for_tab(self.tab, self.user)
+        self.service._order_buffet_for_tab(self.tab, self.user, changed=False)
+        self.assertEqual(self.service.meican_client.order.call_count, 2)
+
+
+class AnalyticsTests(TestCase):
+    """统计分析：失败原因分类、覆盖率、下单提前量和按天合计缓存"""
+
+    def setUp(self):
+        cache.clear()
+        self.today = date.today()
+        self.day = self.today - timedelta(days=2)
+        now = timezone.now()
+        self.alice = MeicanUser.objects.create(email="alice@example.com")
+        self.bob = MeicanUser.objects.create(email="bob@example.com")
+        for user, uid, title, status in (
+            (self.alice, "lunch", "午餐自助", "ORDERED"),
+            (self.alice, "dinner", "晚餐自助", "AVAILABLE"),
+            (self.alice, "breakfast", "早餐", "ORDERED"),
+            (self.bob, "lunch", "午餐自助", "AVAILABLE"),
+        ):
+            TabStatus.objects.create(
+                user=user,
+                tab_uid=uid,
+                tab_title=title,
+                target_time=now + timedelta(hours=3),
+                close_time=now + timedelta(minutes=90),
+                status=status,
+                order_date=self.day,
+            )
+        for user, period, success, error in (
+            (self.alice, "午餐自助", True, None),
+            (self.alice, "晚餐自助", False, "下单失败: 已售罄"),
+            (self.alice, "早餐", False, "请求超时"),
+            (self.bob, "午餐自助", False, "session expired"),
+        ):
+            OrderRecord.objects.create(
+                user=user,
+                order_date=self.day,
+                meal_period=period,
+                meal_name="员工自助餐" if success else "",
+                success=success,
+                error_message=error,
+                tab_uid="lunch" if period == "午餐自助" else None,
+            )
+
+    def test_report_totals(self):
+        result = analytics.report(self.day, self.day, self.today)
+        totals = result["totals"]
+        self.assertEqual(totals["orders_success"], 1)
+        self.assertEqual(totals["orders_failed"], 3)
+        self.assertEqual(totals["success_rate"], 0.25)
+        self.assertEqual(
+            totals["failures"], {"sold_out": 1, "network": 1, "session": 1}
+        )
+        self.assertEqual(totals["buffet_tabs"], 3)
+        self.assertEqual(totals["buffet_ordered"], 1)
+        self.assertEqual(totals["coverage"], 0.3333)
+        self.assertAlmostEqual(totals["avg_lead_minutes"], 90, delta=0.2)
+        self.assertEqual(result["rows"][0]["date"], self.day.isoformat())
+
+    def test_report_by_user(self):
+        result = analytics.report(
+            self.day,
+            self.day,
+            self.today,
+            group=analytics.GROUP_USER,
+            user_ids=[self.alice.id],
+        )
+        (row,) = result["rows"]
+        self.assertEqual(row["email"], "alice@example.com")
+        self.assertEqual(row["failures"], {"sold_out": 1, "network": 1})
+        self.assertEqual(row["coverage"], 0.5)
+        self.assertEqual(result["cached_days"], 0)
+
+    def test_synced_orders_have_no_lead_time(self):
+        OrderRecord.objects.filter(success=True).update(
+            meal_name=analytics.SYNCED_MEAL_NAME
+        )
+        totals = analytics.report(self.day, self.day, self.today)["totals"]
+        self.assertEqual(totals["orders_success"], 1)
+        self.assertIsNone(totals["avg_lead_minutes"])
+
+    def test_day_totals_cache(self):
+        start = self.day - timedelta(days=1)
+        self.assertEqual(
+            analytics.report(start, self.today, self.today)["cached_days"], 0
+        )
+        # 只缓存今天以前的日期，且只保存当天所有用户的合计
+        self.assertEqual(
+            analytics.report(start, self.today, self.today)["cached_days"], 3
+        )
+        cached = cache.get(analytics.DAY_KEY.format(date=self.day.isoformat()))
+        self.assertEqual(cached["orders_failed"], 3)
+        self.assertNotIn(self.alice.id, cached)
+
+        # 写入历史日期的下单结果时删除对应日期的缓存
+        apply_now(
+            OrderResultRecord(
+                self.bob.id, self.day, "午餐自助", "员工自助餐", True, None, "lunch"
+            )
+        )
+        result = analytics.report(start, self.today, self.today)
+        self.assertEqual(result["cached_days"], 2)
+        self.assertEqual(result["totals"]["orders_success"], 2)
+        self.assertEqual(result["totals"]["coverage"], 0.6667)
+
+
+@override_settings(
+    MEICAN_QUARANTINE_AFTER=3,
+    MEICAN_BACKOFF_BASE_MINUTES=30,
+    MEICAN_BACKOFF_MAX_HOURS=24,
+)
+class QuarantineTests(TestCase):
+    """失败隔离：指数退避、成功清零、到期恢复和手动解除"""
+
+    def setUp(self):
+        self.user = MeicanUser.objects.create(email="u@example.com")
+
+    def test_backoff_delay(self):
+        self.assertIsNone(quarantine.backoff_delay(2))
+        self.assertEqual(quarantine.backoff_delay(3), timedelta(minutes=30))
+        self.assertEqual(quarantine.backoff_delay(4), timedelta(minutes=60))
+        self.assertEqual(quarantine.backoff_delay(6), timedelta(minutes=240))
+        self.assertEqual(quarantine.backoff_delay(9), timedelta(hours=24))
+        self.assertEqual(quarantine.backoff_delay(1000), timedelta(hours=24))
+        with override_settings(MEICAN_QUARANTINE_AFTER=0):
+            self.assertIsNone(quarantine.backoff_delay(10))
+
+    def test_record_quarantines_and_success_resets(self):
+        for _ in range(2):
+            quarantine.record(self.user.id, False, "密码错误")
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.consecutive_failures, 2)
+        self.assertIsNone(self.user.next_eligible_at)
+
+        before = timezone.now()
+        quarantine.record(self.user.id, False, "密码错误")
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_failure, "密码错误")
+        self.assertGreaterEqual(
+            self.user.next_eligible_at, before + timedelta(minutes=30)
+        )
+        self.assertTrue(quarantine.is_quarantined(self.user))
+
+        quarantine.record(self.user.id, True)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.consecutive_failures, 0)
+        self.assertIsNone(self.user.next_eligible_at)
+        self.assertEqual(self.user.last_failure, "")
+
+    def test_split_eligible_at_next_eligible_at(self):
+        now = timezone.now()
+        other = MeicanUser.objects.create(email="v@example.com")
+        self.user.next_eligible_at = now + timedelta(minutes=5)
+        eligible, quarantined = quarantine.split_eligible([self.user, other], now)
+        self.assertEqual(eligible, [other])
+        self.assertEqual(quarantined, [self.user])
+
+        # 到期的时刻即可再次处理
+        eligible, quarantined = quarantine.split_eligible(
+            [self.user, other], self.user.next_eligible_at
+        )
+        self.assertEqual(eligible, [self.user, other])
+        self.assertEqual(quarantined, [])
+
+    def test_retry_now_keeps_failure_count(self):
+        for _ in range(3):
+            quarantine.record(self.user.id, False, "密码错误")
+        self.assertTrue(quarantine.retry_now(self.user.id))
+        self.user.refresh_from_db()
+        self.assertFalse(quarantine.is_quarantined(self.user))
+        self.assertEqual(self.user.consecutive_failures, 3)
+
+        # 立即重试仍然失败时以更长的时间重新隔离
+        before = timezone.now()
+        quarantine.record(self.user.id, False, "密码错误")
+        self.user.refresh_from_db()
+        self.assertGreaterEqual(
+            self.user.next_eligible_at, before + timedelta(minutes=60)
+        )
+        self.assertFalse(quarantine.retry_now(self.user.id + 1000))
+
+    def test_quarantine_record_truncates_error(self):
+        apply_now(QuarantineRecord(self.user.id, False, "x" * 600))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.consecutive_failures, 1)
+        self.assertEqual(len(self.user.last_failure), 500)
+        # 不存在的用户不报错
+        apply_now(QuarantineRecord(self.user.id + 1000, False, "密码错误"))
+
+
+class TabSyncRecordTests(TestCase):
+    """Tab 同步重建：报告实际写入的行和唯一约束冲突"""
+
+    def setUp(self):
+        self.user = MeicanUser.objects.create(email="u@example.com")
+        self.target_time = timezone.localtime().replace(
+            hour=12, minute=0, second=0, microsecond=0
+        )
+        self.today = self.target_time.date()
+
+    def _tab(self, uid, title, status):
+        return {
+            "tab_uid": uid,
+            "tab_title": title,
+            "target_time": self.target_time,
+            "close_time": None,
+            "status": status,
+            "order_date": self.today,
+        }
+
+    def test_reports_conflicts(self):
+        TabStatus.objects.create(user=self.user, **self._tab("old", "早餐", "CLOSED"))
+        result = apply_now(
+            TabSyncRecord(
+                self.user.id,
+                self.today,
+                [
+                    self._tab("lunch", "午餐自助", "ORDERED"),
+                    self._tab("lunch", "午餐自助", "AVAILABLE"),
+                    self._tab("lunch-2", "午餐自助", "ORDERED"),
+                ],
+            )
+        )
+        self.assertEqual(result["created"], [True, False, True])
+        self.assertEqual(
+            [conflict["reason"] for conflict in result["conflicts"]],
+            ["同一时段重复", "同一天同名时段的订单重复"],
+        )
+        self.assertEqual(
+            set(TabStatus.objects.values_list("tab_uid", "status")),
+            {("lunch", "ORDERED"), ("lunch-2", "ORDERED")},
+        )
+        self.assertEqual(OrderRecord.objects.get().tab_uid, "lunch")
+
+    def test_sync_result_marks_created(self):
+        tabs = [
+            mock.Mock(
+                uid="lunch",
+                title="午餐自助",
+                close_time=None,
+                status="AVAILABLE",
+                target_time=self.target_time,
+            )
+        ] * 2
+        service = meican_service.MeicanService()
+        service.meican_client = mock.Mock(tabs=tabs)
+        success, info, error = service.sync_user_tabs_status(self.user)
+        self.assertTrue(success)
+        self.assertEqual(
+            [item["created"] for item in info["synced_tabs"]], [True, False]
+        )
+        self.assertEqual(len(info["conflicts"]), 1)
+
+        # 交给写线程时要到落盘后才知道是否写入
+        service.writer = mock.Mock()
+        success, info, error = service.sync_user_tabs_status(self.user)
+        self.assertEqual(
+            [item["created"] for item in info["synced_tabs"]], [None, None]
+        )
+        self.assertNotIn("conflicts", info)
+
+
+class ConditionalGetTests(TestCase):
+    """条件 GET：数据没有变化时返回 304，Tab、订单或用户状态变化后 ETag 随之变化"""
+
+    def setUp(self):
+        self.user = MeicanUser.objects.create(email="u@example.com")
+        self.tab = TabStatus.objects.create(
+            user=self.user,
+            tab_uid="lunch",
+            tab_title="午餐自助",
+            target_time=timezone.now() + timedelta(hours=3),
+            status="AVAILABLE",
+            order_date=date.today(),
+        )
+        self.url = reverse("api_users")
+
+    def _etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_not_modified(self):
+        etag = self._etag()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # 查询参数不同，内容不同
+        response = self.client.get(self.url, {"q": "u"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_with_data(self):
+        etag = self._etag()
+        self.tab.status = "ORDERED"
+        self.tab.save()
+        tab_etag = self._etag()
+        self.assertNotEqual(tab_etag, etag)
+
+        order = OrderRecord.objects.create(
+            user=self.user,
+            order_date=date.today(),
+            meal_period="午餐自助",
+            meal_name="员工自助餐",
+            success=True,
+        )
+        order_etag = self._etag()
+        self.assertNotEqual(order_etag, tab_etag)
+        # update_or_create 更新已有的订单记录
+        order.success = False
+        order.save()
+        updated_etag = self._etag()
+        self.assertNotEqual(updated_etag, order_etag)
+
+        MeicanUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertNotEqual(self._etag(), updated_etag)
+
+    def test_etag_changes_with_quarantine(self):
+        etag = self._etag()
+        MeicanUser.objects.filter(pk=self.user.pk).update(
+            consecutive_failures=3,
+            next_eligible_at=timezone.now() + timedelta(hours=1),
+        )
+        self.assertNotEqual(self._etag(), etag)
+
+
+class SessionPoolTests(TestCase):
+    """已登录客户端连接池：LRU 淘汰、空闲超时、会话过期的客户端不再复用"""
+
+    def setUp(self):
+        self.pool = session_pool.SessionPool(max_size=2, idle_ttl=60)
+
+    def test_lru_eviction(self):
+        a, b, c = object(), object(), object()
+        self.pool.checkin("a", a)
+        self.pool.checkin("b", b)
+        client, _ = self.pool.checkout("a")
+        self.assertIs(client, a)
+        self.pool.checkin("a", a)
+        # b 最久没有使用，被淘汰
+        self.assertEqual(self.pool.checkin("c", c), [b])
+        self.assertEqual(self.pool.checkout("b"), (None, []))
+        self.assertEqual((self.pool.hits, self.pool.misses), (1, 1))
+
+    def test_checkout_is_exclusive(self):
+        a = object()
+        self.pool.checkin("a", a)
+        self.assertIs(self.pool.checkout("a")[0], a)
+        self.assertIsNone(self.pool.checkout("a")[0])
+
+    def test_idle_ttl(self):
+        a, b = object(), object()
+        now = time.monotonic()
+        with mock.patch.object(session_pool.time, "monotonic", return_value=now):
+            self.pool.checkin("a", a)
+        with mock.patch.object(session_pool.time, "monotonic", return_value=now + 61):
+            # 空闲超时的客户端在下一次存取时丢弃
+            self.assertEqual(self.pool.checkin("b", b), [a])
+            self.assertEqual(self.pool.checkout("a"), (None, []))
+            self.assertIs(self.pool.checkout("b")[0], b)
+
+    def test_scope_mismatch(self):
+        a = object()
+        self.pool.checkin("a", a, scope="loop-1")
+        self.assertEqual(self.pool.checkout("a", scope="loop-2"), (None, [a]))
+
+    def test_disabled(self):
+        pool = session_pool.SessionPool(max_size=0, idle_ttl=60)
+        a = object()
+        self.assertFalse(pool.enabled)
+        self.assertEqual(pool.checkin("a", a), [a])
+
+    def test_expired_session_not_reused(self):
+        for status in (401, 403):
+            http = httpx.AsyncClient(
+                transport=httpx.MockTransport(lambda request: httpx.Response(status))
+            )
+            client = async_client.AsyncMeiCan(http)
+            with self.assertRaises(MeiCanSessionExpired):
+                async_to_sync(client.http_get)("https://meican.test/api")
+            self.assertTrue(client.expired)
+            self.assertEqual(self.pool.checkin("a", client), [client])
+            self.assertEqual(len(self.pool), 0)
+            async_to_sync(client.aclose)()
+
+    def test_checkin_clears_responses(self):
+        client = mock.Mock(expired=False, responses=[object()])
+        self.assertEqual(self.pool.checkin("a", client), [])
+        self.assertEqual(client.responses, [])
+
+
+class SingleFlightTests(TestCase):
+    """请求合并：并发调用只执行一次，保鲜期内直接返回上一次的结果"""
+
+    def _calls(self, flight, key, count, result="ok", remember=None, fail=False):
+        calls = []
+
+        async def fn():
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            if fail:
+                raise RuntimeError("登录失败")
+            return result
+
+        async def run():
+            return await asyncio.gather(
+                *[flight.do(key, fn, remember) for _ in range(count)],
+                return_exceptions=True,
+            )
+
+        return async_to_sync(run)(), calls
+
+    def test_concurrent_calls_join(self):
+        flight = singleflight.SingleFlight(fresh_for=0)
+        results, calls = self._calls(flight, "u1", 3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(
+            sorted(source for _, source in results),
+            [singleflight.JOINED, singleflight.JOINED, singleflight.LEADER],
+        )
+        self.assertEqual({result for result, _ in results}, {"ok"})
+
+        # 没有保鲜期时下一次调用重新执行
+        results, calls = self._calls(flight, "u1", 1)
+        self.assertEqual(results, [("ok", singleflight.LEADER)])
+
+    def test_fresh_result(self):
+        flight = singleflight.SingleFlight(fresh_for=60)
+        self._calls(flight, "u1", 1, result="first")
+        results, calls = self._calls(flight, "u1", 1, result="second")
+        self.assertEqual(results, [("first", singleflight.FRESH)])
+        self.assertEqual(calls, [])
+        # 其他 key 不受影响
+        results, _ = self._calls(flight, "u2", 1, result="second")
+        self.assertEqual(results, [("second", singleflight.LEADER)])
+
+        flight.forget("u1")
+        results, _ = self._calls(flight, "u1", 1, result="second")
+        self.assertEqual(results, [("second", singleflight.LEADER)])
+
+    def test_fresh_result_expires(self):
+        flight = singleflight.SingleFlight(fresh_for=60)
+        self._calls(flight, "u1", 1, result="first")
+        # 保鲜期已过
+        flight._results["u1"] = (time.monotonic() - 1, "first")
+        results, _ = self._calls(flight, "u1", 1, result="second")
+        self.assertEqual(results, [("second", singleflight.LEADER)])
+
+    def test_failures_not_remembered(self):
+        flight = singleflight.SingleFlight(fresh_for=60)
+        results, calls = self._calls(flight, "u1", 2, fail=True)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(item, RuntimeError) for item in results))
+
+        remember = lambda result: result[0]  # noqa: E731
+        self._calls(flight, "u1", 1, result=(False, "密码错误"), remember=remember)
+        results, calls = self._calls(flight, "u1", 1, result=(True, None))
+        self.assertEqual(results, [((True, None), singleflight.LEADER)])
+
+
+class ReadModelTests(TestCase):
+    """面板读模型：按日期重建、整体重建，与明细表保持一致"""
+
+    def setUp(self):
+        self.user = MeicanUser.objects.create(email="u@example.com")
+        self.today = date.today()
+        self.tomorrow = self.today + timedelta(days=1)
+        now = timezone.now()
+        for order_date, uid, title, hours in (
+            (self.today, "dinner", "晚餐自助", 8),
+            (self.today, "lunch", "午餐", 3),
+            (self.tomorrow, "lunch", "午餐", 27),
+        ):
+            TabStatus.objects.create(
+                user=self.user,
+                tab_uid=uid,
+                tab_title=title,
+                target_time=now + timedelta(hours=hours),
+                status="AVAILABLE",
+                order_date=order_date,
+            )
+
+    def test_refresh_days(self):
+        read_model.refresh_days(self.user.id, [self.today])
+        day = DashboardDay.objects.get()
+        self.assertEqual(day.date, self.today)
+        self.assertEqual([tab["title"] for tab in day.tabs], ["午餐", "晚餐自助"])
+        self.assertTrue(day.has_buffet)
+        self.assertFalse(day.ordered)
+
+        OrderRecord.objects.create(
+            user=self.user,
+            order_date=self.today,
+            meal_period="晚餐自助",
+            meal_name="员工自助餐",
+            success=True,
+        )
+        OrderRecord.objects.create(
+            user=self.user,
+            order_date=self.today,
+            meal_period="午餐",
+            meal_name="",
+            success=False,
+        )
+        read_model.refresh_days(self.user.id, [self.today])
+        day = DashboardDay.objects.get()
+        self.assertTrue(day.ordered)
+        self.assertEqual(day.meals, "晚餐自助: 员工自助餐")
+
+        # 没有数据的日期删除对应的行
+        TabStatus.objects.filter(order_date=self.today).delete()
+        OrderRecord.objects.all().delete()
+        read_model.refresh_days(self.user.id, [self.today])
+        self.assertFalse(DashboardDay.objects.exists())
+
+    def test_refresh_user(self):
+        read_model.refresh_user(self.user.id, self.today)
+        self.assertEqual(
+            set(DashboardDay.objects.values_list("date", flat=True)),
+            {self.today, self.tomorrow},
+        )
+        TabStatus.objects.filter(order_date=self.tomorrow).delete()
+        read_model.refresh_user(self.user.id, self.today)
+        self.assertEqual(
+            list(DashboardDay.objects.values_list("date", flat=True)), [self.today]
+        )
+
+    def test_rebuild(self):
+        other = MeicanUser.objects.create(email="v@example.com")
+        TabStatus.objects.create(
+            user=other,
+            tab_uid="lunch",
+            tab_title="午餐自助",
+            target_time=timezone.now(),
+            status="ORDERED",
+            order_date=self.today - timedelta(days=1),
+        )
+        # 今天及以后的行按明细表重建，默认不包含今天以前的日期
+        DashboardDay.objects.create(user=self.user, date=self.today, tabs=[], orders=[])
+        self.assertEqual(read_model.rebuild(batch_size=1), 2)
+        self.assertEqual(
+            sorted(DashboardDay.objects.values_list("user_id", "date")),
+            [(self.user.id, self.today), (self.user.id, self.tomorrow)],
+        )
+        self.assertEqual(len(DashboardDay.objects.get(date=self.today).tabs), 2)
+
+        self.assertEqual(
+            read_model.rebuild(
+                since=self.today - timedelta(days=1), user_ids=[other.id]
+            ),
+            1,
+        )
+        self.assertTrue(DashboardDay.objects.filter(user=other).exists())
+
+
+@override_settings(HISTORY_RETENTION_DAYS=30)
+class HistoryCompactionTests(TestCase):
+    """历史压缩：汇总与删除的原始数据一致，历史统计合并汇总表和未压缩的数据"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = MeicanUser.objects.create(email="u@example.com")
+        today = date.today()
+        self.old = today - timedelta(days=40)
+        self.older = today - timedelta(days=35)
+        self.recent = today - timedelta(days=1)
+        for order_date, uid, title, status in (
+            (self.old, "lunch", "午餐自助", "ORDERED"),
+            (self.old, "dinner", "晚餐", "CLOSED"),
+            (self.old, "breakfast", "早餐", "AVAILABLE"),
+            (self.older, "lunch", "午餐自助", "AVAILABLE"),
+            (self.recent, "lunch", "午餐自助", "ORDERED"),
+        ):
+            TabStatus.objects.create(
+                user=self.user,
+                tab_uid=uid,
+                tab_title=title,
+                target_time=timezone.now(),
+                status=status,
+                order_date=order_date,
+            )
+        for order_date, period, success in (
+            (self.old, "午餐自助", True),
+            (self.old, "晚餐", False),
+            (self.older, "午餐自助", False),
+            (self.recent, "午餐自助", True),
+        ):
+            OrderRecord.objects.create(
+                user=self.user,
+                order_date=order_date,
+                meal_period=period,
+                meal_name="员工自助餐",
+                success=success,
+            )
+
+    def test_rollup_matches_deleted_rows(self):
+        before = history.daily_history(self.old, self.recent)
+        self.assertEqual(history.compact_history(dry_run=True)["tab_statuses"], 4)
+
+        # 分多批压缩，同一天的汇总跨批次累加
+        result = history.compact_history(batch_size=2)
+        self.assertEqual((result["tab_statuses"], result["order_records"]), (4, 3))
+        self.assertEqual(
+            list(TabStatus.objects.values_list("order_date", flat=True)),
+            [self.recent],
+        )
+        self.assertEqual(OrderRecord.objects.count(), 1)
+
+        summary = DailyOrderSummary.objects.get(user=self.user, date=self.old)
+        self.assertEqual(
+            {field: getattr(summary, field) for field in history.SUMMARY_FIELDS},
+            {
+                "tabs_total": 3,
+                "buffet_tabs": 1,
+                "tabs_ordered": 1,
+                "tabs_closed": 1,
+                "orders_success": 1,
+                "orders_failed": 1,
+            },
+        )
+        # 汇总表与未压缩的数据合并后，统计与压缩前一致
+        self.assertEqual(history.daily_history(self.old, self.recent), before)
+
+    def test_user_history_totals(self):
+        history.compact_history()
+        totals = history.user_history_totals(
+            self.old, self.recent, user_ids=[self.user.id]
+        )
+        self.assertEqual(totals[self.user.id]["tabs_total"], 5)
+        self.assertEqual(totals[self.user.id]["orders_success"], 2)
+        self.assertEqual(totals[self.user.id]["orders_failed"], 2)
+        self.assertEqual(history.user_history_totals(self.old, self.recent, []), {})
+
+    def test_compaction_invalidates_analytics(self):
+        today = date.today()
+        analytics.report(self.old, self.old, today)
+        self.assertEqual(analytics.report(self.old, self.old, today)["cached_days"], 1)
+        history.compact_history()
+        result = analytics.report(self.old, self.old, today)
+        self.assertEqual(result["cached_days"], 0)
+        # 压缩后的日期没有失败原因
+        self.assertEqual(result["totals"]["failures"], {})
+        self.assertEqual(result["totals"]["orders_failed"], 1)
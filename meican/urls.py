@@ -10,15 +10,22 @@ urlpatterns = [
         views.UpdateOrderStatusView.as_view(),
         name="update_order_status",
     ),
+    path("retry/<int:user_id>/", views.RetryUserView.as_view(), name="retry_user"),
     path("auto-order/", views.AutoOrderView.as_view(), name="auto_order"),
+    path("events/", views.DashboardEventsView.as_view(), name="dashboard_events"),
     # API endpoints
     path("api/users/", views.UsersApiView.as_view(), name="api_users"),
     path(
         "api/users/create/", views.CreateUserApiView.as_view(), name="api_create_user"
     ),
+    path(
+        "api/users/import/", views.ImportUsersApiView.as_view(), name="api_import_users"
+    ),
     path(
         "api/users/<int:user_id>/delete/",
         views.DeleteUserApiView.as_view(),
         name="api_delete_user",
     ),
+    path("api/analytics/", views.AnalyticsApiView.as_view(), name="api_analytics"),
+    path("api/export/", views.ExportApiView.as_view(), name="api_export"),
 ]
@@ -1,112 +1,162 @@
+import hashlib
 import json
 from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.decorators import method_decorator
 from django.views import View
-
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from meican import (
+    analytics,
+    dashboard_cache,
+    events,
+    export,
+    leases,
+    onboarding,
+    quarantine,
+    read_model,
+    singleflight,
+)
+from meican.async_service import AsyncMeicanService
+from meican.history import SUMMARY_FIELDS, user_history_totals
 from meican.meican_service import MeicanService
-from meican.models import MeicanUser, OrderRecord
+from meican.models import MeicanUser, OrderRecord, TabStatus
+
+
+def _data_validator(request):
+    """
+    条件 GET 的校验值：最新的 TabStatus.last_updated、最新的 OrderRecord.updated_at、用户数、
+    启用的用户（id 之和）以及失败隔离状态（连续失败次数之和、当前隔离中的用户数），
+    一条聚合查询即可算出；同一个请求内只计算一次
+    :return: (etag, last_modified)
+    """
+    if not hasattr(request, "_meican_validator"):
+        connection = connections[settings.MEICAN_READ_DB]
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT (SELECT COUNT(*) FROM {users}),"
+                " (SELECT SUM(CASE WHEN {is_active} THEN {id} ELSE 0 END) FROM {users}),"
+                " (SELECT MAX({last_updated}) FROM {tabs}),"
+                " (SELECT MAX({updated_at}) FROM {orders}),"
+                " (SELECT SUM({failures}) FROM {users}),"
+                " (SELECT COUNT(*) FROM {users} WHERE {next_eligible_at} > %s)".format(
+                    users=quote(MeicanUser._meta.db_table),
+                    tabs=quote(TabStatus._meta.db_table),
+                    orders=quote(OrderRecord._meta.db_table),
+                    last_updated=quote("last_updated"),
+                    updated_at=quote("updated_at"),
+                    is_active=quote("is_active"),
+                    id=quote("id"),
+                    failures=quote("consecutive_failures"),
+                    next_eligible_at=quote("next_eligible_at"),
+                ),
+                [connection.ops.adapt_datetimefield_value(timezone.now())],
+            )
+            (
+                user_count,
+                active_ids,
+                tab_updated,
+                order_updated,
+                failures,
+                quarantined,
+            ) = cursor.fetchone()
+
+        # 页面内容按"今天/明天"展示，跨天后即使数据没变也要重新生成
+        today_start = timezone.make_aware(
+            datetime.combine(datetime.now().date(), datetime.min.time())
+        )
+        timestamps = [
+            value
+            for value in (_as_datetime(tab_updated), _as_datetime(order_updated))
+            if value
+        ]
+        etag = hashlib.md5(
+            "|".join(
+                [
+                    today_start.date().isoformat(),
+                    f"{user_count}:{active_ids}",
+                    str(tab_updated),
+                    str(order_updated),
+                    f"{failures}:{quarantined}",
+                    request.GET.urlencode(),
+                ]
+            ).encode("utf-8")
+        ).hexdigest()
+        request._meican_validator = (etag, max(timestamps + [today_start]))
+    return request._meican_validator
+
+
+def _as_datetime(value):
+    """SQLite 原始查询返回的是字符串（UTC），其他数据库返回 datetime"""
+    if value is None or isinstance(value, datetime):
+        return value
+    parsed = parse_datetime(str(value))
+    if parsed and timezone.is_naive(parsed):
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed
+
+
+def _has_pending_messages(request):
+    # 有待显示的提示消息时页面内容不同，不能返回 304
+    return len(messages.get_messages(request)) > 0
+
+
+def _dashboard_etag(request):
+    if _has_pending_messages(request):
+        return None
+    return _data_validator(request)[0]
+
+
+def _dashboard_last_modified(request):
+    if _has_pending_messages(request):
+        return None
+    return _data_validator(request)[1]
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=_dashboard_etag, last_modified_func=_dashboard_last_modified)
+def _render_dashboard(request):
+    users = list(MeicanUser.objects.using(settings.MEICAN_READ_DB).all())
+
+    # 为每个用户添加今天和以后的 Tab 状态及订单状态（按用户版本号缓存，只重新计算有变化的用户）
+    today = datetime.now().date()
+    users_with_status = dashboard_cache.get_view_models(
+        users, today, using=settings.MEICAN_READ_DB
+    )
+
+    return render(
+        request,
+        "users.html",
+        {
+            "users_with_status": users_with_status,
+            "now": timezone.now(),
+            "today": today,
+            "tomorrow": today + timedelta(days=1),
+        },
+    )
 
 
 class MeicanUsersView(View):
-    def get(self, request):
+    # 同一个 View 的处理方法必须全部是同步或全部是异步；页面渲染只读数据库，放到同步线程执行
+    async def get(self, request):
         """
         Handle GET requests to retrieve Meican users.
         """
-        users = MeicanUser.objects.all()
-
-        # 为每个用户添加今天和以后的 Tab 状态及订单状态
-        today = datetime.now().date()
-
-        users_with_status = []
-        for user in users:
-            # 获取该用户今天及以后的所有 Tab 状态
-            from .models import TabStatus
-
-            user_tabs = TabStatus.objects.filter(
-                user=user, order_date__gte=today
-            ).order_by("order_date", "target_time")
-
-            # 获取今天及以后的所有成功订单
-            user_orders = OrderRecord.objects.filter(
-                user=user, order_date__gte=today, success=True
-            ).order_by("order_date", "meal_period")
-
-            # 按日期分组 Tab 状态
-            tabs_by_date = {}
-            for tab in user_tabs:
-                date_str = tab.order_date.isoformat()
-                if date_str not in tabs_by_date:
-                    tabs_by_date[date_str] = []
-                tabs_by_date[date_str].append(
-                    {
-                        "title": tab.tab_title,
-                        "status": tab.status,
-                        "target_time": tab.target_time,
-                        "has_buffet": "自助" in tab.tab_title,
-                    }
-                )
-
-            # 按日期分组订单
-            orders_by_date = {}
-            for order in user_orders:
-                date_str = order.order_date.isoformat()
-                if date_str not in orders_by_date:
-                    orders_by_date[date_str] = []
-                orders_by_date[date_str].append(
-                    {"meal_period": order.meal_period, "meal_name": order.meal_name}
-                )
-
-            # 统计今天和明天的状态（为了兼容现有模板）
-            today_str = today.isoformat()
-            tomorrow_str = (today + timedelta(days=1)).isoformat()
-
-            today_orders = orders_by_date.get(today_str, [])
-            tomorrow_orders = orders_by_date.get(tomorrow_str, [])
-
-            today_meals = []
-            for order in today_orders:
-                if order["meal_period"]:
-                    today_meals.append(f"{order['meal_period']}: {order['meal_name']}")
-                else:
-                    today_meals.append(order["meal_name"])
-
-            tomorrow_meals = []
-            for order in tomorrow_orders:
-                if order["meal_period"]:
-                    tomorrow_meals.append(
-                        f"{order['meal_period']}: {order['meal_name']}"
-                    )
-                else:
-                    tomorrow_meals.append(order["meal_name"])
-
-            user_data = {
-                "user": user,
-                "today_ordered": len(today_orders) > 0,
-                "today_meal": "; ".join(today_meals) if today_meals else None,
-                "tomorrow_ordered": len(tomorrow_orders) > 0,
-                "tomorrow_meal": "; ".join(tomorrow_meals) if tomorrow_meals else None,
-                "tabs_by_date": tabs_by_date,
-                "orders_by_date": orders_by_date,
-                "tab_status_count": user_tabs.count(),
-                "order_count": user_orders.count(),
-            }
-            users_with_status.append(user_data)
+        return await sync_to_async(_render_dashboard)(request)
 
-        return render(
-            request,
-            "users.html",
-            {
-                "users_with_status": users_with_status,
-                "today": today,
-                "tomorrow": today + timedelta(days=1),
-            },
-        )
-
-    def post(self, request):
+    async def post(self, request):
         """
         Handle POST requests to create a new Meican user.
         """
@@ -116,15 +166,15 @@ class MeicanUsersView(View):
             messages.error(request, "邮箱地址不能为空")
             return redirect("get_meican_users")
 
+        meican_service = AsyncMeicanService()
         try:
             # 先检查邮箱是否已存在
-            if MeicanUser.objects.filter(email=email).exists():
+            if await MeicanUser.objects.filter(email=email).aexists():
                 messages.error(request, "该邮箱已存在，请使用其他邮箱")
                 return redirect("get_meican_users")
 
             # 尝试使用美餐服务登录验证
-            meican_service = MeicanService()
-            login_success, token, login_error = meican_service.login(email)
+            login_success, token, login_error = await meican_service.login(email)
 
             if not login_success:
                 messages.error(
@@ -133,17 +183,21 @@ class MeicanUsersView(View):
                 return redirect("get_meican_users")
 
             # 登录成功，创建用户
-            user = MeicanUser.objects.create(  # noqa: F841
+            user = await MeicanUser.objects.acreate(
                 email=email, token=token, last_login_attempt=timezone.now()
             )
 
             # 立即尝试为新用户进行一次点餐
             order_results = []
 
-            # 调用订餐方法
+            # 调用订餐方法（复用上面的登录会话）
+            # 新用户可能已被刚启动的定时任务选中，持有该用户的租约后再下单
+            lease = leases.LeaseHolder(leases.user_lease_name(user.id))
             try:
-                success, result_data, error = meican_service.find_and_order_buffet(
-                    email
+                if not await lease.aacquire(settings.MEICAN_LEASE_WAIT):
+                    raise leases.LeaseBusy(lease.name)
+                success, result_data, error = (
+                    await meican_service.find_and_order_buffet(user)
                 )
 
                 if success:
@@ -169,8 +223,12 @@ class MeicanUsersView(View):
                     else:
                         order_results.append(f"订餐失败：{error}")
 
+            except leases.LeaseBusy:
+                order_results.append("该用户正在被其他任务处理，稍后刷新查看订餐结果")
             except Exception as e:
                 order_results.append(f"订餐异常：{str(e)}")
+            finally:
+                await lease.arelease()
 
             # 根据订餐结果显示相应的消息
             if order_results:
@@ -202,6 +260,8 @@ class MeicanUsersView(View):
 
         except Exception as e:
             messages.error(request, f"创建用户时发生错误：{str(e)}")
+        finally:
+            await meican_service.aclose()
 
         return redirect("get_meican_users")
 
@@ -215,6 +275,7 @@ class DeleteUserView(View):
             user = get_object_or_404(MeicanUser, id=user_id)
             user_email = user.email
             user.delete()
+            events.emit(events.KIND_USER_DELETED, {"email": user_email}, user_id)
             messages.success(request, f"用户 {user_email} 已成功删除！")
         except Exception as e:
             messages.error(request, f"删除用户时发生错误：{str(e)}")
@@ -222,19 +283,70 @@ class DeleteUserView(View):
         return redirect("get_meican_users")
 
 
+_refresh_flight = singleflight.SingleFlight()
+
+
+async def _refresh_user(user):
+    """执行一次刷新：登录 + 同步 Tab 状态 + 批量订餐"""
+    # 用户正在被定时任务等其他流程处理时，最多等待 MEICAN_LEASE_WAIT 秒
+    lease = leases.LeaseHolder(leases.user_lease_name(user.id))
+    if not await lease.aacquire(settings.MEICAN_LEASE_WAIT):
+        return False, {}, "该用户正在被其他任务处理，请稍后再试"
+    try:
+        return await _refresh_user_locked(user)
+    finally:
+        await lease.arelease()
+
+
+async def _refresh_user_locked(user):
+    await sync_to_async(events.emit)(
+        events.KIND_JOB,
+        {"job": "refresh", "stage": "start", "email": user.email},
+        user.id,
+    )
+    result = await AsyncMeicanService().refresh_user_status(user)
+    # 手动刷新不受隔离限制，成功后解除隔离
+    await sync_to_async(quarantine.record)(user.id, result[0], result[2] or "")
+    await sync_to_async(events.emit)(
+        events.KIND_JOB,
+        {
+            "job": "refresh",
+            "stage": "finish",
+            "email": user.email,
+            "success": result[0],
+        },
+        user.id,
+    )
+    return result
+
+
 class UpdateOrderStatusView(View):
-    def post(self, request, user_id):
+    async def post(self, request, user_id):
         """
-        刷新指定用户的状态：重新获取 Tab 状态并同步到数据库
+        刷新指定用户的状态：重新获取 Tab 状态并同步到数据库。
+        面板通过 fetch 调用（Accept: application/json）时返回 JSON，行内容由实时事件更新；
+        普通表单提交时提示消息后重定向回用户列表
         """
-        try:
-            user = get_object_or_404(MeicanUser, id=user_id)
-
-            meican_service = MeicanService()
+        success, message = await self._refresh(user_id)
+        if "application/json" in request.headers.get("Accept", ""):
+            return JsonResponse({"success": success, "message": message})
+        if success:
+            messages.success(request, message)
+        else:
+            messages.error(request, message)
+        return redirect("get_meican_users")
 
-            # 使用新的刷新方法：登录 + 同步 Tab 状态 + 批量订餐
-            success, result_info, error = meican_service.refresh_user_status(user)
+    async def _refresh(self, user_id):
+        """
+        :return: (success, message)
+        """
+        try:
+            user = await aget_object_or_404(MeicanUser, id=user_id)
 
+            # 同一用户的并发刷新合并为一次执行，刚刷新过的直接返回上一次的结果
+            (success, result_info, error), source = await _refresh_flight.do(
+                user.id, lambda: _refresh_user(user), remember=lambda result: result[0]
+            )
             if success:
                 # 提取有用的信息给用户
                 sync_info = result_info.get("sync_info", {})
@@ -258,14 +370,25 @@ class UpdateOrderStatusView(View):
                         message_parts.append(f"已有订单: {already_ordered_count} 个")
 
                 message = f"用户 {user.email} 状态已刷新 - " + "; ".join(message_parts)
-                messages.success(request, message)
+                if source == singleflight.JOINED:
+                    message += "（已合并到正在进行的刷新）"
+                elif source == singleflight.FRESH:
+                    message += "（刚刚刷新过，显示上一次的结果）"
+                return True, message
             else:
-                messages.error(request, f"刷新用户 {user.email} 状态失败: {error}")
+                return False, f"刷新用户 {user.email} 状态失败: {error}"
 
         except Exception as e:
-            messages.error(request, f"刷新状态时发生错误: {str(e)}")
+            return False, f"刷新状态时发生错误: {str(e)}"
 
-        return redirect("get_meican_users")
+
+class RetryUserView(UpdateOrderStatusView):
+    async def post(self, request, user_id):
+        """
+        解除用户的失败隔离并立即刷新一次；失败次数保留，仍然失败时以更长的退避时间重新隔离
+        """
+        await sync_to_async(quarantine.retry_now)(user_id)
+        return await super().post(request, user_id)
 
 
 class AutoOrderView(View):
@@ -280,7 +403,8 @@ class AutoOrderView(View):
             if not users.exists():
                 return JsonResponse({"success": False, "message": "没有找到可用的用户"})
 
-            meican_service = MeicanService()
+            # 从连接池复用已登录的客户端，处理完所有用户后归还
+            meican_service = MeicanService(pooled=True)
             today = datetime.now().date()
 
             # 统计各种状态的用户数量
@@ -288,96 +412,154 @@ class AutoOrderView(View):
             already_ordered_count = 0  # 全部已订餐的用户
             no_buffet_count = 0  # 没有可用自助餐的用户
             error_count = 0  # 真正出错的用户
+            busy_count = 0  # 正在被定时任务等其他流程处理、本次跳过的用户
+            quarantined_count = 0  # 连续失败、处于隔离中而跳过的用户
             total_count = users.count()
 
             order_details = []
+            events.emit(
+                events.KIND_JOB,
+                {"job": "auto_order", "stage": "start", "total": total_count},
+            )
 
-            for user in users:
-                user_has_new_order = False
-                user_all_ordered = False
-                user_no_buffet = False
-                user_has_error = False
-
-                try:
-                    # 尝试为用户订餐
-                    success, result_data, error = meican_service.find_and_order_buffet(
-                        user.email
-                    )
+            try:
+                for done, user in enumerate(users, start=1):
+                    user_has_new_order = False
+                    user_all_ordered = False
+                    user_no_buffet = False
+                    user_has_error = False
+                    user_error = ""
+
+                    # 连续失败的用户在退避时间到期前跳过，可以在面板上手动重试
+                    if quarantine.is_quarantined(user):
+                        quarantined_count += 1
+                        order_details.append(
+                            f"{user.email}: 连续失败 {user.consecutive_failures} 次，隔离中已跳过"
+                        )
+                        continue
+
+                    # 用户正在被其他流程处理时直接跳过，避免重复登录和重复下单
+                    lease = leases.LeaseHolder(leases.user_lease_name(user.id))
+                    if not lease.acquire():
+                        busy_count += 1
+                        order_details.append(
+                            f"{user.email}: 正在被其他任务处理，已跳过"
+                        )
+                        continue
 
-                    if success:
-                        # 处理成功的新订单
-                        successful_orders = result_data.get("successful_orders", [])
-                        if successful_orders:
-                            user_has_new_order = True
-                            for order_info in successful_orders:
-                                if ": " in order_info:
-                                    meal_period, meal_name = order_info.split(": ", 1)
-                                else:
-                                    meal_period = "未知时段"
-                                    meal_name = order_info
-
-                                # 更新数据库记录
-                                OrderRecord.objects.update_or_create(
-                                    user=user,
-                                    order_date=today,
-                                    meal_period=meal_period,
-                                    defaults={
-                                        "meal_name": meal_name,
-                                        "success": True,
-                                        "error_message": None,
-                                    },
-                                )
-                                order_details.append(
-                                    f"{user.email}: 新订餐成功 - {meal_period}: {meal_name}"
-                                )
+                    try:
+                        # 尝试为用户订餐
+                        success, result_data, error = (
+                            meican_service.find_and_order_buffet(user.email)
+                        )
 
-                        # 处理已有的订单
-                        ordered_meals = result_data.get("ordered_meals", [])
-                        if ordered_meals:
-                            # 如果只有已订餐，没有新订单，认为是全部已订餐
-                            if not successful_orders:
-                                user_all_ordered = True
-                            for meal_period in ordered_meals:
+                        if success:
+                            # 处理成功的新订单
+                            successful_orders = result_data.get("successful_orders", [])
+                            if successful_orders:
+                                user_has_new_order = True
+                                for order_info in successful_orders:
+                                    if ": " in order_info:
+                                        meal_period, meal_name = order_info.split(
+                                            ": ", 1
+                                        )
+                                    else:
+                                        meal_period = "未知时段"
+                                        meal_name = order_info
+
+                                    # 更新数据库记录
+                                    OrderRecord.objects.update_or_create(
+                                        user=user,
+                                        order_date=today,
+                                        meal_period=meal_period,
+                                        defaults={
+                                            "meal_name": meal_name,
+                                            "success": True,
+                                            "error_message": None,
+                                        },
+                                    )
+                                    order_details.append(
+                                        f"{user.email}: 新订餐成功 - {meal_period}: {meal_name}"
+                                    )
+
+                            # 处理已有的订单
+                            ordered_meals = result_data.get("ordered_meals", [])
+                            if ordered_meals:
+                                # 如果只有已订餐，没有新订单，认为是全部已订餐
+                                if not successful_orders:
+                                    user_all_ordered = True
+                                for meal_period in ordered_meals:
+                                    order_details.append(
+                                        f"{user.email}: 已订餐 - {meal_period}"
+                                    )
+
+                            # 如果既没有新订单也没有已有订单，说明没有可用的自助餐
+                            if not successful_orders and not ordered_meals:
+                                user_no_buffet = True
                                 order_details.append(
-                                    f"{user.email}: 已订餐 - {meal_period}"
+                                    f"{user.email}: 当前时段暂无可用的自助餐"
                                 )
 
-                        # 如果既没有新订单也没有已有订单，说明没有可用的自助餐
-                        if not successful_orders and not ordered_meals:
-                            user_no_buffet = True
-                            order_details.append(
-                                f"{user.email}: 当前时段暂无可用的自助餐"
+                        else:
+                            # 处理失败情况
+                            user_has_error = True
+                            user_error = error or ""
+                            # 记录失败到数据库
+                            OrderRecord.objects.update_or_create(
+                                user=user,
+                                order_date=today,
+                                meal_period="自动点餐",
+                                defaults={
+                                    "meal_name": "",
+                                    "success": False,
+                                    "error_message": error,
+                                },
                             )
+                            order_details.append(f"{user.email}: 订餐失败 - {error}")
 
-                    else:
-                        # 处理失败情况
+                    except Exception as e:
                         user_has_error = True
-                        # 记录失败到数据库
-                        OrderRecord.objects.update_or_create(
-                            user=user,
-                            order_date=today,
-                            meal_period="自动点餐",
-                            defaults={
-                                "meal_name": "",
-                                "success": False,
-                                "error_message": error,
-                            },
-                        )
-                        order_details.append(f"{user.email}: 订餐失败 - {error}")
-
-                except Exception as e:
-                    user_has_error = True
-                    order_details.append(f"{user.email}: 订餐异常 - {str(e)}")
-
-                # 统计用户状态
-                if user_has_new_order:
-                    new_order_count += 1
-                elif user_all_ordered:
-                    already_ordered_count += 1
-                elif user_no_buffet:
-                    no_buffet_count += 1
-                elif user_has_error:
-                    error_count += 1
+                        user_error = str(e)
+                        order_details.append(f"{user.email}: 订餐异常 - {str(e)}")
+                    finally:
+                        lease.release()
+
+                    quarantine.record(user.id, not user_has_error, user_error)
+
+                    # 视图里直接写了 OrderRecord，重建该用户今天的面板数据并使缓存失效
+                    read_model.refresh_days(user.id, [today])
+                    dashboard_cache.bump_user_version(user.id)
+                    events.emit(
+                        events.KIND_JOB,
+                        {
+                            "job": "auto_order",
+                            "stage": "progress",
+                            "email": user.email,
+                            "done": done,
+                            "total": total_count,
+                            "success": not user_has_error,
+                        },
+                        user.id,
+                    )
+
+                    # 统计用户状态
+                    if user_has_new_order:
+                        new_order_count += 1
+                    elif user_all_ordered:
+                        already_ordered_count += 1
+                    elif user_no_buffet:
+                        no_buffet_count += 1
+                    elif user_has_error:
+                        error_count += 1
+
+            finally:
+                # 出现异常时同样归还（或关闭）已登录的客户端
+                meican_service.release()
+            events.emit(
+                events.KIND_JOB,
+                {"job": "auto_order", "stage": "finish", "total": total_count},
+            )
+            events.prune()
 
             # 构建响应消息
             message_parts = []
@@ -394,6 +576,12 @@ class AutoOrderView(View):
             if error_count > 0:
                 message_parts.append(f"失败: {error_count}人")
 
+            if busy_count > 0:
+                message_parts.append(f"正在处理中已跳过: {busy_count}人")
+
+            if quarantined_count > 0:
+                message_parts.append(f"隔离中已跳过: {quarantined_count}人")
+
             # 判断整体操作是否成功
             # 只要不是所有用户都出错，就认为操作成功
             is_success = error_count < total_count
@@ -404,7 +592,13 @@ class AutoOrderView(View):
                         f"自助点餐完成！共处理 {total_count} 位用户，"
                         + "，".join(message_parts)
                     )
-                elif already_ordered_count + no_buffet_count == total_count:
+                elif (
+                    already_ordered_count
+                    + no_buffet_count
+                    + busy_count
+                    + quarantined_count
+                    == total_count
+                ):
                     main_message = (
                         f"自助点餐检查完成！共处理 {total_count} 位用户，"
                         + "，".join(message_parts)
@@ -431,6 +625,8 @@ class AutoOrderView(View):
                         "already_ordered": already_ordered_count,
                         "no_buffet": no_buffet_count,
                         "errors": error_count,
+                        "busy": busy_count,
+                        "quarantined": quarantined_count,
                     },
                 }
             )
@@ -441,53 +637,172 @@ class AutoOrderView(View):
             )
 
 
+class DashboardEventsView(View):
+    def get(self, request):
+        """
+        面板实时事件流（Server-Sent Events）
+        浏览器断线重连时会带上 Last-Event-ID，从该事件之后继续推送；首次连接只推送之后的新事件
+        """
+        last_event_id = request.headers.get("Last-Event-ID") or request.GET.get(
+            "last_event_id"
+        )
+        try:
+            last_event_id = int(last_event_id)
+        except (TypeError, ValueError):
+            last_event_id = events.latest_event_id()
+
+        # ASGI 部署时使用异步生成器，否则事件会被缓冲到连接结束才发送
+        stream = events.astream if isinstance(request, ASGIRequest) else events.stream
+        response = StreamingHttpResponse(
+            stream(last_event_id, using=settings.MEICAN_READ_DB),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        # 关闭 nginx 等反向代理的响应缓冲
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+async def _aiter(iterator):
+    """在同步线程里逐块消费同步生成器，ASGI 下边读边发送而不是先完整读入内存"""
+    while True:
+        chunk = await sync_to_async(next)(iterator, None)
+        if chunk is None:
+            return
+        if chunk:
+            yield chunk
+
+
+class ExportApiView(View):
+    def get(self, request):
+        """
+        流式导出历史数据
+        参数：table（orders / tabs / daily）、format（csv / parquet）、start / end（YYYY-MM-DD，含）、
+        user（用户 id 或邮箱，可重复）
+        """
+        try:
+            table = request.GET.get("table", "orders")
+            fmt = request.GET.get("format", export.FORMAT_CSV)
+            start = request.GET.get("start") or None
+            end = request.GET.get("end") or None
+            if start:
+                start = datetime.strptime(start, "%Y-%m-%d").date()
+            if end:
+                end = datetime.strptime(end, "%Y-%m-%d").date()
+            users = request.GET.getlist("user")
+            chunks = export.iter_export(
+                table,
+                fmt,
+                start=start,
+                end=end,
+                user_ids=export.resolve_users(users) if users else None,
+                using=settings.MEICAN_READ_DB,
+            )
+        except ValueError as e:
+            return JsonResponse(
+                {"success": False, "message": f"导出参数错误：{str(e)}"}
+            )
+
+        response = StreamingHttpResponse(
+            _aiter(chunks) if isinstance(request, ASGIRequest) else chunks,
+            content_type=export.CONTENT_TYPES[fmt],
+        )
+        filename = "-".join(
+            ["meican", table] + [value.isoformat() for value in (start, end) if value]
+        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class AnalyticsApiView(View):
+    def get(self, request):
+        """
+        点餐统计：自助餐下单成功率、失败原因分类、自助餐时段覆盖率、下单提前量
+        参数：start / end（YYYY-MM-DD，含，默认最近 30 天）、group（day / user）、
+        user（用户 id 或邮箱，可重复）
+        """
+        today = datetime.now().date()
+        try:
+            end = request.GET.get("end")
+            end = datetime.strptime(end, "%Y-%m-%d").date() if end else today
+            start = request.GET.get("start")
+            start = (
+                datetime.strptime(start, "%Y-%m-%d").date()
+                if start
+                else end - timedelta(days=29)
+            )
+            users = request.GET.getlist("user")
+            result = analytics.report(
+                start,
+                end,
+                today,
+                group=request.GET.get("group", analytics.GROUP_DAY),
+                user_ids=export.resolve_users(users) if users else None,
+                using=settings.MEICAN_READ_DB,
+            )
+        except ValueError as e:
+            return JsonResponse(
+                {"success": False, "message": f"统计参数错误：{str(e)}"}
+            )
+
+        return JsonResponse(
+            {"success": True, **result, "failure_labels": analytics.FAILURE_LABELS}
+        )
+
+
 class UsersApiView(View):
+    @method_decorator(cache_control(no_cache=True))
+    @method_decorator(
+        condition(
+            etag_func=lambda request: _data_validator(request)[0],
+            last_modified_func=lambda request: _data_validator(request)[1],
+        )
+    )
     def get(self, request):
         """
         API endpoint to get users list with order status.
         """
-        users = MeicanUser.objects.all()
+        users = MeicanUser.objects.using(settings.MEICAN_READ_DB).all()
         today = datetime.now().date()
         tomorrow = today + timedelta(days=1)
 
-        users_data = []
-        for user in users:
-            # 获取今天的所有成功订单
-            today_orders = OrderRecord.objects.filter(
-                user=user, order_date=today, success=True
-            )
-
-            # 获取明天的所有成功订单
-            tomorrow_orders = OrderRecord.objects.filter(
-                user=user, order_date=tomorrow, success=True
+        # 可选：附带最近 N 天的历史统计（已压缩的部分从汇总表读取）
+        try:
+            history_days = int(request.GET.get("history_days", 0))
+        except ValueError:
+            history_days = 0
+        history = {}
+        if history_days > 0:
+            history = user_history_totals(
+                today - timedelta(days=history_days),
+                today - timedelta(days=1),
+                using=settings.MEICAN_READ_DB,
             )
 
-            # 合并今天的订单信息
-            today_meals = []
-            if today_orders.exists():
-                for order in today_orders:
-                    if order.meal_period:
-                        today_meals.append(f"{order.meal_period}: {order.meal_name}")
-                    else:
-                        today_meals.append(order.meal_name)
-
-            # 合并明天的订单信息
-            tomorrow_meals = []
-            if tomorrow_orders.exists():
-                for order in tomorrow_orders:
-                    if order.meal_period:
-                        tomorrow_meals.append(f"{order.meal_period}: {order.meal_name}")
-                    else:
-                        tomorrow_meals.append(order.meal_name)
-
+        users_data = []
+        view_models = dashboard_cache.get_view_models(
+            list(users), today, using=settings.MEICAN_READ_DB
+        )
+        for view_model in view_models:
+            user = view_model["user"]
             user_data = {
                 "id": user.id,
                 "email": user.email,
-                "today_ordered": today_orders.exists(),
-                "today_meal": "; ".join(today_meals) if today_meals else None,
-                "tomorrow_ordered": tomorrow_orders.exists(),
-                "tomorrow_meal": "; ".join(tomorrow_meals) if tomorrow_meals else None,
+                "today_ordered": view_model["today_ordered"],
+                "today_meal": view_model["today_meal"],
+                "tomorrow_ordered": view_model["tomorrow_ordered"],
+                "tomorrow_meal": view_model["tomorrow_meal"],
+                "quarantined": quarantine.is_quarantined(user),
+                "consecutive_failures": user.consecutive_failures,
+                "next_eligible_at": (
+                    user.next_eligible_at.isoformat() if user.next_eligible_at else None
+                ),
             }
+            if history_days > 0:
+                user_data["history"] = history.get(
+                    user.id, dict.fromkeys(SUMMARY_FIELDS, 0)
+                )
             users_data.append(user_data)
 
         return JsonResponse(
@@ -501,10 +816,11 @@ class UsersApiView(View):
 
 
 class CreateUserApiView(View):
-    def post(self, request):
+    async def post(self, request):
         """
         API endpoint to create a new user.
         """
+        meican_service = AsyncMeicanService()
         try:
             data = json.loads(request.body)
             email = data.get("email")
@@ -513,14 +829,13 @@ class CreateUserApiView(View):
                 return JsonResponse({"success": False, "message": "邮箱地址不能为空"})
 
             # 先检查邮箱是否已存在
-            if MeicanUser.objects.filter(email=email).exists():
+            if await MeicanUser.objects.filter(email=email).aexists():
                 return JsonResponse(
                     {"success": False, "message": "该邮箱已存在，请使用其他邮箱"}
                 )
 
             # 尝试使用美餐服务登录验证
-            meican_service = MeicanService()
-            login_success, token, login_error = meican_service.login(email)
+            login_success, token, login_error = await meican_service.login(email)
 
             if not login_success:
                 return JsonResponse(
@@ -531,18 +846,21 @@ class CreateUserApiView(View):
                 )
 
             # 登录成功，创建用户
-            user = MeicanUser.objects.create(
+            user = await MeicanUser.objects.acreate(
                 email=email, token=token, last_login_attempt=timezone.now()
             )
 
-            # 立即尝试为新用户进行一次点餐（今天）
+            # 立即尝试为新用户进行一次点餐（今天），复用上面的登录会话
             today = datetime.now().date()
             order_results = []
 
-            # 为今天订餐
+            # 为今天订餐，新用户可能已被刚启动的定时任务选中，持有该用户的租约后再下单
+            lease = leases.LeaseHolder(leases.user_lease_name(user.id))
             try:
+                if not await lease.aacquire(settings.MEICAN_LEASE_WAIT):
+                    raise leases.LeaseBusy(lease.name)
                 today_success, result_data, today_error = (
-                    meican_service.find_and_order_buffet(email)
+                    await meican_service.find_and_order_buffet(user)
                 )
 
                 if today_success:
@@ -556,12 +874,12 @@ class CreateUserApiView(View):
                                 meal_period = "未知时段"
                                 meal_name = order_info
 
-                            OrderRecord.objects.create(
+                            # 服务层已按 Tab 写入了订单记录，这里用 update_or_create 避免唯一约束冲突
+                            await OrderRecord.objects.aupdate_or_create(
                                 user=user,
                                 order_date=today,
                                 meal_period=meal_period,
-                                meal_name=meal_name,
-                                success=True,
+                                defaults={"meal_name": meal_name, "success": True},
                             )
                             order_results.append(
                                 f"今日{meal_period}订餐成功：{meal_name}"
@@ -585,7 +903,7 @@ class CreateUserApiView(View):
                     ):
                         order_results.append("今日暂无可用的自助餐")
                     else:
-                        OrderRecord.objects.create(
+                        await OrderRecord.objects.acreate(
                             user=user,
                             order_date=today,
                             meal_period="自动点餐",
@@ -594,8 +912,15 @@ class CreateUserApiView(View):
                             error_message=today_error,
                         )
                         order_results.append(f"今日订餐失败：{today_error}")
+            except leases.LeaseBusy:
+                order_results.append("该用户正在被其他任务处理，稍后刷新查看订餐结果")
             except Exception as today_e:
                 order_results.append(f"今日订餐异常：{str(today_e)}")
+            finally:
+                await lease.arelease()
+
+            await sync_to_async(read_model.refresh_days)(user.id, [today])
+            await sync_to_async(dashboard_cache.bump_user_version)(user.id)
 
             # 构建响应消息 - 优化消息类型判断
             has_success = any("成功" in result for result in order_results)
@@ -632,6 +957,62 @@ class CreateUserApiView(View):
             return JsonResponse(
                 {"success": False, "message": f"创建用户时发生错误：{str(e)}"}
             )
+        finally:
+            await meican_service.aclose()
+
+
+class ImportUsersApiView(View):
+    async def post(self, request):
+        """
+        API endpoint to import users in bulk.
+        支持 JSON（{"emails": [...]} 或 {"csv": "..."}，可选 "dry_run"）、上传 CSV 文件（file 字段）
+        或直接提交 text/csv 正文；并发验证登录后一次性创建，首次点餐交给下一次定时任务
+        """
+        try:
+            dry_run = request.GET.get("dry_run") in ("1", "true")
+            if request.FILES.get("file"):
+                emails = onboarding.parse_emails(
+                    request.FILES["file"].read().decode("utf-8-sig")
+                )
+            elif request.content_type == "application/json":
+                data = json.loads(request.body)
+                dry_run = dry_run or bool(data.get("dry_run"))
+                if isinstance(data.get("emails"), list):
+                    emails = [str(email) for email in data["emails"]]
+                else:
+                    emails = onboarding.parse_emails(data.get("csv") or "")
+            else:
+                emails = onboarding.parse_emails(request.body.decode("utf-8-sig"))
+
+            if not emails:
+                return JsonResponse({"success": False, "message": "没有找到邮箱地址"})
+
+            report = await onboarding.import_users(emails, dry_run=dry_run)
+            summary = "，".join(
+                f"{label}: {report[key]}"
+                for key, label in onboarding.RESULT_LABELS.items()
+                if report[key]
+            )
+            return JsonResponse(
+                {
+                    "success": True,
+                    "message": f"共 {report['total']} 个邮箱，{summary}",
+                    "report": report,
+                }
+            )
+
+        except json.JSONDecodeError:
+            return JsonResponse({"success": False, "message": "无效的JSON数据"})
+        except UnicodeDecodeError:
+            return JsonResponse(
+                {"success": False, "message": "文件需要使用 UTF-8 编码"}
+            )
+        except ValueError as e:
+            return JsonResponse({"success": False, "message": str(e)})
+        except Exception as e:
+            return JsonResponse(
+                {"success": False, "message": f"批量导入用户时发生错误：{str(e)}"}
+            )
 
 
 class DeleteUserApiView(View):
@@ -643,6 +1024,7 @@ class DeleteUserApiView(View):
             user = get_object_or_404(MeicanUser, id=user_id)
             user_email = user.email
             user.delete()
+            events.emit(events.KIND_USER_DELETED, {"email": user_email}, user_id)
 
             return JsonResponse(
                 {"success": True, "message": f"用户 {user_email} 已成功删除！"}